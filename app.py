@@ -1,15 +1,22 @@
 import streamlit as st
 import polars as pl
-import altair as alt
-import pandas as pd
 import numpy as np
-import datetime as dt
-import pydeck as pdk
-import math 
-import matplotlib.pyplot as plt # utilizzata per la colorbar della heatmap
-import io                        # utilizzata per la colorbar della heatmap
-from scipy.spatial import ConvexHull # utilizzata per il poligono dei gruppi
-from pathlib import Path
+import functools
+import json
+import logging
+import re
+import time
+from data_prep import scan_dataset, current_version, ATLAS_FILE # lettura del dataset pre-elaborato e dell'atlante
+from data_prep import category_statistics # statistiche delle variabili categoriche dai conteggi pre-aggregati
+from data_prep import build_images, IMAGES_DIR, IMAGE_ASSETS_DIR # varianti ridimensionate delle immagini
+from data_prep import COLOR_BREWER_SCALE5, color_scale_legend # scala colori della heatmap e relativa legenda
+from spatial import SpatialIndex, dbscan_haversine # indice spaziale e clustering DBSCAN sulla sfera
+from shared_cache import shared_cache # cache dei risultati derivati condivisa tra i worker
+import profiling # tempi delle sezioni, opzionale (MM_PROFILE=1 oppure ?profile=1)
+
+# le librerie pesanti vengono importate al primo utilizzo, dentro le funzioni che le usano, così l'avvio di un
+# worker e la pagina introduttiva non le caricano: Altair dai grafici descrittivi, pandas dai dati passati
+# ad Altair e pydeck, pydeck dalle mappe, SciPy dall'indice spaziale e dai gruppi (benchmark.py --startup)
 
 # configurazione della pagina
 st.set_page_config(
@@ -17,39 +24,94 @@ st.set_page_config(
     page_icon = "🌍"
 )
 
+# profiling dell'esecuzione, se attivo (None altrimenti): le funzioni vengono misurate dopo la loro definizione
+profile = profiling.start_run(st.session_state.get("selected_page", "Introduzione"))
+
 #Preprocessing
-@st.cache_data #cache dei dati 
+@st.cache_resource(max_entries=1) #cache dei dati condivisa tra le sessioni, senza copie ad ogni esecuzione
+@profiling.cache_miss
 
 # Funzione per caricare i dati
-def load_data():
-
-    #seleziona solo le colonne di interesse
-    data = (
-        pl.read_csv("MM_14_21.csv", null_values=["", "NA", " "])
-        .select(["Region", "Incident Date", "Year", "Reported Month", "Number Dead",
-        "Minimum Estimated Number of Missing", "Total Number of Dead and Missing", 
-        "Number of Survivors", "Number of Females", "Number of Males", "Number of Children",
-        "Cause of Death", "Coordinates", "Migrantion route", "UNSD Geographical Grouping", "URL"])
-    )
+# le colonne derivate (date, coordinate) sono già calcolate al caricamento; tutte le viste interrogano
+# lo stesso LazyFrame e convertono in pandas solo i risultati già ridotti da passare ad Altair o pydeck.
+# la cache è indicizzata dalla versione del dataset: dopo un aggiornamento incrementale (data_prep.py --refresh)
+# la versione cambia e la nuova esecuzione carica il dataset aggiornato senza riavviare l'applicazione
+def load_data(version):
 
-    # estrazione del giorno della settimana e della data
-    data = data.with_columns(
-        data["Incident Date"]
-        .str.extract(r"^(\w{3}, \d{2}/\d{2}/\d{4})")
-        .alias("Incident Date") #sovreaascrive la colonna
-    )
-    datapd = data.to_pandas() #conversione a pandas per utilità
-    return data, datapd
+    # lettura lazy del dataset pre-elaborato (Arrow IPC in memory-map) e delle tabelle pre-aggregate,
+    # ricostruiti dal csv solo se il file sorgente è cambiato: le aggregazioni delle viste leggono
+    # solo le colonne e le righe che servono, e i worker sullo stesso host condividono le stesse pagine dei file
+    return scan_dataset()
+
+with profiling.section("load_data"):
+    dataset, aggregates, dataset_version = load_data(current_version())
+
+###################################################################################################################################
+# DATI DEI GRAFICI
+# i dati dei grafici vengono inviati da st.altair_chart: ogni dataset viene serializzato in Arrow fuori dalla specifica JSON
+# e prende il nome dall'hash del suo contenuto, quindi i livelli con gli stessi dati condividono un solo dataset.
+# Ai grafici arrivano dati già aggregati lato server (totali, conteggi e percentuali per categoria) e, dove il DataFrame
+# ha colonne che la specifica non usa, solo le colonne indicate con chart_data
+
+CHART_MAX_ROWS = 5_000  # righe oltre le quali un dataset passato a un grafico va aggregato prima
+
+logger = logging.getLogger("missing_migrants")
+
+# dati di un grafico: le sole colonne indicate ("columns"). Un dataset oltre CHART_MAX_ROWS righe non viene
+# ridotto qui (una somma non vale per tutte le colonne, ad esempio per le percentuali), ma lascia un avviso
+# nel log del server per individuare il grafico da aggregare
+def chart_data(data, columns):
+    if data.height > CHART_MAX_ROWS:
+        logger.warning("%d righe passate a un grafico (soglia %d): aggregare i dati lato server", data.height, CHART_MAX_ROWS)
+    return data.select(columns)
 
-data, datapd = load_data()
+# visualizzazione di un grafico Altair; il nome del grafico viene salvato nel campo "usermeta" della specifica
+# (ignorato da Vega-Lite) e usato da benchmark.py
+def show_chart(chart, name):
+    st.altair_chart(chart.properties(usermeta={"chart": name}), use_container_width=True)
+
+###################################################################################################################################
+# IMMAGINI
+# le immagini vengono mostrate dalle varianti ridimensionate preparate da data_prep.py (servite come file statici):
+# il browser sceglie la larghezza adatta allo schermo, preferisce il WebP e carica le immagini sotto la parte visibile
+# della pagina solo quando ci si avvicina scorrendo. Gli URL contengono l'hash del contenuto e il parametro "v",
+# con cui il server statico di Streamlit invia intestazioni di cache a lungo termine.
+# se le varianti non sono disponibili (cartella non scrivibile) si ricade su st.image con l'originale
+
+IMAGE_SIZES = "(max-width: 736px) 100vw, 736px"  # larghezza dell'immagine nella pagina, per la scelta della variante
+
+# indice delle varianti delle immagini, aggiornato una sola volta per processo
+@st.cache_resource
+@profiling.cache_miss
+def image_variants():
+    return build_images()
+
+# elenco "url larghezza" delle varianti di un formato, per l'attributo srcset
+def image_srcset(entry, fmt):
+    return ", ".join(f"app/{(IMAGE_ASSETS_DIR / variant[fmt]).as_posix()}?v={entry['hash']} {variant['width']}w" for variant in entry["variants"])
+
+# visualizzazione di un'immagine di images/ alla larghezza della colonna; "lazy" va disattivato
+# per le immagini visibili all'apertura della pagina
+def show_image(name, alt, lazy=True):
+    entry = image_variants().get(name)
+    if entry is None:
+        st.image(str(IMAGES_DIR / name), use_container_width=True)
+        return
+
+    fallback = entry["variants"][-1]
+    st.markdown(f"""
+<picture>
+<source type="image/webp" srcset="{image_srcset(entry, 'webp')}" sizes="{IMAGE_SIZES}">
+<img src="app/{(IMAGE_ASSETS_DIR / fallback['jpeg']).as_posix()}?v={entry['hash']}" srcset="{image_srcset(entry, 'jpeg')}" sizes="{IMAGE_SIZES}"
+ width="{entry['width']}" height="{entry['height']}" alt="{alt}" loading="{'lazy' if lazy else 'eager'}" decoding="async" style="width: 100%; height: auto;">
+</picture>
+""", unsafe_allow_html=True)
 
 ###################################################################################################################################
 # PAGINA INTRODUTTIVA
 
 # Funzione di visualizzazione di alcune tragedie migratorie
 def migration_tragedies():
-    image_folder = Path("images")  # percorso della cartella contenente le immagini
-
     # sezione su Alan Kurdi
     st.markdown("## Sotto agli occhi di tutti")
     st.markdown("""
@@ -58,8 +120,7 @@ def migration_tragedies():
     Lui e la sua famiglia sono morti nel settembre del 2015 vicino a Bodrum, in Turchia. Erano in viaggio per il Canada.  
     """)
 
-    image_path = image_folder / "Alan Kurdi.jpg"  # percorso dell'immagine di Alan Kurdi
-    st.image(str(image_path), use_container_width=True)  # visualizzazione dell'immagine
+    show_image("Alan Kurdi.jpg", "Alan Kurdi", lazy=False)  # visualizzazione dell'immagine, visibile all'apertura della pagina
 
     # link di approfondimento su Wikipedia
     st.markdown("[Link alla pagina Wikipedia (EN)](https://en.wikipedia.org/wiki/Death_of_Alan_Kurdi)")
@@ -77,8 +138,7 @@ def migration_tragedies():
     Valeria infilata nella maglietta di suo padre con il suo piccolo braccio avvolto attorno al suo collo.  
     """)
 
-    image_path = image_folder / "Alberto e Valeria Martínez.jpg"  # percorso dell'immagine di Óscar e Valeria Martínez
-    st.image(str(image_path), use_container_width=True)  # visualizzazione dell'immagine
+    show_image("Alberto e Valeria Martínez.jpg", "Óscar e Valeria Martínez")  # visualizzazione dell'immagine
 
     # link di approfondimento su NBC News
     st.markdown("[Link alla pagina su NBC News (EN)](https://www.nbcnews.com/news/latino/family-salvadoran-migrant-dad-child-who-drowned-say-he-loved-n1022226)")
@@ -93,12 +153,134 @@ def migration_tragedies():
     numeri che la pongono come una delle più gravi tragedie marittime nel Mediterraneo dall'inizio del 21° secolo.  
     """)
 
-    image_path = image_folder / "naufragio canale di sicilia.jpeg"  # percorso dell'immagine del naufragio del Canale di Sicilia
-    st.image(str(image_path), use_container_width=True)  # visualizzazione dell'immagine
+    show_image("naufragio canale di sicilia.jpeg", "Naufragio nel Canale di Sicilia")  # visualizzazione dell'immagine
 
     # link di approfondimento su Wikipedia
     st.markdown("[Link alla pagina Wikipedia (IT)](https://it.wikipedia.org/wiki/Naufragio_nel_Canale_di_Sicilia_del_18_aprile_2015)")
 
+# fonti (URL) più citate nel dataset, calcolate una sola volta per versione del dataset
+@st.cache_resource
+@profiling.cache_miss
+def top_sources_urls(version, n=5):
+    return (
+        dataset
+        .filter(pl.col("URL").is_not_null())
+        .group_by("URL")
+        .len()
+        .sort(["len", "URL"], descending=[True, False])
+        .head(n)
+        .collect()["URL"]
+        .to_list()
+    )
+
+# colonne mostrate nella tabella del dataset (quelle del csv originale) e colonne di testo in cui cercare
+VIEWER_COLUMNS = [
+    "Main ID", "Region", "Incident Date", "Year", "Reported Month", "Number Dead",
+    "Minimum Estimated Number of Missing", "Total Number of Dead and Missing",
+    "Number of Survivors", "Number of Females", "Number of Males", "Number of Children",
+    "Cause of Death", "Coordinates", "Migrantion route", "UNSD Geographical Grouping", "URL"
+]
+VIEWER_PAGE_SIZES = [25, 50, 100, 250]  # righe per pagina selezionabili
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"]
+# criteri di ordinamento delle colonne il cui ordine non è quello dei valori: "Incident Date" è un testo
+# ("Mon, 01/06/2014") e viene ordinata per data, "Reported Month" ha le categorie in ordine alfabetico
+# e viene ordinata per numero del mese
+VIEWER_SORT_KEYS = {
+    "Incident Date": pl.col("Incident_Date"),
+    "Reported Month": pl.col("Reported Month").cast(pl.String).replace_strict(MONTHS, range(1, 13), default=None),
+}
+
+# numero di righe del dataset
+@st.cache_resource
+@profiling.cache_miss
+def dataset_rows(version):
+    return dataset.select(pl.len()).collect().item()
+
+# condizione della ricerca testuale (senza distinzione tra maiuscole e minuscole) sulle colonne di testo:
+# per le colonne Enum il confronto avviene sulle categorie, poche, e le righe vengono filtrate per categoria;
+# le colonne Categorical (dataset letto dal csv su filesystem in sola lettura) vengono confrontate come testo
+def search_filter(schema, text):
+    text = text.lower()
+    pattern = "(?i)" + re.escape(text)  # più veloce che convertire in minuscolo ogni valore
+    conditions = []
+    for column in VIEWER_COLUMNS:
+        dtype = schema[column]
+        if isinstance(dtype, pl.Enum):
+            matching = [category for category in dtype.categories.to_list() if text in category.lower()]
+            if matching:
+                conditions.append(pl.col(column).is_in(matching))
+        elif dtype == pl.Categorical:
+            conditions.append(pl.col(column).cast(pl.String).str.contains(pattern))
+        elif dtype == pl.String:
+            conditions.append(pl.col(column).str.contains(pattern))
+    return pl.any_horizontal(conditions) if conditions else pl.lit(False)
+
+# indici (come in indexed_dataset) delle righe che soddisfano filtri e ricerca, nell'ordine richiesto;
+# restano in cache per le ultime combinazioni, così cambiare pagina non ripete filtri e ordinamento
+@st.cache_resource(max_entries=16)
+@profiling.cache_miss
+def viewer_ids(version, search, regions, sort_column, descending):
+    schema = dataset.collect_schema()
+    rows = indexed_dataset()
+    if regions:
+        rows = rows.filter(pl.col("Region").cast(pl.String).is_in(regions))
+    if search:
+        rows = rows.filter(search_filter(schema, search))
+    if sort_column in VIEWER_COLUMNS:
+        rows = rows.sort(VIEWER_SORT_KEYS.get(sort_column, pl.col(sort_column)), descending=descending, nulls_last=True, maintain_order=True)
+    return rows.select("id").collect()["id"]
+
+# tabella del dataset con paginazione lato server: filtri, ricerca e ordinamento vengono eseguiti sul LazyFrame
+# e al browser viene inviata solo la pagina visibile, quindi la tabella resta reattiva anche con milioni di righe
+@st.fragment
+def dataset_viewer():
+    schema = dataset.collect_schema()
+    regions = schema["Region"].categories.to_list() if isinstance(schema["Region"], pl.Enum) else category_stats(dataset_version)[("Region",)]["Region"].to_list()
+
+    col1, col2, col3 = st.columns([2, 2, 1])
+    with col1:
+        search = st.text_input("Cerca nel dataset", key="viewer_search", placeholder="es. Drowning, Central Mediterranean, 2016...")
+    with col2:
+        selected_regions = st.multiselect("Regioni", regions, key="viewer_regions")
+    with col3:
+        page_size = st.selectbox("Righe per pagina", VIEWER_PAGE_SIZES, key="viewer_page_size")
+
+    col1, col2 = st.columns([4, 1])
+    with col1:
+        sort_column = st.selectbox("Ordina per", ["(ordine del dataset)"] + VIEWER_COLUMNS, key="viewer_sort")
+    with col2:
+        descending = st.toggle("Decrescente", key="viewer_descending")
+
+    # righe filtrate e ordinate (calcolate una volta per combinazione di filtri, poi si cambia solo pagina);
+    # senza filtri né ordinamento la pagina è un intervallo contiguo del dataset
+    start = time.perf_counter()
+    contiguous = not (search.strip() or selected_regions or sort_column in VIEWER_COLUMNS)
+    if contiguous:
+        total = dataset_rows(dataset_version)
+    else:
+        ids = viewer_ids(dataset_version, search.strip(), tuple(selected_regions), sort_column, descending)
+        total = len(ids)
+
+    # pagina corrente, riportata nell'intervallo valido quando i filtri riducono le righe
+    pages = max((total - 1) // page_size + 1, 1)
+    if st.session_state.get("viewer_page", 1) > pages:
+        st.session_state["viewer_page"] = pages
+    page = st.number_input(f"Pagina (di {pages})", min_value=1, max_value=pages, step=1, key="viewer_page")
+
+    # lettura delle sole righe della pagina visibile
+    if contiguous:
+        visible = dataset.select(VIEWER_COLUMNS).slice((page - 1) * page_size, page_size).collect()
+    else:
+        visible = incident_details(ids.slice((page - 1) * page_size, page_size), VIEWER_COLUMNS)
+    elapsed = time.perf_counter() - start
+
+    st.dataframe(visible, use_container_width=True, hide_index=True)
+    filtered = f" (su {dataset_rows(dataset_version)} nel dataset)" if search.strip() or selected_regions else ""
+    st.caption(
+        f"Righe {(page - 1) * page_size + min(visible.height, 1)}–{(page - 1) * page_size + visible.height} "
+        f"di {total}{filtered} · query in {elapsed * 1000:.0f} ms"
+    )
+
 # funzione per visualizzare il dataframe e descrivere le variabili del dataset
 def dataframe():
     st.markdown("""
@@ -110,7 +292,7 @@ def dataframe():
     Questo è il **dataframe** utilizzato per l'analisi, sotto ci sono le descrizioni delle variabili:
     """)
 
-    st.dataframe(data, use_container_width=True)  # visualizzazione del dataframe in Streamlit
+    dataset_viewer()  # visualizzazione paginata del dataframe
 
     # dizionario contenente le variabili del dataset e la loro descrizione
     data_description = {
@@ -151,14 +333,13 @@ def dataframe():
     # link alla fonte del dataset su Kaggle
     st.markdown('La fonte dei dati si trova a questo [link](https://www.kaggle.com/datasets/snocco/missing-migrants-project).', unsafe_allow_html=True)
 
-    url_counts = datapd["URL"].value_counts().dropna()  # conteggio delle fonti uniche nel dataset
-    top_sources = url_counts.head(5)  # selezione delle prime 5 fonti più utilizzate
+    top_sources = top_sources_urls(dataset_version)  # selezione delle prime 5 fonti più utilizzate
 
     # visualizzazione delle principali fonti del dataset
     st.markdown("### Fonti principali del dataset")
     st.markdown("Il dataset è stato costruito a partire da diverse fonti. Ecco le principali:")
     
-    for fonte, freq in top_sources.items():
+    for fonte in top_sources:
         st.markdown(f"- [{fonte}]({fonte})")  # plot dei link alle fonti più utilizzate
 
 ###################################################################################################################################
@@ -169,8 +350,17 @@ def hex_to_rgb(hex_color):
     hex_color = hex_color.lstrip('#')  # rimuove il carattere '#' all'inizio del codice esadecimale
     return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))  # converte ogni coppia di caratteri in un valore RGB
 
+# URL dell'atlante mondiale salvato in locale da data_prep.py (servito dalla cartella static di Streamlit),
+# con la regione di ogni paese già nelle proprietà; None se l'atlante non è stato generato
+# (l'applicazione non accede alla rete, quindi non lo scarica)
+def atlas_url():
+    return f"app/{ATLAS_FILE.as_posix()}" if ATLAS_FILE.exists() else None
+
 #0. Mappa delle regioni presenti nel dataset
 def regions_map():
+    import altair as alt
+    import pandas as pd
+
     st.write("## Mappa delle Regioni")
 
     st.markdown(
@@ -179,6 +369,12 @@ def regions_map():
         "Successivamente nell'applicazione sarà possibile selezionare specifiche regioni per un'analisi più dettagliata."
     )
 
+    # senza l'atlante locale manca solo questa mappa: il resto della pagina viene visualizzato
+    url = atlas_url()
+    if url is None:
+        st.error(f"Atlante '{ATLAS_FILE}' non trovato: eseguire `python data_prep.py` per generarlo prima dell'avvio.")
+        return
+
     # carico il dataset aggiornato
     file_path = "countries.csv"
     df_countries = pd.read_csv(file_path)  # lettura del file csv contenente le informazioni sulle regioni
@@ -196,32 +392,37 @@ def regions_map():
     region_list = df_countries["region"].dropna().unique().tolist()  # elenco delle regioni senza valori nulli
     region_color_dict = {region: color_palette[i % len(color_palette)] for i, region in enumerate(region_list)}  # associazione di un colore a ogni regione
     
-    # mappa principale basata su un file di confini geografici
-    countries_map_50 = alt.topo_feature("https://cdn.jsdelivr.net/npm/world-atlas@2/countries-50m.json", 'countries')
+    # proiezione della mappa
+    projection = dict(
+        type="mercator",  # tipo di proiezione geografica
+        scale=89,
+        translate=[295, 166],
+        center=[20, 50],
+        clipExtent=[[0, 0], [800, 400]]
+    )
+
+    # mappa principale basata sull'atlante locale, con le regioni già associate ai paesi
+    countries_map = alt.topo_feature(url, "countries")
 
     # creazione della mappa con Altair
     map_chart = (
-        alt.Chart(countries_map_50)
+        alt.Chart(countries_map)
         .mark_geoshape(stroke="black", strokeWidth=0.5)  # definizione del bordo dei paesi
         .encode(
             color=alt.condition(
-                alt.datum.region != "Null",
-                alt.Color("region:N", scale=alt.Scale(domain=list(region_color_dict.keys()), range=list(region_color_dict.values())), legend=None), 
+                "datum.properties.region != 'Null'",
+                alt.Color("properties.region:N", scale=alt.Scale(domain=list(region_color_dict.keys()), range=list(region_color_dict.values())), legend=None), 
                 alt.value("transparent")  # rende trasparenti i paesi con valore "Null"
             ),
             tooltip=[
                 alt.Tooltip("properties.name:N", title="Paese"),
-                alt.Tooltip("region:N", title="Regione")
+                alt.Tooltip("properties.region:N", title="Regione")
             ]
         )
-        .transform_lookup(
-            lookup="properties.name",
-            from_=alt.LookupData(df_countries, "country", ["country", "region"])  # unione tra dati geografici e dataset
-        )
     )
 
     # sfondo della mappa con colore neutro
-    background = alt.Chart(countries_map_50).mark_geoshape(
+    background = alt.Chart(countries_map).mark_geoshape(
         fill='lightgray',
         stroke='darkgray'
     ).encode(tooltip=alt.value(None))
@@ -246,24 +447,33 @@ def regions_map():
 
     # combinazione della mappa e dello sfondo
     combined_map = alt.layer(background, map_chart).project(
-        type="mercator",  # tipo di proiezione geografica
-        scale=89,
-        translate=[295, 166],
-        center=[20, 50],
-        clipExtent=[[0, 0], [800, 400]]
+        **projection
     ).properties(
         width=900,
         height=400
     )
 
     # visualizzazione della mappa in Streamlit
-    st.altair_chart(combined_map, use_container_width=True)
+    show_chart(combined_map, "regions_map")
 
     # visualizzazione della legenda in formato HTML
     st.markdown(legend_html, unsafe_allow_html=True)
 
 #1. Serie storica del numero totale di morti e dispersi per regione
+# cubo pre-aggregato (mese x regione x causa di morte x rotta) salvato con il dataset e aggiornato in modo incrementale:
+# la serie storica, lo slider e la selezione delle regioni vengono risolti filtrando il cubo, senza riscorrere gli incidenti
+@st.cache_resource
+@profiling.cache_miss
+def monthly_cube(version):
+    return aggregates["monthly"].sort("Year_Month").collect()
+
+# le sezioni con widget sono frammenti: l'interazione con un widget riesegue solo la sezione
+# che lo contiene, con i dati in ingresso già calcolati e in cache, e non l'intera pagina
+@st.fragment
 def timeseries():
+    import altair as alt
+    import pandas as pd
+
     st.markdown("---")
     st.write(
         "L'obiettivo di questa sezione è comprendere come il numero totale di morti e dispersi sia variato nel tempo "
@@ -279,12 +489,10 @@ def timeseries():
     "contiene una sola osservazione, risultando pertanto in un singolo punto all'interno del grafico."
     )
     
-    # conversione della data nel formato datetime e rimozione dei valori mancanti
-    datapd['Incident_Date'] = pd.to_datetime(datapd['Incident Date'], format='%a, %m/%d/%Y', errors='coerce').dt.date
-    datapd.dropna(subset=['Incident_Date'], inplace=True)
+    cube = monthly_cube(dataset_version)
 
     # selezione delle regioni disponibili nel dataset
-    regions = sorted(datapd['Region'].unique().tolist())
+    regions = sorted(cube['Region'].drop_nulls().unique().cast(pl.String).to_list())
     selected_regions = st.multiselect(
         'Seleziona le regioni di interesse (max 4):',
         regions,
@@ -293,34 +501,37 @@ def timeseries():
         max_selections=4
     )
 
+    # periodo coperto dal cubo, dal primo giorno del primo mese all'ultimo giorno dell'ultimo mese:
+    # comprende i mesi aggiunti dagli aggiornamenti incrementali
+    first_date, last_date = cube.select(
+        pl.col("Year_Month").min(), pl.col("Year_Month").max().dt.month_end().alias("last")
+    ).row(0)
+
     # selezione dell'intervallo temporale tramite uno slider interattivo
     start_date, end_date = st.slider(
         "Seleziona l'intervallo di tempo",
-        min_value=dt.date(2014, 1, 1),
-        max_value=dt.date(2021, 12, 31),
-        value=(dt.date(2014, 1, 1), dt.date(2021, 12, 31)),
+        min_value=first_date,
+        max_value=last_date,
+        value=(first_date, last_date),
         format="DD-MM-YYYY",
         key="date_slider"
     )
 
-    # filtraggio dei dati in base alle regioni selezionate e al periodo temporale scelto
-    filtered_data = datapd[
-        (datapd['Region'].isin(selected_regions)) &
-        (datapd['Incident_Date'] >= start_date) &
-        (datapd['Incident_Date'] <= end_date)
-    ].copy()
-
-    if not filtered_data.empty:
-        # creazione di una colonna che aggrega anno e mese per l'analisi temporale
-        filtered_data["Incident_Date"] = pd.to_datetime(filtered_data["Incident_Date"], errors="coerce")
-        filtered_data["Year_Month"] = filtered_data["Incident_Date"].dt.to_period("M")
+    # filtraggio del cubo in base alle regioni selezionate e ai mesi compresi nel periodo temporale scelto
+    filtered_data = cube.filter(
+        pl.col("Region").cast(pl.String).is_in(selected_regions) &
+        pl.col("Year_Month").is_between(start_date.replace(day=1), end_date)
+    )
 
+    if not filtered_data.is_empty():
         # aggregazione del numero totale di morti e dispersi per mese e regione
-        aggregated_data = filtered_data.groupby(["Year_Month", "Region"]).agg({
-            "Total Number of Dead and Missing": "sum"
-        }).reset_index()
-
-        aggregated_data["Year_Month"] = aggregated_data["Year_Month"].dt.to_timestamp()  # conversione in timestamp
+        aggregated_data = (
+            filtered_data
+            .group_by("Year_Month", "Region")
+            .agg(pl.col("Total Number of Dead and Missing").sum())
+            .with_columns(pl.col("Region").cast(pl.String))
+            .sort("Year_Month", "Region")
+        )
 
         # dizionario contenente eventi catastrofici con data, titolo e numero di vittime
         events = {
@@ -419,7 +630,7 @@ def timeseries():
         else:
             timeseries = alt.layer(line, selectors, points, rules, text).properties(width=600, height=400)
 
-        st.altair_chart(timeseries, use_container_width=True)  # visualizzazione del grafico
+        show_chart(timeseries, "timeseries")  # visualizzazione del grafico
 
         # aggiunta del link agli eventi storici correlati
         if event_links:
@@ -440,7 +651,17 @@ def timeseries():
 )
 
 #2. Distribuzione delle variabili categoriche
+# statistiche delle variabili categoriche condivise da barchart() e stackedbarchart(), calcolate una sola volta
+# per versione del dataset dalla tabella pre-aggregata, senza scorrere il dataset (vedi data_prep.category_statistics)
+@st.cache_resource
+@profiling.cache_miss
+def category_stats(version):
+    return category_statistics(aggregates["categories"].collect())
+
+@st.fragment
 def barchart():
+    import altair as alt
+
     st.markdown("---")
     st.write("## Distribuzione delle variabili categoriali")
 
@@ -465,8 +686,8 @@ def barchart():
         st.warning("Seleziona una variabile per visualizzare la distribuzione.")
         return
     
-    # filtraggio dei dati rimuovendo i valori mancanti
-    filtered_data1 = data[[selected_variable]].drop_nans().drop_nulls()
+    # frequenza di ogni categoria, escludendo i valori mancanti: al grafico viene passato solo il conteggio per categoria
+    filtered_data1 = category_stats(dataset_version)[(selected_variable,)]
 
     # definizione dell'interazione al passaggio del mouse
     highlight = alt.selection_point(
@@ -503,11 +724,11 @@ def barchart():
 
     # creazione dell'istogramma con Altair
     histogram = (
-        alt.Chart(filtered_data1)
+        alt.Chart(chart_data(filtered_data1, [selected_variable, "Count"]))
         .mark_bar(stroke='lightgray', cursor="pointer")  # barre con bordo grigio e cursore a forma di puntatore
         .encode(
             y=alt.Y(f'{selected_variable}:N', sort='-x', title=selected_variable),  # asse y con le categorie ordinate
-            x=alt.X('count()', title='Frequenza dell\'osservazione nel dataset'),  # asse x con la frequenza
+            x=alt.X('Count:Q', title='Frequenza dell\'osservazione nel dataset'),  # asse x con la frequenza
             color=change_color,  # cambio colore al passaggio del mouse
             opacity=change_opacity  # cambio opacità al click
         )
@@ -522,7 +743,7 @@ def barchart():
     )
 
     # visualizzazione del grafico in Streamlit
-    st.altair_chart(histogram, use_container_width=True)
+    show_chart(histogram, "barchart")
 
     st.markdown(
     "Analizzando la distribuzione delle osservazioni in base alla **regione** e alla **rotta migratoria**, si nota che "
@@ -539,7 +760,26 @@ def barchart():
     )
 
 #3. Distribuzione assoluta delle vittime per regione
+# numero di vittime per regione suddivise in uomini, donne, minori e sconosciuti, in formato lungo
+# (una riga per regione e categoria), dalla tabella dei totali per regione salvata con il dataset
+@st.cache_resource
+@profiling.cache_miss
+def victims_by_region(version):
+    categories = ["Male", "Female", "Children", "Unknown"]
+    return (
+        aggregates["regions"]
+        .select("Region", "Total", "Male", "Female", "Children")
+        # calcolo delle vittime di genere sconosciuto
+        .with_columns((pl.col("Total") - (pl.col("Male") + pl.col("Female") + pl.col("Children"))).alias("Unknown"))
+        .with_columns(pl.col(categories).cast(pl.Float64), pl.col("Region").cast(pl.String))
+        .sort("Total", "Region", descending=[True, False])  # ordinamento delle regioni in base al numero di vittime
+        .unpivot(index=["Region", "Total"], on=categories, variable_name="Category", value_name="Count")
+        .collect()
+    )
+
 def piechart():
+    import altair as alt
+
     st.markdown("---")
     st.write("## Distribuzione assoluta delle vittime per regione")
 
@@ -551,51 +791,26 @@ def piechart():
     "le aree maggiormente colpite dal fenomeno."
     )
 
-    # funzione per preparare i dati in un formato adatto alla visualizzazione con Altair
-    def prepare_data_for_alt(df):
-        regions = df['Region'].unique()  # elenco delle regioni uniche nel dataset
-        chart_data = []  # lista per raccogliere i dati trasformati
-
-        for region in regions:
-            regional_data = df[df['Region'] == region]  # filtro dei dati per regione
-            total_deaths = regional_data['Total Number of Dead and Missing'].sum()  # somma totale delle vittime
-            male_deaths = regional_data['Number of Males'].sum()  # numero di vittime maschili
-            female_deaths = regional_data['Number of Females'].sum()  # numero di vittime femminili
-            children_deaths = regional_data['Number of Children'].sum()  # numero di vittime minori di 18 anni
-            unknown_deaths = total_deaths - (male_deaths + female_deaths + children_deaths)  # calcolo delle vittime di genere sconosciuto
-
-            # aggiunta dei dati alla lista in formato strutturato
-            chart_data.extend([
-                {"Region": region, "Category": "Male", "Count": male_deaths, "Total": total_deaths},
-                {"Region": region, "Category": "Female", "Count": female_deaths, "Total": total_deaths},
-                {"Region": region, "Category": "Children", "Count": children_deaths, "Total": total_deaths},
-                {"Region": region, "Category": "Unknown", "Count": unknown_deaths, "Total": total_deaths}
-            ])
-        
-        return pd.DataFrame(chart_data)  # restituisce i dati trasformati come dataframe
-
-    altair_data = prepare_data_for_alt(datapd)  # applicazione della funzione ai dati
-    total_deaths_order = altair_data.groupby("Region")["Total"].max().sort_values(ascending=False).index.tolist()  # ordinamento delle regioni in base al numero di vittime
-    
-    # creazione del grafico di base con aggregazione dei dati
-    base_chart = alt.Chart(altair_data).transform_aggregate(
-        total="sum(Count)", groupby=["Region", "Category", "Total"]
-    )
+    altair_data = victims_by_region(dataset_version)  # dati già aggregati per regione e categoria
+    total_deaths_order = altair_data["Region"].unique(maintain_order=True).to_list()  # regioni già ordinate in base al numero di vittime
+
+    # creazione del grafico di base sui dati già aggregati
+    base_chart = alt.Chart(altair_data)
 
     # creazione del grafico a torta con segmenti colorati per categoria
     base_pie = (
         base_chart.mark_arc(innerRadius=50, outerRadius=80, stroke="white", strokeWidth=0.5).encode(
-            theta=alt.Theta("total:Q", stack=True),  # angolo dei segmenti basato sul numero di vittime
+            theta=alt.Theta("Count:Q", stack=True),  # angolo dei segmenti basato sul numero di vittime
             color=alt.Color("Category:N", scale=alt.Scale(scheme="category10"), title="Categoria"),  # colore in base alla categoria
-            tooltip=["Region:N", "Category:N", alt.Tooltip("total:Q", title="Numero")],  # tooltip con informazioni dettagliate
+            tooltip=["Region:N", "Category:N", alt.Tooltip("Count:Q", title="Numero")],  # tooltip con informazioni dettagliate
         )
     )
 
     # aggiunta delle etichette numeriche all'interno dei segmenti del grafico (non funzionano bene)
     text_pie = (
        base_chart.mark_text(size=12, color="white").encode(
-           theta=alt.Theta("total:Q", stack=True),
-           text=alt.Text("total:Q", format=".0f"),
+           theta=alt.Theta("Count:Q", stack=True),
+           text=alt.Text("Count:Q", format=".0f"),
            radius=alt.value(65),  # sposta le etichette verso l'interno
        )
     )
@@ -620,7 +835,7 @@ def piechart():
     )
 
     # visualizzazione del grafico in Streamlit
-    st.altair_chart(chart, use_container_width=True)
+    show_chart(chart, "piechart")
 
     st.markdown(
     "Dal grafico emerge in modo evidente l'enorme numero di vittime registrate nel **Mediterraneo**, che rappresenta la regione "
@@ -639,7 +854,10 @@ def piechart():
 #NON riesco a sistemare bene le etichette all'interno di ogni torta.
 
 #4. Causa di morte per regione
+@st.fragment
 def stackedbarchart():
+    import altair as alt
+
     st.markdown("---")
     st.write("## Distribuzione Percentuale delle Cause di Morte per Regione")
 
@@ -654,9 +872,9 @@ def stackedbarchart():
     "aree geografiche."
     )
 
-    # calcolo della percentuale di ciascuna causa di morte per regione
-    datapd_counts = datapd.groupby(['Region', 'Cause of Death']).size().reset_index(name='Count')
-    datapd_counts['Percent'] = datapd_counts.groupby('Region')['Count'].transform(lambda x: x / x.sum() * 100)
+    # percentuale di ciascuna causa di morte per regione (tabella incrociata delle statistiche delle categorie)
+    cause_counts = category_stats(dataset_version)[("Region", "Cause of Death")]
+    regions = cause_counts['Region'].unique(maintain_order=True).to_list()
 
     # definizione della mappatura colore personalizzata per ogni causa di morte
     color_mapping = {
@@ -675,18 +893,18 @@ def stackedbarchart():
     # selezione delle regioni da analizzare (massimo 14)
     selected_regions = st.multiselect(
         'Seleziona le regioni da includere (max 14):',
-        options=datapd_counts['Region'].unique(),
-        default=datapd_counts['Region'].unique()[:8],
+        options=regions,
+        default=regions[:8],
         max_selections=14
     )
 
     # filtro dei dati in base alle regioni selezionate
-    filtered_data = datapd_counts[datapd_counts['Region'].isin(selected_regions)]
+    filtered_data = cause_counts.filter(pl.col('Region').is_in(selected_regions))
 
     # selezione della causa di morte per l'ordinamento tramite pulsanti
     selected_cause = st.pills(
         "Seleziona la causa di morte per ordinare le regioni:",
-        options=["None"] + datapd_counts['Cause of Death'].unique().tolist(),
+        options=["None"] + cause_counts['Cause of Death'].unique(maintain_order=True).to_list(),
         default="None"
     )
 
@@ -695,38 +913,27 @@ def stackedbarchart():
         st.warning("Devi selezionare una causa di morte per procedere.")
         return  # esce dalla funzione se la selezione è vuota
 
-    if not filtered_data.empty:
-        # ordinamento solo se una causa di morte è selezionata
+    if not filtered_data.is_empty():
+        # ordinamento solo se una causa di morte è selezionata: la tabella incrociata contiene già le regioni
+        # senza incidenti per quella causa (percentuale 0), quindi basta riordinare le sue righe
         if selected_cause != "None":
-            # aggiunta delle regioni con percentuale 0 per la causa selezionata
-            all_regions = pd.DataFrame({
-                'Region': selected_regions,
-                'Cause of Death': selected_cause,
-                'Count': 0,
-                'Percent': 0
-            })
-            filtered_data = pd.concat([filtered_data, all_regions], ignore_index=True)
-            filtered_data = filtered_data.drop_duplicates(subset=['Region', 'Cause of Death'], keep='first')
-
-            # ordinamento delle regioni in base alla percentuale della causa selezionata
             ordered_regions = (
-                filtered_data[filtered_data['Cause of Death'] == selected_cause]
-                .sort_values(by='Percent', ascending=False)['Region']
-                .tolist()
+                filtered_data
+                .filter(pl.col('Cause of Death') == selected_cause)
+                .sort('Percent', descending=True, maintain_order=True)['Region']
+                .to_list()
             )
-
-            # mantenimento dell'ordine delle regioni
-            filtered_data['Region'] = pd.Categorical(filtered_data['Region'], categories=ordered_regions, ordered=True)
         else:
             # se "None", lascia l'ordine normale
-            ordered_regions = filtered_data['Region'].unique().tolist()
+            ordered_regions = filtered_data['Region'].unique(maintain_order=True).to_list()
 
         # assegna un valore numerico per l'ordinamento della causa di morte
-        filtered_data = filtered_data.copy()  # evita il warning di pandas
-        filtered_data.loc[:, "sort_order"] = filtered_data["Cause of Death"].apply(lambda x: 0 if x == selected_cause else 1)
+        filtered_data = filtered_data.with_columns(
+            (pl.col("Cause of Death") != selected_cause).cast(pl.Int8).alias("sort_order")
+        )
 
         # creazione del grafico a barre impilate con colori espliciti
-        chart = alt.Chart(filtered_data).mark_bar().encode(
+        chart = alt.Chart(chart_data(filtered_data, ["Region", "Cause of Death", "sort_order", "Percent"])).mark_bar().encode(
             y=alt.X('Region:N', title='Regione', sort=ordered_regions),
             x=alt.Y('Percent:Q', title='Percentuale', stack="normalize"),
             color=alt.Color('Cause of Death:N', title='Causa di Morte', scale=color_scale),
@@ -743,7 +950,7 @@ def stackedbarchart():
         )
 
         # visualizzazione del grafico in Streamlit
-        st.altair_chart(chart, use_container_width=True)
+        show_chart(chart, "stackedbarchart")
     else:
         st.warning("Nessuna regione selezionata.")  # messaggio di avviso se non ci sono regioni selezionate
 
@@ -763,8 +970,126 @@ def stackedbarchart():
 
 ###################################################################################################################################
 # ANALISI GEOSPAZIALE
+# colonne usate dalle mappe
+GEO_COLUMNS = [
+    "id", "lat", "lng", "radius", "Total Number of Dead and Missing", "Incident Date", "Incident_Date",
+    "Region", "Cause of Death", "Migrantion route"
+]
+
+# dataset con la posizione di ogni incidente ("id"), che identifica gli incidenti tra le mappe e le tabelle dei dettagli
+def indexed_dataset():
+    return dataset.with_row_index("id")
+
+# selezione degli incidenti con coordinate valide (lat/lng già calcolate al caricamento dei dati) da un LazyFrame
+# con "id", con il raggio dei punti proporzionale alla radice quadrata del numero totale di morti e dispersi;
+# vengono lette solo le colonne usate dalle mappe
+def geo_points(incidents):
+    return (
+        incidents
+        .filter(pl.col("coord_issue").is_null())
+        .with_columns(pl.col("Total Number of Dead and Missing").sqrt().alias("radius"))
+        .select(GEO_COLUMNS)
+        .collect()
+    )
+
+# tutti gli incidenti con coordinate valide, estratti una sola volta per versione del dataset
+@st.cache_resource
+@profiling.cache_miss
+@shared_cache
+def valid_points(version):
+    return geo_points(indexed_dataset())
+
+# numero di incidenti esclusi dalle mappe per ogni tipo di problema nelle coordinate
+@st.cache_resource
+@profiling.cache_miss
+@shared_cache
+def coord_issue_counts(version):
+    return (
+        dataset
+        .filter(pl.col("coord_issue").is_not_null())
+        .group_by("coord_issue")
+        .len()
+        .sort("coord_issue")
+        .collect()
+    )
+
+# righe del dataset corrispondenti agli "id" indicati, nello stesso ordine
+def incident_details(ids, columns):
+    ids = pl.Series("id", ids, dtype=pl.UInt32)
+    details = indexed_dataset().filter(pl.col("id").is_in(ids)).select("id", *columns).collect()
+    return ids.to_frame().join(details, on="id", how="left").drop("id")
+
+# costruzione dei dati da inviare a un layer pydeck: solo le colonne usate dal layer, con nomi brevi
+# (i record vengono serializzati in JSON e ripetono i nomi delle colonne per ogni punto),
+# coordinate e raggio arrotondati e colori come interi a 8 bit.
+# per i layer interattivi si aggiungono i campi del tooltip ("tooltip") e "id", l'indice dell'incidente
+# nel dataframe, usato per recuperare i dettagli lato server solo al click
+def layer_data(df, radius=True, weight=None, color=None, tooltip=("total", "date")):
+    import pandas as pd
+
+    layer_df = pd.DataFrame({
+        "lng": df["lng"].to_numpy().round(4),  # precisione di circa 10 metri
+        "lat": df["lat"].to_numpy().round(4)
+    })
+    if radius:
+        layer_df["radius"] = df["radius"].to_numpy().round(2)
+    if weight is not None:
+        layer_df["weight"] = np.asarray(weight).round(3)
+    if color is not None:
+        layer_df["color"] = list(np.asarray(color, dtype=np.uint8).tolist())
+    if tooltip:
+        layer_df["id"] = df["id"].to_numpy()
+    if "total" in tooltip:
+        layer_df["total"] = df["Total Number of Dead and Missing"].to_numpy()
+    if "date" in tooltip:
+        layer_df["date"] = df["Incident Date"].fill_null("").to_numpy()
+    return layer_df
+
+# Deck pydeck serializzato in JSON compatto: pydeck indenta il JSON, che per layer con migliaia
+# di punti raddoppia la dimensione dei dati inviati al browser (la classe viene creata al primo utilizzo,
+# insieme all'import di pydeck)
+@functools.cache
+def compact_deck_class():
+    import pydeck as pdk
+    from pydeck.bindings.json_tools import default_serialize
+
+    class CompactDeck(pdk.Deck):
+        def to_json(self):
+            with profiling.section("pydeck to_json"):
+                return json.dumps(self, sort_keys=True, default=default_serialize, separators=(",", ":"))
+
+    return CompactDeck
+
+def compact_deck(**kwargs):
+    return compact_deck_class()(**kwargs)
+
+# dettagli degli incidenti selezionati con un click su una mappa pydeck, recuperati dal dataframe lato server
+def selected_incidents(event, layer_id):
+    objects = event.selection.objects.get(layer_id, []) if event else []
+    if objects:
+        st.markdown("#### Dettagli dell'incidente selezionato")
+        st.dataframe(
+            incident_details([obj["id"] for obj in objects], [
+                "Incident Date", "Region", "Total Number of Dead and Missing", "Number of Survivors",
+                "Cause of Death", "Migrantion route", "Coordinates", "URL"
+            ]),
+            use_container_width=True,
+            hide_index=True
+        )
+
+# indice spaziale costruito una sola volta per versione del dataset e condiviso tra le sessioni
+@st.cache_resource
+@profiling.cache_miss
+def spatial_index(version):
+    points = valid_points(version)
+    return SpatialIndex(points["lat"].to_numpy(), points["lng"].to_numpy(), points["id"].to_numpy())
+
 #1. Mappa dei punti sulla base delle coordinate
+# frammento: la selezione di un punto riesegue solo questa mappa e i dettagli dell'incidente, non le altre sezioni
+@st.fragment
 def points_map(map_style):
+    import pydeck as pdk
+
     st.write("## Mappa dei punti sulla base delle coordinate")
 
     st.write("""
@@ -773,26 +1098,22 @@ def points_map(map_style):
     eventi con un maggior numero di vittime sono visualizzati con punti più grandi.
     """)
 
-    # pulizia del dataframe eliminando righe con valori NaN nella colonna 'Coordinates' e creazione di una copia
-    datapd_cleaned = datapd.dropna(subset=["Coordinates"]).copy()
-
-    # conversione delle coordinate in liste di float, invertendo l'ordine latitudine/longitudine
-    datapd_cleaned["Coordinates"] = datapd_cleaned["Coordinates"].apply(
-        lambda x: [float(coord.strip()) for coord in x.split(",")][::-1]  # inverte l'ordine lat/lon
-    )
-
-    # calcolo del raggio dei punti sulla base della radice quadrata del numero totale di morti e dispersi
-    datapd_cleaned["radius"] = datapd_cleaned["Total Number of Dead and Missing"].apply(
-        lambda x: math.sqrt(x)
-    )
+    # selezione degli incidenti con coordinate valide
+    points_cleaned = valid_points(dataset_version)
 
-    # separazione delle coordinate in colonne distinte per latitudine e longitudine
-    datapd_cleaned[["lng", "lat"]] = pd.DataFrame(datapd_cleaned["Coordinates"].tolist(), index=datapd_cleaned.index)
+    # segnalazione degli incidenti esclusi perché privi di coordinate valide
+    excluded = coord_issue_counts(dataset_version)
+    if not excluded.is_empty():
+        st.caption(
+            f"{excluded['len'].sum()} incidenti non sono rappresentati sulle mappe per coordinate non valide ("
+            + ", ".join(f"{issue}: {count}" for issue, count in excluded.iter_rows()) + ")."
+        )
 
     # creazione del layer di visualizzazione con Pydeck
     layer = pdk.Layer(
         "ScatterplotLayer",
-        datapd_cleaned,
+        layer_data(points_cleaned),  # solo le colonne necessarie al layer
+        id="points",
         pickable=True,  # abilita il tooltip interattivo
         opacity=1,  # opacità completa dei punti
         stroked=True,  # bordo visibile sui punti
@@ -801,7 +1122,7 @@ def points_map(map_style):
         radius_min_pixels=1.5,  # dimensione minima dei punti
         radius_max_pixels=1000,  # dimensione massima dei punti
         line_width_min_pixels=1,  # spessore minimo del bordo dei punti
-        get_position="Coordinates",  # specifica che i dati delle coordinate saranno usati per posizionare i punti
+        get_position=["lng", "lat"],  # utilizzo delle coordinate lat/lon
         get_radius="radius",  # dimensione del punto basata sulla variabile 'radius'
         get_fill_color=[204, 0, 0],  # colore dei punti rosso
         get_line_color=[0, 0, 0],  # bordo dei punti nero
@@ -809,24 +1130,26 @@ def points_map(map_style):
     )
 
     # configurazione della vista iniziale della mappa
-    view = pdk.data_utils.compute_view(datapd_cleaned[["lng", "lat"]])  # calcola la vista ottimale basata sui dati
-    view.zoom = 1  # livello di zoom iniziale
-    view.latitude = 30  # latitudine centrale della vista
-    view.longitude = -8  # longitudine centrale della vista
-    view.max_zoom = 8  # massimo livello di zoom consentito
-    view.min_zoom = 0.7  # minimo livello di zoom consentito
+    view = pdk.ViewState(
+        zoom=1,  # livello di zoom iniziale
+        latitude=30,  # latitudine centrale della vista
+        longitude=-8,  # longitudine centrale della vista
+        max_zoom=8,  # massimo livello di zoom consentito
+        min_zoom=0.7  # minimo livello di zoom consentito
+    )
 
     # configurazione della mappa Pydeck con il layer di punti
-    map_deck = pdk.Deck(
+    map_deck = compact_deck(
         layers=[layer],  # aggiunge il layer dei punti
         initial_view_state=view,  # imposta la vista iniziale della mappa
-        tooltip={"html": "Totale di morti e dispersi: {Total Number of Dead and Missing}<br>Data della tragedia: {Incident Date}"},  # tooltip con dati interattivi
+        tooltip={"html": "Totale di morti e dispersi: {total}<br>Data della tragedia: {date}"},  # tooltip con dati interattivi
         map_provider="mapbox",  # provider della mappa
         map_style=map_style  # stile della mappa (politica o satellitare)
     )
 
-    # visualizzazione della mappa in Streamlit
-    st.pydeck_chart(map_deck)
+    # visualizzazione della mappa in Streamlit; il click su un punto mostra i dettagli dell'incidente
+    event = st.pydeck_chart(map_deck, on_select="rerun", selection_mode="single-object", key="points_map")
+    selected_incidents(event, "points")
 
     st.write("""
     Questa mappa mette in evidenza come il fenomeno delle tragedie migratorie non sia limitato all’Europa o al Nord America, 
@@ -841,10 +1164,72 @@ def points_map(map_style):
     per affrontare le cause profonde delle migrazioni forzate e garantire percorsi più sicuri per chi è costretto a fuggire.
     """)
 
-    return datapd_cleaned
-
 #2. Heatmap dei punti sulla base delle coordinate
-def heatmap(datapd_cleaned, map_style):
+# risoluzioni disponibili per la griglia aggregata (lato della cella in gradi)
+GRID_RESOLUTIONS = {
+    "Bassa (4°)": 4.0,
+    "Media (2°)": 2.0,
+    "Alta (1°)": 1.0,
+    "Molto alta (0.5°)": 0.5
+}
+
+# dati della heatmap con i pesi già normalizzati rispetto al valore massimo,
+# calcolati una sola volta per versione del dataset
+@st.cache_resource
+@profiling.cache_miss
+def heatmap_points(version):
+    points = valid_points(version)
+    weight = (points["Total Number of Dead and Missing"] / points["Total Number of Dead and Missing"].max()).to_numpy() * 100
+    return layer_data(points, radius=False, weight=weight, tooltip=())
+
+# aggregazione lato server degli incidenti in una griglia regolare di latitudine/longitudine:
+# per ogni cella somma di morti e dispersi e numero di incidenti
+@st.cache_resource
+@profiling.cache_miss
+@shared_cache
+def grid_cells(version, cell_size):
+    return (
+        dataset
+        .filter(pl.col("coord_issue").is_null())
+        .group_by(
+            ((pl.col("lng") / cell_size).floor() * cell_size).alias("lng0"),
+            ((pl.col("lat") / cell_size).floor() * cell_size).alias("lat0")
+        )
+        .agg(
+            pl.col("Total Number of Dead and Missing").sum().alias("total"),
+            pl.len().alias("incidents")
+        )
+        .collect()
+    )
+
+# celle della griglia con il colore già assegnato (scala logaritmica), così il browser deve solo disegnare le celle.
+# il risultato è in cache per risoluzione e versione del dataset
+@st.cache_resource
+@profiling.cache_miss
+def grid_bins(version, cell_size):
+    import pandas as pd
+
+    cells = grid_cells(version, cell_size)
+
+    # indice del colore nella scala in base al logaritmo del totale, normalizzato sul valore massimo
+    intensity = np.log1p(cells["total"].to_numpy()) / max(np.log1p(cells["total"].max() or 0), 1e-9)
+    color_index = np.minimum((intensity * len(COLOR_BREWER_SCALE5)).astype(int), len(COLOR_BREWER_SCALE5) - 1)
+
+    lng0 = cells["lng0"].to_numpy()
+    lat0 = cells["lat0"].to_numpy()
+    lng1 = lng0 + cell_size
+    lat1 = lat0 + cell_size
+    return pd.DataFrame({
+        "polygon": np.stack([lng0, lat0, lng1, lat0, lng1, lat1, lng0, lat1], axis=1).reshape(-1, 4, 2).round(4).tolist(),
+        "color": np.asarray(COLOR_BREWER_SCALE5)[color_index].tolist(),
+        "total": cells["total"].to_numpy(),
+        "incidents": cells["incidents"].to_numpy()
+    })
+
+@st.fragment
+def heatmap(map_style):
+    import pydeck as pdk
+
     st.markdown("---")
     st.write("## Heatmap delle regioni geografiche più colpite")
 
@@ -854,55 +1239,83 @@ def heatmap(datapd_cleaned, map_style):
     dove il fenomeno è particolarmente critico. La mappa è interattiva e si adatta dinamicamente allo zoom, permettendo 
     di osservare i dettagli con maggiore precisione a seconda del livello di ingrandimento. Questa funzionalità consente 
     di esplorare l’impatto della crisi migratoria sia a livello globale che locale.
+
+    In alternativa è possibile visualizzare una **griglia aggregata**: gli incidenti vengono raggruppati in celle di 
+    latitudine e longitudine della risoluzione scelta, e ogni cella è colorata in base alla somma di morti e dispersi. 
+    L'aggregazione è calcolata una sola volta lato server, rendendo la mappa più leggera sui dispositivi meno potenti.
     """)
 
-    # calcolo dei pesi per la heatmap, normalizzando rispetto al valore massimo
-    datapd_cleaned["weight"] = (
-        datapd_cleaned["Total Number of Dead and Missing"] / datapd_cleaned["Total Number of Dead and Missing"].max()
-    ) * 100
+    # selezione della modalità di visualizzazione
+    heatmap_mode = st.pills(
+        "Seleziona la modalità di visualizzazione",
+        ["Heatmap", "Griglia aggregata"],
+        default="Heatmap",
+        key="heatmap_mode"
+    )
 
     # configurazione della vista iniziale della mappa
-    view = pdk.data_utils.compute_view(datapd_cleaned[["lng", "lat"]])  # calcola una vista ottimale basata sui dati
-    view.zoom = 1.4  # livello di zoom iniziale
-    view.latitude = 30  # latitudine centrale della vista
-    view.longitude = -43  # longitudine centrale della vista
-    view.max_zoom = 8  # massimo livello di zoom consentito
-    view.min_zoom = 0.7  # minimo livello di zoom consentito
-
-    # definizione della scala di colori per la heatmap
-    COLOR_BREWER_SCALE5 = [
-        [230, 0, 0],     
-        [204, 0, 0],     
-        [179, 0, 0],     
-        [153, 0, 0],   
-        [128, 0, 0],
-        [102, 0, 0],
-        [77, 0, 0],
-        [51, 0, 0],
-        [26, 0, 0]
-    ]
-
-    # configurazione del layer della heatmap con Pydeck
-    heatmap_layer = pdk.Layer(
-        "HeatmapLayer",
-        data=datapd_cleaned,
-        opacity=0.9,  # opacità del layer
-        get_position=["lng", "lat"],  # coordinate lat/lon
-        aggregation=pdk.types.String("SUM"),  # aggregazione basata sulla somma dei valori
-        color_range=COLOR_BREWER_SCALE5,  # utilizza la lista di colori predefinita
-        threshold=0.07,  # soglia abbassata per rendere la heatmap più visibile
-        get_weight="weight",  # peso dei punti in base ai dati
-        pickable=True,  # abilita il tooltip per ogni punto
-        stroked=True  # bordo visibile intorno ai punti
+    view = pdk.ViewState(
+        zoom=1.4,  # livello di zoom iniziale
+        latitude=30,  # latitudine centrale della vista
+        longitude=-43,  # longitudine centrale della vista
+        max_zoom=8,  # massimo livello di zoom consentito
+        min_zoom=0.7  # minimo livello di zoom consentito
     )
 
+    if heatmap_mode == "Griglia aggregata":
+        # selezione della risoluzione della griglia
+        resolution = st.select_slider(
+            "Seleziona la risoluzione della griglia",
+            options=list(GRID_RESOLUTIONS.keys()),
+            value="Alta (1°)",
+            key="grid_resolution"
+        )
+
+        # configurazione del layer con le celle già aggregate
+        cell_size = GRID_RESOLUTIONS[resolution]
+        heatmap_layer = pdk.Layer(
+            "PolygonLayer",
+            grid_bins(dataset_version, cell_size),
+            opacity=0.8,  # opacità del layer
+            stroked=False,  # nessun bordo tra le celle
+            filled=True,  # celle piene
+            get_polygon="polygon",  # vertici della cella
+            get_fill_color="color",  # colore già calcolato in base al totale
+            pickable=True  # abilita il tooltip per ogni cella
+        )
+        tooltip = {"html": "Morti e dispersi: {total}<br>Incidenti: {incidents}"}
+
+        # legenda: totale di morti e dispersi per cella, in scala logaritmica fino alla cella con il totale più alto
+        legend = color_scale_legend(
+            COLOR_BREWER_SCALE5, "Morti e dispersi per cella (scala logaritmica)", st.get_option("theme.base") or "dark",
+            vmax=int(grid_cells(dataset_version, cell_size)["total"].max() or 0), log=True
+        )
+    else:
+        # configurazione del layer della heatmap con Pydeck, con i pesi già calcolati
+        heatmap_layer = pdk.Layer(
+            "HeatmapLayer",
+            data=heatmap_points(dataset_version),  # solo coordinate e pesi
+            opacity=0.9,  # opacità del layer
+            get_position=["lng", "lat"],  # coordinate lat/lon
+            aggregation=pdk.types.String("SUM"),  # aggregazione basata sulla somma dei valori
+            color_range=COLOR_BREWER_SCALE5,  # utilizza la lista di colori predefinita
+            threshold=0.07,  # soglia abbassata per rendere la heatmap più visibile
+            get_weight="weight",  # peso dei punti in base ai dati
+            pickable=True,  # abilita il tooltip per ogni punto
+            stroked=True  # bordo visibile intorno ai punti
+        )
+        tooltip = {"text": "Heatmap basata sui pesi calcolati"}
+
+        # legenda: densità relativa, con i pesi normalizzati tra 0 e 100
+        legend = color_scale_legend(COLOR_BREWER_SCALE5, "Densità relativa di morti e dispersi", st.get_option("theme.base") or "dark")
+
     # creazione della mappa Pydeck
-    heatmap_map = pdk.Deck(
+    heatmap_map = compact_deck(
         layers=[heatmap_layer],  # aggiunta del layer della heatmap
         initial_view_state=view,  # impostazione della vista iniziale della mappa
         map_provider="mapbox",  # provider della mappa
         map_style=map_style,  # stile della mappa (politica o satellitare)
-        tooltip={"text": "Heatmap basata sui pesi calcolati"}  # tooltip interattivo
+        tooltip=tooltip  # tooltip interattivo
     )
 
     # layout con colonna per la heatmap e colorbar a fianco
@@ -912,34 +1325,8 @@ def heatmap(datapd_cleaned, map_style):
         st.pydeck_chart(heatmap_map, use_container_width=True)  # visualizzazione della mappa in Streamlit
 
     with col2:
-        # creazione della colorbar con Matplotlib
-        fig, ax = plt.subplots(figsize=(0.6, 8))  # altezza aumentata per allinearla alla mappa
-        cmap = plt.matplotlib.colors.LinearSegmentedColormap.from_list("custom_cmap", np.array(COLOR_BREWER_SCALE5) / 255)
-        norm = plt.Normalize(vmin=0, vmax=100)  # normalizzazione tra 0 e 100
-
-        # creazione della barra dei colori
-        cb = plt.colorbar(plt.cm.ScalarMappable(norm=norm, cmap=cmap), cax=ax, orientation='vertical')
-        cb.set_label("Densità relativa di morti e dispersi", fontsize=10, labelpad=10, color="white")  # etichetta della colorbar
-
-        # impostazione del colore del testo e dei numeri in bianco
-        cb.ax.yaxis.set_tick_params(color='white')
-        cb.ax.yaxis.label.set_color('white')
-        plt.setp(ax.yaxis.get_ticklabels(), color="white")
-
-        # rende i bordi della colorbar bianchi
-        cb.outline.set_edgecolor("white")
-
-        # allineamento della colorbar alla mappa
-        ax.set_aspect(0.35)  # proporzione verticale migliorata
-        plt.subplots_adjust(left=0.4, right=0.6, top=1, bottom=0)  # rimozione spazio in eccesso
-
-        # salvataggio dell'immagine in un buffer
-        buf = io.BytesIO()
-        plt.savefig(buf, format="png", bbox_inches="tight", transparent=True)
-        buf.seek(0)
-
-        # visualizzazione della colorbar in Streamlit
-        st.image(buf, use_container_width=True)
+        # legenda della scala colori come gradiente HTML, costruita una sola volta per scala, etichetta, tema e intervallo
+        st.markdown(legend, unsafe_allow_html=True)
     
     st.write("""
     Questa heatmap fornisce un'evidenza visiva dell'entità della crisi migratoria, mettendo in luce le regioni del mondo 
@@ -954,7 +1341,10 @@ def heatmap(datapd_cleaned, map_style):
     """)
 
 #3. Mappa dei punti colorati per categoria
-def points_map_by_cat(datapd_cleaned, map_style):
+@st.fragment
+def points_map_by_cat(points_cleaned, map_style):
+    import pydeck as pdk
+
     st.markdown("---")
     st.write("## Mappa dei punti colorati per categoria")
 
@@ -981,11 +1371,12 @@ def points_map_by_cat(datapd_cleaned, map_style):
         st.warning("Seleziona una categoria per procedere.")
         return
     
-    # rimozione delle righe con valori NaN nella categoria selezionata
-    datapd_filtered = datapd_cleaned.dropna(subset=[selected_category]).copy()
+    # rimozione delle righe con valori mancanti nella categoria selezionata
+    points_filtered = points_cleaned.filter(pl.col(selected_category).is_not_null())
+    category = points_filtered[selected_category].cast(pl.String)
 
     # creazione di una mappatura colori per le categorie uniche presenti nei dati
-    unique_categories = datapd_filtered[selected_category].unique()
+    unique_categories = category.unique(maintain_order=True).to_list()
     color_palette = [
         [255, 0, 0],    # rosso
         [0, 255, 0],    # verde
@@ -1012,13 +1403,20 @@ def points_map_by_cat(datapd_cleaned, map_style):
     ]
  
     # associazione di un colore a ogni categoria unica
-    color_mapping = {category: color_palette[i % len(color_palette)] for i, category in enumerate(unique_categories)}
-    datapd_filtered["color"] = datapd_filtered[selected_category].map(color_mapping)
+    color_mapping = {name: color_palette[i % len(color_palette)] for i, name in enumerate(unique_categories)}
+    colors = np.asarray(list(color_mapping.values()))[
+        category.replace_strict(unique_categories, list(range(len(unique_categories))), return_dtype=pl.Int32).to_numpy()
+    ]
+
+    # dati del layer: coordinate, raggio, colore e categoria per il tooltip
+    points = layer_data(points_filtered, color=colors, tooltip=("total",))
+    points["category"] = category.to_numpy()
 
     # creazione del layer Pydeck per visualizzare i punti sulla mappa
     layer = pdk.Layer(
         "ScatterplotLayer",
-        datapd_filtered,
+        points,
+        id="points_by_cat",
         pickable=True,  # abilita il tooltip interattivo
         opacity=1,  # opacità dei punti
         stroked=True,  # bordo visibile intorno ai punti
@@ -1037,19 +1435,20 @@ def points_map_by_cat(datapd_cleaned, map_style):
     view = pdk.ViewState(latitude=30, longitude=-8, zoom=1, max_zoom=8, min_zoom=0.7)
 
     # creazione della mappa Pydeck con il layer dei punti
-    map_deck = pdk.Deck(
+    map_deck = compact_deck(
         layers=[layer],  # aggiunta del layer dei punti
         initial_view_state=view,  # impostazione della vista iniziale della mappa
         tooltip={
-            "html": f"{selected_category}: {{{selected_category}}}<br>Totale morti e dispersi: {{Total Number of Dead and Missing}}",
+            "html": f"{selected_category}: {{category}}<br>Totale morti e dispersi: {{total}}",
             "style": {"color": "white"},
         },
         map_provider="mapbox",  # provider della mappa
         map_style=map_style  # stile della mappa (politica o satellitare)
     )
 
-    # visualizzazione della mappa in Streamlit
-    st.pydeck_chart(map_deck)
+    # visualizzazione della mappa in Streamlit; il click su un punto mostra i dettagli dell'incidente
+    event = st.pydeck_chart(map_deck, on_select="rerun", selection_mode="single-object", key="points_map_by_cat")
+    selected_incidents(event, "points_by_cat")
 
     # aggiunta della legenda con i colori associati alle categorie
     st.write("#### Legenda dei colori")
@@ -1081,95 +1480,150 @@ def points_map_by_cat(datapd_cleaned, map_style):
     permettendo di visualizzare chiaramente le principali rotte seguite dai migranti e le aree in cui si verificano i maggiori eventi tragici.
     """)
 
+# luoghi di riferimento proposti per l'esplorazione di un'area (latitudine, longitudine)
+DRILLDOWN_PLACES = {
+    "Lampedusa": (35.50, 12.60),
+    "Stretto di Gibilterra": (35.95, -5.60),
+    "Isole Canarie": (28.10, -15.40),
+    "Agadez (Niger)": (16.97, 7.99),
+    "Tijuana / San Diego": (32.53, -117.03),
+    "Rio Grande (Texas)": (26.20, -98.20),
+    "Golfo del Bengala": (20.50, 91.50),
+    "Coordinate personalizzate": None
+}
 
-################################################################################################################
-# ANALISI DEI GRUPPI
-#1. Gruppo del mediterraneo
-def mediterranean_group(map_style):
-    st.write("### Gruppo dei punti nel Mediterraneo")
+#4. Esplorazione di un'area tramite l'indice spaziale
+@st.fragment
+def area_drilldown(map_style):
+    import pydeck as pdk
 
-    st.markdown("""
-    Come abbiamo già ampiamente affrontato nelle analisi precedenti, il Mediterraneo rappresenta una delle rotte migratorie più pericolose al mondo, 
-    con un elevato numero di incidenti che coinvolgono migranti in fuga da conflitti, persecuzioni e crisi economiche. 
-    La mappa seguente evidenzia la distribuzione degli eventi in questa regione, concentrati principalmente nel Mediterraneo centrale e orientale.
-    """)
+    st.write("## Esplorazione di un'area")
 
-    # filtriamo il dataframe per la regione "Mediterranean", rimuovendo righe con valori NaN nelle coordinate
-    datapd_med = datapd[datapd["Region"] == "Mediterranean"].dropna(subset=["Coordinates"]).copy()
+    st.write("""
+    È possibile approfondire l'analisi su un'area specifica, selezionando gli incidenti avvenuti entro una certa distanza 
+    da un luogo, i più vicini a esso oppure quelli all'interno di un'area rettangolare.
+    """)
 
-    # conversione delle coordinate in liste di float, invertendo l'ordine latitudine/longitudine
-    datapd_med["Coordinates"] = datapd_med["Coordinates"].apply(
-        lambda x: [float(coord.strip()) for coord in x.split(",")][::-1]  # invertiamo l'ordine lat/lon
-    )
+    index = spatial_index(dataset_version)
 
-    # calcolo del raggio dei punti sulla base della radice quadrata del numero totale di morti e dispersi
-    datapd_med["radius"] = datapd_med["Total Number of Dead and Missing"].apply(
-        lambda x: math.sqrt(x)
+    # selezione del tipo di ricerca e del luogo di riferimento
+    query_type = st.pills(
+        "Seleziona il tipo di ricerca",
+        ["Entro una distanza", "Incidenti più vicini", "Area rettangolare"],
+        default="Entro una distanza",
+        key="drilldown_query"
     )
+    if not query_type:
+        st.warning("Seleziona un tipo di ricerca.")
+        return
 
-    # separazione delle coordinate in colonne distinte per latitudine e longitudine
-    datapd_med[["lng", "lat"]] = pd.DataFrame(datapd_med["Coordinates"].tolist(), index=datapd_med.index)
-
-    # creazione di un array numpy con tutte le coordinate aggiornate
-    points = np.array(datapd_med[["lng", "lat"]])
-
-    # calcolo dell'inviluppo convesso (convex hull) per delineare un poligono attorno ai punti
-    hull = ConvexHull(points)
-    hull_coordinates = [points[i].tolist() for i in hull.vertices]
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        place = st.selectbox("Luogo di riferimento", list(DRILLDOWN_PLACES), key="drilldown_place")
+    default_lat, default_lng = DRILLDOWN_PLACES[place] or (35.50, 12.60)
+    with col2:
+        lat = st.number_input("Latitudine", -90.0, 90.0, default_lat, step=0.1, disabled=place != "Coordinate personalizzate", key=f"drilldown_lat_{place}")
+    with col3:
+        lng = st.number_input("Longitudine", -180.0, 180.0, default_lng, step=0.1, disabled=place != "Coordinate personalizzate", key=f"drilldown_lng_{place}")
+
+    # interrogazione dell'indice spaziale
+    distances = None
+    if query_type == "Entro una distanza":
+        radius_km = st.slider("Distanza (km)", min_value=5, max_value=1000, value=50, step=5, key="drilldown_radius")
+        ids, distances = index.within_radius(lat, lng, radius_km)
+        zoom = float(np.clip(np.log2(20000 / radius_km), 2, 10))
+    elif query_type == "Incidenti più vicini":
+        k = st.slider("Numero di incidenti", min_value=1, max_value=200, value=20, key="drilldown_k")
+        ids, distances = index.nearest(lat, lng, k)
+        # zoom dalla distanza del più lontano; con l'indice vuoto non ci sono distanze (il caso viene segnalato sotto)
+        farthest_km = distances.max() if len(distances) else 0
+        zoom = float(np.clip(np.log2(20000 / max(farthest_km, 5)), 2, 10))
+    else:
+        half_side = st.slider("Semi-lato dell'area (gradi)", min_value=0.5, max_value=20.0, value=2.0, step=0.5, key="drilldown_box")
+        lng_min = (lng - half_side + 180) % 360 - 180  # normalizzazione in [-180, 180)
+        lng_max = (lng + half_side + 180) % 360 - 180
+        ids = index.in_bbox(lat - half_side, lat + half_side, lng_min, lng_max)
+        zoom = float(np.clip(np.log2(180 / half_side), 2, 10))
+
+    if len(ids) == 0:
+        st.warning("Nessun incidente nell'area selezionata.")
+        return
 
-    # chiudiamo il poligono tornando al primo punto
-    hull_coordinates.append(hull_coordinates[0])
+    selected = geo_points(indexed_dataset().filter(pl.col("id").is_in(pl.Series(ids, dtype=pl.UInt32))))
+    st.markdown(
+        f"Nell'area selezionata si trovano **{selected.height} incidenti**, "
+        f"con **{int(selected['Total Number of Dead and Missing'].sum())}** morti e dispersi."
+    )
 
-    # creazione del layer Pydeck per visualizzare i punti sulla mappa
-    points_layer = pdk.Layer(
+    # mappa degli incidenti selezionati con il luogo di riferimento
+    layer = pdk.Layer(
         "ScatterplotLayer",
-        datapd_med,
+        layer_data(selected),  # solo le colonne necessarie al layer
+        id="drilldown_points",
         pickable=True,  # abilita il tooltip interattivo
-        opacity=1,  # opacità completa dei punti
+        opacity=0.8,  # opacità dei punti
         stroked=True,  # bordo visibile intorno ai punti
         filled=True,  # punti pieni
-        radius_scale=1000,  # scala del raggio per migliorare la leggibilità
+        radius_scale=500,  # scala del raggio per migliorare la leggibilità
         radius_min_pixels=2,  # dimensione minima dei punti
         radius_max_pixels=1000,  # dimensione massima dei punti
         line_width_min_pixels=1,  # spessore minimo del bordo dei punti
-        get_position="Coordinates",  # utilizzo delle coordinate lat/lon
+        get_position=["lng", "lat"],  # utilizzo delle coordinate lat/lon
         get_radius="radius",  # dimensione del punto basata sulla variabile 'radius'
-        get_fill_color=[204, 0, 0],  # colore dei punti rosso
+        get_fill_color=[255, 0, 0],  # colore dei punti rosso
         get_line_color=[0, 0, 0],  # bordo dei punti nero
     )
-
-    # creazione del layer Pydeck con il poligono convesso che racchiude i punti
-    polygon_data = [
-        {"polygon": hull_coordinates, "name": "Mediterranean Convex Hull"}
-    ]
-
-    polygon_layer = pdk.Layer(
-        "PolygonLayer",
-        polygon_data,
-        stroked=True,  # bordo visibile del poligono
-        filled=True,  # riempimento del poligono
-        line_width_min_pixels=2,  # spessore minimo del bordo
-        get_polygon="polygon",  # specifica che i dati delle coordinate saranno usati per creare il poligono
-        get_fill_color=[255, 255, 255, 150],  # colore di riempimento bianco semi-trasparente
-        get_line_color=[255, 255, 255],  # bordo bianco
+    center_layer = pdk.Layer(
+        "ScatterplotLayer",
+        [{"lng": lng, "lat": lat}],
+        get_position=["lng", "lat"],  # luogo di riferimento
+        get_radius=1,
+        radius_min_pixels=6,  # dimensione fissa del marcatore
+        get_fill_color=[255, 255, 255],  # marcatore bianco
+        get_line_color=[0, 0, 0],
+        stroked=True,
+        line_width_min_pixels=2,
     )
-
-    # configurazione della vista iniziale della mappa
-    view = pdk.ViewState(latitude=37, longitude=13.7, zoom=3.4, min_zoom=3.1, max_zoom=8)
-
-    # creazione della mappa Pydeck con entrambi i layer (punti e poligono)
-    map_deck = pdk.Deck(
-        layers=[polygon_layer, points_layer],  # sovrapposizione dei layer
-        initial_view_state=view,  # impostazione della vista iniziale della mappa
-        tooltip={"html": "Morti e dispersi: {Total Number of Dead and Missing}<br>Data: {Incident Date}"},  # tooltip interattivo
+    map_deck = compact_deck(
+        layers=[layer, center_layer],
+        initial_view_state=pdk.ViewState(latitude=lat, longitude=lng, zoom=zoom, min_zoom=1, max_zoom=12),
+        tooltip={"html": "Morti e dispersi: {total}<br>Data: {date}"},  # tooltip interattivo
         map_provider="mapbox",  # provider della mappa
         map_style=map_style  # stile della mappa (politica o satellitare)
     )
+    event = st.pydeck_chart(map_deck, on_select="rerun", selection_mode="single-object", key="drilldown_map")
+    selected_incidents(event, "drilldown_points")
 
-    # visualizzazione della mappa in Streamlit
-    st.pydeck_chart(map_deck)
+    # elenco degli incidenti dell'area, con la distanza dal luogo di riferimento dove disponibile
+    table = incident_details(ids, [
+        "Incident Date", "Region", "Total Number of Dead and Missing", "Cause of Death", "Migrantion route", "Coordinates"
+    ])
+    if distances is not None:
+        table = table.insert_column(0, pl.Series("Distanza (km)", distances.round(1)))
+    st.dataframe(table, use_container_width=True, hide_index=True)
 
-    st.markdown("""
+
+################################################################################################################
+# ANALISI DEI GRUPPI
+# definizione dichiarativa dei gruppi geografici: ogni gruppo è descritto dal filtro sul dataset,
+# dal bounding box (lat_min, lat_max, lng_min, lng_max), dalle eventuali aree escluse (stessa forma, None = senza limite),
+# dalla vista iniziale della mappa e dai testi di accompagnamento.
+# per aggiungere un nuovo gruppo basta aggiungere una voce a questo dizionario
+GEOGRAPHIC_CLUSTERS = {
+    #1. Gruppo del mediterraneo
+    "mediterranean": {
+        "title": "### Gruppo dei punti nel Mediterraneo",
+        "name": "Mediterranean Convex Hull",
+        "filter": ("Region", ["Mediterranean"]),  # regione "Mediterranean"
+        "bbox": None,
+        "exclude": [],
+        "view": dict(latitude=37, longitude=13.7, zoom=3.4, min_zoom=3.1, max_zoom=8),
+        "intro": """
+    Come abbiamo già ampiamente affrontato nelle analisi precedenti, il Mediterraneo rappresenta una delle rotte migratorie più pericolose al mondo, 
+    con un elevato numero di incidenti che coinvolgono migranti in fuga da conflitti, persecuzioni e crisi economiche. 
+    La mappa seguente evidenzia la distribuzione degli eventi in questa regione, concentrati principalmente nel Mediterraneo centrale e orientale.
+    """,
+        "outro": """
     Il cluster del Mediterraneo mostra una netta concentrazione di eventi tra le coste della Libia e dell'Italia, 
     oltre che lungo la rotta che attraversa il Mar Egeo verso la Grecia. La maggior parte degli incidenti sono naufragi, 
     spesso dovuti a imbarcazioni sovraccariche e condizioni meteorologiche avverse. 
@@ -1182,70 +1636,120 @@ def mediterranean_group(map_style):
     La presenza di reti di trafficanti, che sfruttano la disperazione dei migranti per organizzare viaggi su imbarcazioni precarie, 
     costituisce un ulteriore fattore di rischio. Questi elementi rendono il Mediterraneo un'area di grande interesse per le analisi migratorie e 
     per le politiche di prevenzione delle tragedie in mare.
-    """)
-
-#2. Gruppo del confine tra Messico e Stati Uniti
-def mexico_us_border_group(map_style):
-    st.markdown("---")
-    st.write("### Gruppo dei punti sul confine tra Messico e Stati Uniti")
-
-    st.markdown("""
+    """
+    },
+    #2. Gruppo del confine tra Messico e Stati Uniti
+    "mexico_us_border": {
+        "title": "### Gruppo dei punti sul confine tra Messico e Stati Uniti",
+        "name": "Mexico-US Border Convex Hull",
+        "filter": ("Region", ["North America", "Central America"]),  # regioni "North America" e "Central America"
+        "bbox": (25, 33, -118, -95),  # solo i punti vicini al confine Messico-USA
+        "exclude": [
+            (None, 30, None, -104),  # sud-ovest, Baja California
+            (25, 29, -107, -102),  # zone lontane dal confine
+            (24, 27, -101.5, -99)
+        ],
+        "view": dict(latitude=29, longitude=-107, zoom=4.5, min_zoom=4.1, max_zoom=8),
+        "intro": """
     Dopo aver analizzato la situazione nel Mediterraneo, ci spostiamo ora in America, lungo il confine tra Messico e Stati Uniti, 
     uno dei punti più critici per la migrazione globale. La mappa seguente mostra la distribuzione spaziale degli incidenti in questa regione, 
     con una forte concentrazione di eventi nelle zone desertiche dell’Arizona, del Texas e della California.
-    """)
-
-    # filtriamo il dataframe per le regioni "North America" e "Central America", rimuovendo righe con valori NaN nelle coordinate
-    datapd_border = datapd[datapd["Region"].isin(["North America", "Central America"])].dropna(subset=["Coordinates"]).copy()
-
-    # conversione delle coordinate in liste di float, invertendo l'ordine latitudine/longitudine
-    datapd_border["Coordinates"] = datapd_border["Coordinates"].apply(
-        lambda x: [float(coord.strip()) for coord in x.split(",")][::-1]  # invertiamo l'ordine lat/lon
-    )
-
-    # calcolo del raggio dei punti sulla base della radice quadrata del numero totale di morti e dispersi
-    datapd_border["radius"] = datapd_border["Total Number of Dead and Missing"].apply(
-        lambda x: math.sqrt(x)
-    )
-
-    # separazione delle coordinate in colonne distinte per latitudine e longitudine
-    datapd_border[["lng", "lat"]] = pd.DataFrame(datapd_border["Coordinates"].tolist(), index=datapd_border.index)
-
-    # filtriamo i punti per prendere solo quelli vicini al confine Messico-USA, applicando limiti di latitudine e longitudine
-    datapd_border = datapd_border[
-        (datapd_border["lat"] >= 25) & (datapd_border["lat"] <= 33) &  # limiti di latitudine
-        (datapd_border["lng"] >= -118) & (datapd_border["lng"] <= -95)  # limiti di longitudine
-    ]
-
-    # rimozione dei punti fuori dall'area di interesse (Baja California e altre zone lontane dal confine)
-    datapd_border = datapd_border[
-        ~((datapd_border["lat"] < 30) & (datapd_border["lng"] < -104))  # sud-ovest, Baja California
-    ]
+    """,
+        "outro": """
+    L’analisi del cluster rivela come la maggior parte degli incidenti avvenga lungo i tratti di confine più difficili da attraversare, 
+    spesso lontani dai valichi ufficiali. I migranti, spinti dalla necessità di evitare controlli e pattugliamenti, scelgono percorsi più remoti e pericolosi, 
+    affrontando lunghi tragitti a piedi attraverso il deserto.
 
-    datapd_border = datapd_border[
-    ~((datapd_border["lat"] > 25) & (datapd_border["lat"] < 29) & 
-      (datapd_border["lng"] > -107) & (datapd_border["lng"] < -102))
-    ]
+    Le principali cause di morte registrate sono **disidratazione, esaurimento fisico e ipotermia**, a causa delle condizioni climatiche estreme. 
+    Inoltre, incidenti legati al traffico illecito di persone e agli scontri con le forze dell’ordine o i cartelli criminali rappresentano un ulteriore fattore di rischio. 
 
-    datapd_border = datapd_border[
-    ~((datapd_border["lat"] > 24) & (datapd_border["lat"] < 27) & 
-      (datapd_border["lng"] > -101.5) & (datapd_border["lng"] < -99))
-    ]
+    Le politiche di sicurezza statunitensi, come la costruzione del **muro di confine** e l’aumento dei controlli da parte della Border Patrol, 
+    hanno contribuito a deviare le rotte migratorie verso aree sempre più ostili, aumentando il tasso di mortalità. 
+    L’analisi di questo cluster fornisce dunque una chiara evidenza dell'impatto delle strategie di gestione della frontiera sulla sicurezza e sulla vulnerabilità dei migranti.
+    """
+    },
+    #3. Gruppo del deserto del Sahara
+    "sahara_desert": {
+        "title": "### Gruppo dei punti nel Deserto del Sahara",
+        "name": "Sahara Desert Convex Hull",
+        "filter": ("Migrantion route", ["Sahara Desert crossing"]),  # rotta migratoria "Sahara Desert crossing"
+        "bbox": (12, 35, -15, 40),  # limiti geografici del deserto del Sahara
+        "exclude": [],
+        "view": dict(latitude=24, longitude=13, zoom=3.2, min_zoom=3, max_zoom=8),
+        "intro": """
+    Dopo aver esaminato le rotte migratorie nel Mediterraneo e al confine tra Messico e Stati Uniti, ci spostiamo ora in Africa, 
+    nel **Deserto del Sahara**, un’area estremamente ostile che rappresenta una delle rotte più pericolose per i migranti diretti verso il Nord Africa e l’Europa. 
+    La mappa seguente evidenzia la distribuzione degli incidenti lungo questa tratta, con una concentrazione di eventi nelle aree desertiche tra Niger, Chad, Sudan e Libia.
+    """,
+        "outro": """
+    Il cluster del Sahara evidenzia la pericolosità estrema della traversata, con un elevato numero di incidenti distribuiti lungo le principali rotte che collegano 
+    l’Africa subsahariana alla Libia e all’Algeria. A differenza delle altre due aree analizzate, qui i migranti affrontano lunghi tragitti a piedi o su mezzi di trasporto precari, 
+    come camion sovraccarichi, con scarse possibilità di ricevere soccorso in caso di emergenza.
 
-    # creazione di un array numpy con tutte le coordinate aggiornate
-    points = np.array(datapd_border[["lng", "lat"]])
+    Le principali cause di morte sono **disidratazione, fame ed esposizione prolungata alle condizioni climatiche estreme**. 
+    Inoltre, la presenza di gruppi criminali e milizie armate lungo il percorso aumenta il rischio di violenze, rapimenti e tratta di esseri umani. 
 
-    # calcolo dell'inviluppo convesso (convex hull) per delineare un poligono attorno ai punti
-    hull = ConvexHull(points)
-    hull_coordinates = [points[i].tolist() for i in hull.vertices]
+    La mancanza di infrastrutture e di punti di rifornimento rende il deserto un’area particolarmente letale, con numerosi migranti che scompaiono senza lasciare traccia. 
+    Questa analisi mette in evidenza la necessità di una maggiore attenzione internazionale sulle condizioni dei migranti in transito attraverso il Sahara, 
+    un’area spesso trascurata nel dibattito sulle crisi migratorie globali.
+    """
+    }
+}
 
-    # chiudiamo il poligono tornando al primo punto
-    hull_coordinates.append(hull_coordinates[0])
+# condizione sui punti compresi in un box (lat_min, lat_max, lng_min, lng_max); None indica nessun limite
+def box_mask(box, inclusive=True):
+    mask = pl.lit(True)
+    for column, low, high in (("lat", box[0], box[1]), ("lng", box[2], box[3])):
+        if low is not None:
+            mask &= (pl.col(column) >= low) if inclusive else (pl.col(column) > low)
+        if high is not None:
+            mask &= (pl.col(column) <= high) if inclusive else (pl.col(column) < high)
+    return mask
+
+# punti e poligono convesso di un gruppo geografico, calcolati una sola volta per versione del dataset:
+# le successive esecuzioni (ad esempio il cambio dello stile della mappa) riutilizzano il risultato
+@st.cache_resource
+@profiling.cache_miss
+def cluster_geometry(version, cluster_key):
+    from scipy.spatial import ConvexHull
+
+    cluster = GEOGRAPHIC_CLUSTERS[cluster_key]
+
+    # filtro del dataset, mantenendo solo le coordinate valide
+    column, values = cluster["filter"]
+    incidents = indexed_dataset().filter(pl.col(column).cast(pl.String).is_in(values))
+
+    # applicazione del bounding box e rimozione dei punti nelle aree escluse
+    if cluster["bbox"] is not None:
+        incidents = incidents.filter(box_mask(cluster["bbox"]))
+    for box in cluster["exclude"]:
+        incidents = incidents.filter(~box_mask(box, inclusive=False))
+    points = geo_points(incidents)
+
+    # calcolo dell'inviluppo convesso (convex hull) per delineare un poligono attorno ai punti,
+    # chiuso tornando al primo vertice
+    coordinates = points.select("lng", "lat").to_numpy()
+    hull_coordinates = []
+    if len(coordinates) >= 3:
+        vertices = coordinates[ConvexHull(coordinates).vertices]
+        hull_coordinates = np.vstack([vertices, vertices[:1]]).tolist()
+
+    return layer_data(points), hull_coordinates
+
+# mappa di un gruppo geografico con i punti e il poligono convesso che li racchiude
+def geographic_group(cluster_key, map_style):
+    import pydeck as pdk
+
+    cluster = GEOGRAPHIC_CLUSTERS[cluster_key]
+    st.write(cluster["title"])
+    st.markdown(cluster["intro"])
+
+    points, hull_coordinates = cluster_geometry(dataset_version, cluster_key)
 
     # creazione del layer Pydeck per visualizzare i punti sulla mappa
     points_layer = pdk.Layer(
         "ScatterplotLayer",
-        datapd_border,
+        points,  # solo le colonne necessarie al layer
         pickable=True,  # abilita il tooltip interattivo
         opacity=1,  # opacità completa dei punti
         stroked=True,  # bordo visibile intorno ai punti
@@ -1254,20 +1758,16 @@ def mexico_us_border_group(map_style):
         radius_min_pixels=2,  # dimensione minima dei punti
         radius_max_pixels=1000,  # dimensione massima dei punti
         line_width_min_pixels=1,  # spessore minimo del bordo dei punti
-        get_position="Coordinates",  # utilizzo delle coordinate lat/lon
+        get_position=["lng", "lat"],  # utilizzo delle coordinate lat/lon
         get_radius="radius",  # dimensione del punto basata sulla variabile 'radius'
         get_fill_color=[204, 0, 0],  # colore dei punti rosso
         get_line_color=[0, 0, 0],  # bordo dei punti nero
     )
 
     # creazione del layer Pydeck con il poligono convesso che racchiude i punti
-    polygon_data = [
-        {"polygon": hull_coordinates, "name": "Mexico-US Border Convex Hull"}
-    ]
-
     polygon_layer = pdk.Layer(
         "PolygonLayer",
-        polygon_data,
+        [{"polygon": hull_coordinates, "name": cluster["name"]}] if hull_coordinates else [],  # verifica se ci sono coordinate disponibili
         stroked=True,  # bordo visibile del poligono
         filled=True,  # riempimento del poligono
         line_width_min_pixels=2,  # spessore minimo del bordo
@@ -1276,14 +1776,14 @@ def mexico_us_border_group(map_style):
         get_line_color=[255, 255, 255],  # bordo bianco
     )
 
-    # configurazione della vista iniziale della mappa centrata sulla zona del confine
-    view = pdk.ViewState(latitude=29, longitude=-107, zoom=4.5, min_zoom=4.1, max_zoom=8)
+    # configurazione della vista iniziale della mappa centrata sul gruppo
+    view = pdk.ViewState(**cluster["view"])
 
     # creazione della mappa Pydeck con entrambi i layer (punti e poligono)
-    map_deck = pdk.Deck(
+    map_deck = compact_deck(
         layers=[polygon_layer, points_layer],  # sovrapposizione dei layer
         initial_view_state=view,  # impostazione della vista iniziale della mappa
-        tooltip={"html": "Morti e dispersi: {Total Number of Dead and Missing}<br>Data: {Incident Date}"},  # tooltip interattivo
+        tooltip={"html": "Morti e dispersi: {total}<br>Data: {date}"},  # tooltip interattivo
         map_provider="mapbox",  # provider della mappa
         map_style=map_style  # stile della mappa (politica o satellitare)
     )
@@ -1291,125 +1791,137 @@ def mexico_us_border_group(map_style):
     # visualizzazione della mappa in Streamlit
     st.pydeck_chart(map_deck)
 
-    st.markdown("""
-    L’analisi del cluster rivela come la maggior parte degli incidenti avvenga lungo i tratti di confine più difficili da attraversare, 
-    spesso lontani dai valichi ufficiali. I migranti, spinti dalla necessità di evitare controlli e pattugliamenti, scelgono percorsi più remoti e pericolosi, 
-    affrontando lunghi tragitti a piedi attraverso il deserto.
+    st.markdown(cluster["outro"])
+
+# CLUSTERING AUTOMATICO
+# il clustering DBSCAN (dbscan_haversine) è in spatial.py
+
+# cluster DBSCAN degli incidenti con coordinate valide, nell'ordine di valid_points (-1 per gli incidenti isolati):
+# è il calcolo più costoso del clustering, quindi il risultato è condiviso tra i worker
+@shared_cache
+def cluster_labels(version, eps_km, min_samples):
+    points = valid_points(version)
+    return pl.DataFrame({"cluster": dbscan_haversine(points["lat"].to_numpy(), points["lng"].to_numpy(), eps_km, min_samples)})
+
+# cluster individuati automaticamente con le statistiche principali e il poligono convesso di ciascuno,
+# in cache per versione del dataset e combinazione di parametri
+@st.cache_resource
+@profiling.cache_miss
+def density_clusters(version, eps_km, min_samples):
+    from scipy.spatial import ConvexHull, QhullError
+
+    points = valid_points(version).with_columns(cluster_labels(version, eps_km, min_samples)["cluster"])
+    clustered = points.filter(pl.col("cluster") >= 0)
+
+    # statistiche per cluster (per regione e causa, il valore più frequente)
+    stats = clustered.group_by("cluster").agg(
+        pl.len().alias("incidents"),
+        pl.col("Total Number of Dead and Missing").sum().alias("total"),
+        pl.col("lat").mean(),
+        pl.col("lng").mean(),
+        pl.col("Incident_Date").min().alias("first_date"),
+        pl.col("Incident_Date").max().alias("last_date"),
+        pl.col("Region").cast(pl.String).drop_nulls().mode().sort().first().alias("region"),
+        pl.col("Cause of Death").cast(pl.String).drop_nulls().mode().sort().first().alias("cause")
+    ).sort("total", "cluster", descending=[True, False])
+
+    # poligono convesso di ogni cluster (se i punti non sono allineati)
+    polygons = []
+    for (cluster,), group in clustered.group_by("cluster"):
+        coordinates = np.unique(group.select("lng", "lat").to_numpy(), axis=0)
+        if len(coordinates) < 3:
+            continue
+        try:
+            vertices = coordinates[ConvexHull(coordinates).vertices]
+        except QhullError:
+            continue
+        polygons.append({"polygon": np.vstack([vertices, vertices[:1]]).tolist(), "cluster": int(cluster)})
 
-    Le principali cause di morte registrate sono **disidratazione, esaurimento fisico e ipotermia**, a causa delle condizioni climatiche estreme. 
-    Inoltre, incidenti legati al traffico illecito di persone e agli scontri con le forze dell’ordine o i cartelli criminali rappresentano un ulteriore fattore di rischio. 
+    return points, stats, polygons
 
-    Le politiche di sicurezza statunitensi, come la costruzione del **muro di confine** e l’aumento dei controlli da parte della Border Patrol, 
-    hanno contribuito a deviare le rotte migratorie verso aree sempre più ostili, aumentando il tasso di mortalità. 
-    L’analisi di questo cluster fornisce dunque una chiara evidenza dell'impatto delle strategie di gestione della frontiera sulla sicurezza e sulla vulnerabilità dei migranti.
-    """)
+# mappa dei cluster individuati automaticamente con DBSCAN
+@st.fragment
+def automatic_clusters(map_style):
+    import pydeck as pdk
 
-#3. Gruppo del deserto del Sahara
-def sahara_desert_group(map_style):
-    st.markdown("---")
-    st.write("### Gruppo dei punti nel Deserto del Sahara")
+    st.write("### Clustering automatico degli incidenti")
 
     st.markdown("""
-    Dopo aver esaminato le rotte migratorie nel Mediterraneo e al confine tra Messico e Stati Uniti, ci spostiamo ora in Africa, 
-    nel **Deserto del Sahara**, un’area estremamente ostile che rappresenta una delle rotte più pericolose per i migranti diretti verso il Nord Africa e l’Europa. 
-    La mappa seguente evidenzia la distribuzione degli incidenti lungo questa tratta, con una concentrazione di eventi nelle aree desertiche tra Niger, Chad, Sudan e Libia.
+    Oltre ai tre gruppi definiti manualmente, è possibile individuare automaticamente le aree con un'alta densità di incidenti 
+    tramite l'algoritmo **DBSCAN**, applicato alle coordinate con la distanza lungo la superficie terrestre (haversine). 
+    Un incidente fa parte di un cluster se entro il **raggio** scelto si trovano almeno il **numero minimo di incidenti** indicato; 
+    gli incidenti isolati (in grigio) non vengono assegnati a nessun cluster.
     """)
 
-    # definizione del bounding box (limiti geografici della regione d'interesse)
-    lat_min, lat_max = 12, 35  # limiti di latitudine
-    lng_min, lng_max = -15, 40  # limiti di longitudine
-
-    # filtro per la rotta migratoria "Sahara Desert crossing"
-    datapd_sahara = datapd[datapd["Migrantion route"] == "Sahara Desert crossing"].dropna(subset=["Coordinates"]).copy()
-
-    # funzione per convertire le coordinate da stringa a lista di float
-    def parse_coordinates(coord):
-        try:
-            lat, lng = map(float, coord.split(","))
-            return [lng, lat]  # inversione dell'ordine lat/lng
-        except (ValueError, AttributeError):
-            return None
-
-    # applicazione della funzione di parsing alle coordinate
-    datapd_sahara["Coordinates"] = datapd_sahara["Coordinates"].apply(parse_coordinates)
-    datapd_sahara = datapd_sahara.dropna(subset=["Coordinates"])  # rimozione delle righe con valori nulli
-
-    # separazione delle coordinate in colonne distinte per latitudine e longitudine
-    datapd_sahara[["lng", "lat"]] = pd.DataFrame(datapd_sahara["Coordinates"].tolist(), index=datapd_sahara.index)
-
-    # applicazione del filtro basato sul bounding box per selezionare solo i punti nel deserto del Sahara
-    datapd_sahara = datapd_sahara[
-        (datapd_sahara["lat"] >= lat_min) & (datapd_sahara["lat"] <= lat_max) &
-        (datapd_sahara["lng"] >= lng_min) & (datapd_sahara["lng"] <= lng_max)
-    ]
+    # selezione dei parametri del clustering
+    col1, col2 = st.columns(2)
+    with col1:
+        eps_km = st.slider("Raggio (km)", min_value=10, max_value=300, value=75, step=5, key="dbscan_eps")
+    with col2:
+        min_samples = st.slider("Numero minimo di incidenti", min_value=5, max_value=200, value=30, step=5, key="dbscan_min_samples")
 
-    # calcolo del raggio dei punti sulla base della radice quadrata del numero totale di morti e dispersi
-    datapd_sahara["radius"] = datapd_sahara["Total Number of Dead and Missing"].apply(math.sqrt)
+    points, stats, polygons = density_clusters(dataset_version, eps_km, min_samples)
 
-    # creazione di un array numpy con tutte le coordinate aggiornate
-    points = np.array(datapd_sahara[["lng", "lat"]])
+    if stats.is_empty():
+        st.warning("Nessun cluster individuato con i parametri selezionati.")
+        return
 
-    # calcolo dell'inviluppo convesso (convex hull) per delineare un poligono attorno ai punti
-    hull = ConvexHull(points)
-    hull_coordinates = [points[i].tolist() for i in hull.vertices] + [points[hull.vertices[0]].tolist()]
+    # colore di ogni punto in base al cluster (grigio per gli incidenti isolati)
+    color_palette = np.array([
+        [255, 0, 0], [0, 255, 0], [255, 255, 0], [255, 0, 255], [0, 255, 255], [255, 165, 0],
+        [138, 43, 226], [255, 192, 203], [127, 255, 0], [0, 206, 209], [255, 215, 0], [220, 20, 60]
+    ])
+    labels = points["cluster"].to_numpy()
+    colors = np.where(labels[:, None] >= 0, color_palette[labels % len(color_palette)], [128, 128, 128])
 
-    # creazione del layer Pydeck per visualizzare i punti sulla mappa
+    # layer dei poligoni dei cluster e dei punti colorati per cluster
+    polygon_layer = pdk.Layer(
+        "PolygonLayer",
+        polygons,
+        stroked=True,  # bordo visibile del poligono
+        filled=True,  # riempimento del poligono
+        line_width_min_pixels=2,  # spessore minimo del bordo
+        get_polygon="polygon",  # utilizzo delle coordinate per creare il poligono
+        get_fill_color=[255, 255, 255, 60],  # colore di riempimento bianco semi-trasparente
+        get_line_color=[255, 255, 255],  # bordo bianco
+    )
     points_layer = pdk.Layer(
         "ScatterplotLayer",
-        datapd_sahara,
+        layer_data(points, color=colors),  # solo le colonne necessarie al layer
         pickable=True,  # abilita il tooltip interattivo
         opacity=1,  # opacità completa dei punti
         stroked=True,  # bordo visibile intorno ai punti
         filled=True,  # punti pieni
         radius_scale=1000,  # scala del raggio per migliorare la leggibilità
-        radius_min_pixels=2,  # dimensione minima dei punti
+        radius_min_pixels=1.5,  # dimensione minima dei punti
         radius_max_pixels=1000,  # dimensione massima dei punti
         line_width_min_pixels=1,  # spessore minimo del bordo dei punti
         get_position=["lng", "lat"],  # utilizzo delle coordinate lat/lon
         get_radius="radius",  # dimensione del punto basata sulla variabile 'radius'
-        get_fill_color=[204, 0, 0],  # colore dei punti rosso
+        get_fill_color="color",  # colore assegnato in base al cluster
         get_line_color=[0, 0, 0],  # bordo dei punti nero
     )
 
-    # creazione del layer Pydeck con il poligono convesso che racchiude i punti
-    polygon_layer = pdk.Layer(
-        "PolygonLayer",
-        [{"polygon": hull_coordinates}] if hull_coordinates else [],  # verifica se ci sono coordinate disponibili
-        stroked=True,  # bordo visibile del poligono
-        filled=True,  # riempimento del poligono
-        line_width_min_pixels=2,  # spessore minimo del bordo
-        get_polygon="polygon",  # utilizzo delle coordinate per creare il poligono
-        get_fill_color=[255, 255, 255, 150],  # colore di riempimento bianco semi-trasparente
-        get_line_color=[255, 255, 255],  # bordo bianco
-    )
-
-    # configurazione della vista iniziale della mappa centrata sulla regione del Sahara
-    view = pdk.ViewState(latitude=24, longitude=13, zoom=3.2, max_zoom=8, min_zoom=3)
-
-    # creazione della mappa Pydeck con entrambi i layer (punti e poligono)
-    map_deck = pdk.Deck(
+    map_deck = compact_deck(
         layers=[polygon_layer, points_layer],  # sovrapposizione dei layer
-        initial_view_state=view,  # impostazione della vista iniziale della mappa
-        tooltip={"html": "Morti e dispersi: {Total Number of Dead and Missing}<br>Data: {Incident Date}"},  # tooltip interattivo
+        initial_view_state=pdk.ViewState(latitude=30, longitude=-8, zoom=1, max_zoom=8, min_zoom=0.7),
+        tooltip={"html": "Morti e dispersi: {total}<br>Data: {date}"},  # tooltip interattivo
         map_provider="mapbox",  # provider della mappa
         map_style=map_style  # stile della mappa (politica o satellitare)
     )
-
-    # visualizzazione della mappa in Streamlit
     st.pydeck_chart(map_deck)
 
-    st.markdown("""
-    Il cluster del Sahara evidenzia la pericolosità estrema della traversata, con un elevato numero di incidenti distribuiti lungo le principali rotte che collegano 
-    l’Africa subsahariana alla Libia e all’Algeria. A differenza delle altre due aree analizzate, qui i migranti affrontano lunghi tragitti a piedi o su mezzi di trasporto precari, 
-    come camion sovraccarichi, con scarse possibilità di ricevere soccorso in caso di emergenza.
-
-    Le principali cause di morte sono **disidratazione, fame ed esposizione prolungata alle condizioni climatiche estreme**. 
-    Inoltre, la presenza di gruppi criminali e milizie armate lungo il percorso aumenta il rischio di violenze, rapimenti e tratta di esseri umani. 
-
-    La mancanza di infrastrutture e di punti di rifornimento rende il deserto un’area particolarmente letale, con numerosi migranti che scompaiono senza lasciare traccia. 
-    Questa analisi mette in evidenza la necessità di una maggiore attenzione internazionale sulle condizioni dei migranti in transito attraverso il Sahara, 
-    un’area spesso trascurata nel dibattito sulle crisi migratorie globali.
-    """)
+    # tabella con le statistiche dei cluster, ordinati per numero di morti e dispersi
+    st.markdown(f"Sono stati individuati **{len(stats)} cluster**, che comprendono **{stats['incidents'].sum()}** incidenti su {len(points)}.")
+    st.dataframe(
+        stats.rename({
+            "cluster": "Cluster", "incidents": "Incidenti", "total": "Morti e dispersi",
+            "lat": "Latitudine media", "lng": "Longitudine media", "first_date": "Primo incidente",
+            "last_date": "Ultimo incidente", "region": "Regione prevalente", "cause": "Causa prevalente"
+        }),
+        use_container_width=True,
+        hide_index=True
+    )
 
 ## Implementazione Pagine ######################################################################################
 #1. Implementazione pagina di introduzione
@@ -1428,10 +1940,14 @@ def page_introduction():
     Il mondo sta affrontando una crisi migratoria. In un’era di esodi e sfollamenti forzati, i governi ospitanti nei paesi sviluppati si sono sempre più impegnati a respingere i migranti.
     """)
 
-    # calcolo del numero totale di migranti morti o scomparsi e visualizzazione del valore
-    total_dead_missing = datapd["Total Number of Dead and Missing"].sum()
+    # calcolo del numero totale di migranti morti o scomparsi e del periodo coperto dal dataset, e visualizzazione dei valori
+    total_dead_missing, first_year, last_year = dataset.select(
+        pl.col("Total Number of Dead and Missing").sum(),
+        pl.col("Incident_Date").min().dt.year().alias("first_year"),
+        pl.col("Incident_Date").max().dt.year().alias("last_year")
+    ).collect().row(0)
     st.markdown(f"""
-    ### Dal 2014 al 2021, oltre **:red[{total_dead_missing}]** migranti sono morti o scomparsi nel loro viaggio verso una vita migliore.
+    ### Dal {first_year} al {last_year}, oltre **:red[{total_dead_missing}]** migranti sono morti o scomparsi nel loro viaggio verso una vita migliore.
     """)
 
     # richiamo delle funzioni per la visualizzazione delle tragedie migratorie e del dataframe
@@ -1477,6 +1993,8 @@ def page_descriptive_analysis():
 
 #3. Implenzentazione della pagina di analisi geospaziale
 def page_geo_analysis():
+    import pydeck as pdk
+
     st.title("Visualizzazione Geospaziale delle Tragedie Migratorie")  # titolo della pagina
 
     # introduzione alla sezione di analisi geospaziale
@@ -1492,10 +2010,8 @@ def page_geo_analysis():
     e delle aree di maggiore transito e rischio.
     """)
 
-    # caricamento dell'immagine rappresentativa delle rotte migratorie
-    image_folder = Path("images")
-    image_path = image_folder / "flussi migratori2.png"
-    st.image(str(image_path), use_container_width=True)
+    # immagine rappresentativa delle rotte migratorie
+    show_image("flussi migratori2.png", "Principali rotte migratorie", lazy=False)
 
     # introduzione alla selezione della tipologia di mappa
     st.write("""
@@ -1524,9 +2040,11 @@ def page_geo_analysis():
         map_style = pdk.map_styles.SATELLITE
 
     # richiamo delle funzioni per la visualizzazione delle mappe
-    datapd_cleaned = points_map(map_style)
-    heatmap(datapd_cleaned, map_style)
-    points_map_by_cat(datapd_cleaned, map_style)
+    points_cleaned = valid_points(dataset_version)  # incidenti con coordinate valide (in cache), usati da più mappe
+    points_map(map_style)
+    heatmap(map_style)
+    points_map_by_cat(points_cleaned, map_style)
+    area_drilldown(map_style)
 
     # suggerimento per proseguire con l'analisi
     st.markdown("""
@@ -1539,6 +2057,8 @@ def page_geo_analysis():
 
 #4. Implementazione della pagina di analisi dei gruppi geografici
 def page_group_analysis():
+    import pydeck as pdk
+
     st.title("Analisi dei gruppi")  # titolo della pagina
 
     # introduzione alla sezione di analisi dei gruppi
@@ -1579,10 +2099,22 @@ def page_group_analysis():
     elif selected_map_style == "Mappa Satellitare":
         map_style = pdk.map_styles.SATELLITE
 
+    # selezione della modalità: gruppi definiti manualmente o individuati automaticamente
+    group_mode = st.pills(
+        "Seleziona la modalità di analisi",
+        ["Gruppi predefiniti", "Clustering automatico"],
+        default="Gruppi predefiniti",
+        key="group_mode"
+    )
+
     # richiamo delle funzioni per la visualizzazione delle mappe di gruppi geografici
-    mediterranean_group(map_style)
-    mexico_us_border_group(map_style)
-    sahara_desert_group(map_style)
+    if group_mode == "Clustering automatico":
+        automatic_clusters(map_style)
+    else:
+        for i, cluster_key in enumerate(GEOGRAPHIC_CLUSTERS):
+            if i > 0:
+                st.markdown("---")  # separatore tra i gruppi
+            geographic_group(cluster_key, map_style)
     st.markdown("---")
 
     st.write("## Conclusioni Finali")
@@ -1664,6 +2196,10 @@ def page_group_analysis():
     """)
 
 
+# con il profiling attivo le funzioni definite sopra vengono sostituite da versioni misurate
+if profile is not None:
+    profiling.instrument(globals())
+
 # configurazione navigazione
 pages = {
     "Introduzione": page_introduction,  # pagina introduttiva
@@ -1690,4 +2226,13 @@ if selection != st.session_state["selected_page"]:
     st.rerun()
 
 # Esegue la pagina selezionata
-pages[selection]()
\ No newline at end of file
+# (il profilo viene chiuso anche se la pagina interrompe l'esecuzione, es. st.rerun o st.stop, e il pannello
+# compare in fondo solo quando la pagina è completa)
+try:
+    pages[selection]()
+finally:
+    if profile is not None:
+        profiling.finish_run(profile)
+
+if profile is not None:
+    profiling.render_panel(profile)
@@ -0,0 +1,404 @@
+import argparse
+import ast
+import cProfile
+import datetime as dt
+import json
+import os
+import platform
+import pstats
+import shutil
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from importlib.metadata import version
+from pathlib import Path
+
+import polars as pl
+
+from data_prep import DATASET_COLUMNS
+from profiling import rss_bytes
+from synthetic_data import SYNTHETIC_FORMAT, generate
+
+#######################################################################################
+# Benchmark delle pagine dell'applicazione
+# ogni pagina (e le modalità alternative delle sezioni) viene eseguita senza browser con l'AppTest di Streamlit
+# su dataset sintetici di dimensione crescente. Per ogni scenario si registrano il tempo di esecuzione
+# (a freddo e con le cache già popolate), il picco della memoria residente del processo, i byte inviati al browser per ogni grafico
+# e il tempo cumulativo di ogni funzione dell'app, e si scrive un report JSON da confrontare tra versioni.
+#
+# uso:
+#   uv run python benchmark.py                                   # tutte le dimensioni e tutti gli scenari
+#   uv run python benchmark.py --sizes 10000 --scenarios descrittive
+#   uv run python benchmark.py --compare vecchio.json nuovo.json   # confronto tra due report
+#   uv run python benchmark.py --startup                          # avvio a freddo di un worker e tempi di import
+
+ROOT = Path(__file__).resolve().parent
+APP = ROOT / "app.py"
+SOURCE_CSV = ROOT / "MM_14_21.csv"  # dataset reale usato come modello per i dataset sintetici
+BENCHMARK_DIR = ROOT / "data" / "benchmark"  # cartella dei dataset sintetici (esclusa da git)
+
+SIZES = [10_000, 100_000, 1_000_000]  # numero di righe dei dataset sintetici
+
+# scenari: pagina da visualizzare e stato dei widget per le modalità alternative delle sezioni
+SCENARIOS = {
+    "introduzione": ("Introduzione", {}),
+    "descrittive": ("Analisi descrittive", {}),
+    "geospaziali": ("Analisi geospaziali", {}),
+    "geospaziali_griglia": ("Analisi geospaziali", {"heatmap_mode": "Griglia aggregata"}),
+    "gruppi": ("Analisi dei gruppi e conclusioni", {}),
+    "gruppi_clustering": ("Analisi dei gruppi e conclusioni", {"group_mode": "Clustering automatico"}),
+}
+
+# elementi che inviano dati al browser, di cui si misura la dimensione serializzata
+CHART_ELEMENTS = {"arrow_vega_lite_chart", "vega_lite_chart", "deck_gl_json_chart", "arrow_data_frame", "imgs", "markdown"}
+
+PAYLOAD_MIN_BYTES = 1024  # gli elementi più piccoli (testi brevi) sono conteggiati solo nel totale
+
+APP_TIMEOUT = 1800  # secondi massimi per l'esecuzione di una pagina
+RSS_SAMPLE_INTERVAL_S = 0.005  # intervallo di campionamento della memoria residente durante uno scenario
+
+STARTUP_ROWS = 10_000  # righe del dataset sintetico usato per misurare l'avvio
+STARTUP_SCENARIOS = ["introduzione", "descrittive", "geospaziali", "gruppi"]  # una misura per pagina
+STARTUP_REPEAT = 5  # avvii misurati per ogni pagina (si riporta la mediana)
+# budget del tempo di import (secondi, misurato con python -X importtime) di un worker appena avviato
+# fino alla prima pagina visualizzata: la pagina introduttiva non deve caricare Altair, pydeck, SciPy e matplotlib.
+# Il tempo dipende dalla macchina, quindi un superamento viene solo segnalato nel report, a meno di --fail-over-budget
+STARTUP_IMPORT_BUDGET_S = {"introduzione": 0.6}
+# librerie pesanti di cui si registra il caricamento all'avvio
+HEAVY_MODULES = ["pandas", "altair", "pydeck", "scipy", "matplotlib", "pyarrow", "numpy", "polars"]
+
+#######################################################################################
+# Dataset sintetici
+
+# dataset sintetico di "rows" righe generato da synthetic_data.py, riutilizzato se già presente, generato
+# con lo stesso formato (indicato nel nome del file) e con le stesse colonne del dataset (altrimenti viene rigenerato)
+def synthetic_dataset(rows, seed=0):
+    path = BENCHMARK_DIR / f"mm_synthetic_{rows}_{seed}_v{SYNTHETIC_FORMAT}.csv"
+    if not path.exists() or pl.read_csv(path, n_rows=0).columns != DATASET_COLUMNS:
+        generate(rows, path, seed, csv_path=SOURCE_CSV)
+    return path
+
+#######################################################################################
+# Misura di uno scenario (eseguita in un processo separato per ogni dataset,
+# così le cache di Streamlit e la memoria non vengono condivise tra dimensioni diverse)
+
+# esecuzione di una pagina con l'AppTest; un'eccezione nella pagina interrompe il benchmark
+def run_page(page, state):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(str(APP), default_timeout=APP_TIMEOUT)
+    at.session_state["selected_page"] = page
+    for key, value in state.items():
+        at.session_state[key] = value
+    at.run()
+    if at.exception:
+        raise RuntimeError(f"{page}: {at.exception[0].value}")
+    return at
+
+# dettaglio di un grafico Vega-Lite: nome (impostato dall'app), byte della specifica e dei dati (Arrow),
+# righe e colonne di ogni dataset
+def vega_lite_details(proto):
+    import pyarrow as pa
+
+    spec = json.loads(proto.spec)
+    buffers = [dataset.data.data for dataset in proto.datasets] + ([proto.data.data] if proto.data.data else [])
+    tables = [pa.ipc.open_stream(buffer).read_all() for buffer in buffers]
+    return {
+        "chart": spec.get("usermeta", {}).get("chart"),
+        "spec_bytes": len(proto.spec),
+        "data_bytes": sum(len(buffer) for buffer in buffers),
+        "rows": [table.num_rows for table in tables],
+        "columns": [table.column_names for table in tables],
+    }
+
+# dimensione serializzata degli elementi inviati al browser, nell'ordine in cui compaiono nella pagina
+# (per i grafici Vega-Lite anche la suddivisione tra specifica e dati)
+def chart_payloads(node, payloads=None):
+    payloads = [] if payloads is None else payloads
+    if getattr(node, "type", None) in CHART_ELEMENTS:
+        payload = {"element": node.type, "bytes": node.proto.ByteSize()}
+        if node.type == "arrow_vega_lite_chart":
+            payload.update(vega_lite_details(node.proto))
+        payloads.append(payload)
+    children = getattr(node, "children", None)
+    if isinstance(children, dict):
+        for child in children.values():
+            chart_payloads(child, payloads)
+    return payloads
+
+# nomi delle funzioni definite nell'app, per attribuire i tempi del profiler alle sezioni
+def app_functions():
+    tree = ast.parse(APP.read_text(encoding="utf-8"))
+    return {node.name for node in tree.body if isinstance(node, ast.FunctionDef)}
+
+# tempo cumulativo (comprese le funzioni chiamate) di ogni funzione dell'app eseguita durante il profiling
+def section_times(profile):
+    functions = app_functions()
+    times = {}
+    for (filename, _, name), (_, _, _, cumulative, _) in pstats.Stats(profile).stats.items():
+        if Path(filename).name == APP.name and name in functions:
+            times[name] = round(times.get(name, 0) + cumulative, 4)
+    return dict(sorted(times.items(), key=lambda item: -item[1]))
+
+# memoria residente del processo durante un blocco, campionata da un thread ogni RSS_SAMPLE_INTERVAL_S:
+# comprende le allocazioni di polars e Arrow (fatte in Rust e C++, fuori dall'heap Python e quindi
+# invisibili a tracemalloc). Restituisce un dizionario con la memoria all'inizio e il picco, completato all'uscita
+# (valori None se la memoria residente non è misurabile, vedi profiling.rss_bytes)
+@contextmanager
+def rss_peak():
+    memory = {"start": rss_bytes(), "peak": rss_bytes()}
+    stop = threading.Event()
+
+    def sample():
+        while not stop.wait(RSS_SAMPLE_INTERVAL_S):
+            memory["peak"] = max(memory["peak"], rss_bytes())
+
+    if memory["start"] is None:
+        yield memory
+        return
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        yield memory
+    finally:
+        stop.set()
+        sampler.join()
+        memory["peak"] = max(memory["peak"], rss_bytes())
+
+# aumento della memoria residente rispetto all'inizio del blocco misurato con rss_peak
+def rss_increase(memory):
+    return None if memory["start"] is None else memory["peak"] - memory["start"]
+
+# misura di uno scenario: esecuzione a freddo (cache vuote al primo scenario) e a caldo con il picco della
+# memoria residente, con tracemalloc per il picco del solo heap Python e con cProfile per i tempi delle sezioni
+def measure_scenario(name):
+    page, state = SCENARIOS[name]
+
+    with rss_peak() as cold_memory:
+        start = time.perf_counter()
+        at = run_page(page, state)
+        cold = time.perf_counter() - start
+
+    with rss_peak() as warm_memory:
+        start = time.perf_counter()
+        run_page(page, state)
+        warm = time.perf_counter() - start
+
+    tracemalloc.start()
+    run_page(page, state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    profile = cProfile.Profile()
+    profile.enable()
+    run_page(page, state)
+    profile.disable()
+
+    payloads = chart_payloads(at._tree)
+    return {
+        "scenario": name,
+        "page": page,
+        "state": state,
+        "cold_s": round(cold, 4),
+        "warm_s": round(warm, 4),
+        "cold_peak_rss_bytes": cold_memory["peak"],  # picco della memoria residente del processo
+        "cold_rss_increase_bytes": rss_increase(cold_memory),  # aumento rispetto all'inizio dello scenario
+        "warm_peak_rss_bytes": warm_memory["peak"],
+        "warm_rss_increase_bytes": rss_increase(warm_memory),
+        "peak_python_heap_bytes": peak,  # solo heap Python (tracemalloc), senza i buffer di polars e Arrow
+        "payloads": [p for p in payloads if p["bytes"] >= PAYLOAD_MIN_BYTES],
+        "payload_bytes": sum(p["bytes"] for p in payloads),
+        "sections_s": section_times(profile),
+    }
+
+# misura di tutti gli scenari su un dataset (processo figlio, con MM_DATASET già impostata)
+def worker(csv_path, scenarios, output):
+    os.chdir(ROOT)
+    from data_prep import load_dataset
+
+    with rss_peak() as memory:
+        start = time.perf_counter()
+        data, _ = load_dataset()  # conversione del csv nel formato Arrow
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        load_dataset()
+        load = time.perf_counter() - start
+
+        results = [measure_scenario(name) for name in scenarios]
+    Path(output).write_text(json.dumps({
+        "rows": data.height,
+        "dataset": str(csv_path),
+        "dataset_build_s": round(build, 4),
+        "dataset_load_s": round(load, 4),
+        "peak_rss_bytes": memory["peak"],  # picco della memoria residente del worker (None se non misurabile)
+        "scenarios": results,
+    }))
+
+#######################################################################################
+# Avvio di un worker
+# ogni misura è un processo Python nuovo, come un worker Streamlit appena avviato: il processo esegue
+# una pagina con l'AppTest sotto python -X importtime e dal log degli import si ricavano il tempo
+# di import totale, quello di ogni libreria e le librerie pesanti caricate
+
+# tempo di import (cumulativo, in secondi) di ogni modulo di primo livello dal log di python -X importtime
+def import_times(log):
+    times = {}
+    for line in log.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if name.startswith("  ") or not cumulative.strip().isdigit():
+            continue  # moduli importati da altri moduli, già compresi nel tempo cumulativo
+        package = name.strip().split(".")[0]
+        times[package] = times.get(package, 0) + int(cumulative) / 1e6
+    return times
+
+# esecuzione di una pagina in un processo appena avviato (processo figlio, con python -X importtime)
+def startup_worker(name, output):
+    start = time.perf_counter()
+    os.chdir(ROOT)
+    page, state = SCENARIOS[name]
+    run_page(page, state)
+    Path(output).write_text(json.dumps({
+        "run_s": round(time.perf_counter() - start, 4),
+        "heavy_modules": [module for module in HEAVY_MODULES if module in sys.modules],
+    }))
+
+# avvio a freddo di ogni scenario: mediana su più processi del tempo fino alla pagina visualizzata
+# (interprete compreso) e del tempo di import, con le librerie che richiedono più tempo; con fail_over_budget
+# il processo termina con un errore se il tempo di import di una pagina supera il budget
+def run_startup(scenarios, seed, repeat, output, fail_over_budget=False):
+    csv_path = synthetic_dataset(STARTUP_ROWS, seed)
+    partial = BENCHMARK_DIR / f"startup_{STARTUP_ROWS}_{seed}.json"
+    env = {**os.environ, "MM_DATASET": str(csv_path)}
+
+    def launch(name):
+        start = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", __file__, "--startup-worker", name, "--partial", str(partial)],
+            env=env, cwd=ROOT, capture_output=True, text=True, check=True
+        )
+        result = json.loads(partial.read_text())
+        partial.unlink()
+        return time.perf_counter() - start, import_times(process.stderr), result
+
+    launch(scenarios[0])  # prima esecuzione scartata: costruzione del dataset pre-elaborato e cache condivisa
+    report = {"environment": environment(), "rows": STARTUP_ROWS, "repeat": repeat, "startup": []}
+    over_budget = []
+    for name in scenarios:
+        runs = [launch(name) for _ in range(repeat)]
+        process_s = statistics.median(run[0] for run in runs)
+        imports = {package: statistics.median(run[1].get(package, 0) for run in runs) for package in runs[0][1]}
+        import_s = sum(imports.values())
+        budget = STARTUP_IMPORT_BUDGET_S.get(name)
+        report["startup"].append({
+            "scenario": name,
+            "process_s": round(process_s, 4),
+            "import_s": round(import_s, 4),
+            "import_budget_s": budget,
+            "over_budget": budget is not None and import_s > budget,
+            "heavy_modules": runs[0][2]["heavy_modules"],
+            "imports_s": {package: round(t, 4) for package, t in sorted(imports.items(), key=lambda item: -item[1])[:10]},
+        })
+        if report["startup"][-1]["over_budget"]:
+            over_budget.append(name)
+        print(f"  {name:<22} avvio {process_s:>6.2f}s  import {import_s:>6.2f}s"
+              f"{f' (budget {budget:.2f}s)' if budget is not None else '':<17}  {', '.join(runs[0][2]['heavy_modules'])}")
+    Path(output).write_text(json.dumps(report, indent=2))
+    print(f"Report salvato in {output}")
+    if over_budget:
+        message = f"Tempo di import oltre il budget: {', '.join(over_budget)}"
+        if fail_over_budget:
+            sys.exit(message)
+        print(message)
+
+#######################################################################################
+# Report
+
+# informazioni sull'ambiente, per confrontare solo report comparabili
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "created": dt.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "packages": {name: version(name) for name in ["streamlit", "polars", "pandas", "altair", "pydeck", "numpy", "scipy"]},
+    }
+
+# esecuzione del benchmark per ogni dimensione in un processo separato e scrittura del report
+def run_benchmark(sizes, scenarios, seed, output):
+    report = {"environment": environment(), "seed": seed, "results": []}
+    for rows in sizes:
+        csv_path = synthetic_dataset(rows, seed)
+        partial = BENCHMARK_DIR / f"result_{rows}_{seed}.json"
+        cache_dir = BENCHMARK_DIR / f"cache_{rows}_{seed}"  # cache condivisa vuota, per misurare davvero l'esecuzione a freddo
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        print(f"{rows} righe: {', '.join(scenarios)}", flush=True)
+        subprocess.run(
+            [sys.executable, __file__, "--worker", str(csv_path), "--partial", str(partial), "--scenarios", *scenarios],
+            env={**os.environ, "MM_DATASET": str(csv_path), "MM_CACHE_DIR": str(cache_dir)},
+            cwd=ROOT,
+            check=True
+        )
+        result = json.loads(partial.read_text())
+        partial.unlink()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        for scenario in result["scenarios"]:
+            increase = scenario["cold_rss_increase_bytes"]
+            print(f"  {scenario['scenario']:<22} freddo {scenario['cold_s']:>8.2f}s  caldo {scenario['warm_s']:>8.2f}s  "
+                  f"payload {scenario['payload_bytes'] / 1e6:>8.2f} MB  "
+                  f"memoria +{increase / 2**20 if increase is not None else float('nan'):>7.0f} MB")
+        report["results"].append(result)
+    Path(output).write_text(json.dumps(report, indent=2))
+    print(f"Report salvato in {output}")
+
+# confronto tra due report: variazione dei tempi a caldo e dei byte inviati per ogni dimensione e scenario
+def compare_reports(base_path, new_path):
+    base, new = (json.loads(Path(p).read_text()) for p in (base_path, new_path))
+    base_scenarios = {(r["rows"], s["scenario"]): s for r in base["results"] for s in r["scenarios"]}
+    print(f"{'righe':>9}  {'scenario':<22} {'caldo (s)':>20} {'payload (MB)':>22}")
+    for result in new["results"]:
+        for scenario in result["scenarios"]:
+            old = base_scenarios.get((result["rows"], scenario["scenario"]))
+            if old is None:
+                continue
+            time_change = (scenario["warm_s"] / old["warm_s"] - 1) * 100 if old["warm_s"] else 0
+            payload_change = (scenario["payload_bytes"] / old["payload_bytes"] - 1) * 100 if old["payload_bytes"] else 0
+            print(f"{result['rows']:>9}  {scenario['scenario']:<22} "
+                  f"{old['warm_s']:>7.2f} → {scenario['warm_s']:>7.2f} {time_change:>+5.0f}%  "
+                  f"{old['payload_bytes'] / 1e6:>7.2f} → {scenario['payload_bytes'] / 1e6:>7.2f} {payload_change:>+5.0f}%")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark delle pagine dell'applicazione su dataset sintetici")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="numero di righe dei dataset sintetici")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), help="scenari da eseguire (predefiniti: tutti, con --startup una pagina ciascuno)")
+    parser.add_argument("--seed", type=int, default=0, help="seed del generatore dei dataset sintetici")
+    parser.add_argument("--output", help="file del report JSON (predefinito: benchmark_report.json, con --startup startup_report.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NUOVO"), help="confronta due report invece di eseguire il benchmark")
+    parser.add_argument("--startup", action="store_true", help="misura l'avvio a freddo di un worker e i tempi di import")
+    parser.add_argument("--repeat", type=int, default=STARTUP_REPEAT, help="avvii misurati per ogni scenario con --startup")
+    parser.add_argument("--fail-over-budget", action="store_true", help="con --startup, termina con un errore se il tempo di import supera il budget")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--startup-worker", help=argparse.SUPPRESS)
+    parser.add_argument("--partial", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_reports(*args.compare)
+    elif args.startup_worker:
+        startup_worker(args.startup_worker, args.partial)
+    elif args.startup:
+        run_startup(args.scenarios or STARTUP_SCENARIOS, args.seed, args.repeat, args.output or "startup_report.json", args.fail_over_budget)
+    elif args.worker:
+        worker(args.worker, args.scenarios, args.partial)
+    else:
+        run_benchmark(args.sizes, args.scenarios or list(SCENARIOS), args.seed, args.output or "benchmark_report.json")
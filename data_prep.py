@@ -1,67 +1,740 @@
-import pandas as pd
-import requests
+import polars as pl
 import numpy as np
-import matplotlib.pyplot as plt
+import argparse
 import colorsys
+import functools
+import hashlib
+import itertools
+import json
 import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
 
-# URL del TopoJSON
-url = 'https://cdn.jsdelivr.net/npm/world-atlas@2/countries-50m.json'
+#######################################################################################
+# Preparazione del dataset
+# il csv originale viene convertito una sola volta in un file Arrow IPC tipizzato e già pulito,
+# che l'applicazione può leggere in memory-map senza ripetere il parsing ad ogni avvio.
+# Il dataset pre-elaborato è una cartella con:
+# - uno o più segmenti Arrow IPC: il primo contiene il csv originale, i successivi gli incidenti
+#   nuovi o modificati aggiunti dagli aggiornamenti (i segmenti non vengono mai riscritti)
+# - le tabelle pre-aggregate per mese e per regione, aggiornate sommando solo le differenze
+# - un manifest JSON con l'elenco dei file, le righe sostituite da aggiornamenti successivi e la versione:
+#   viene scritto per ultimo e sostituito in modo atomico, così chi legge vede sempre una versione completa
+
+# dataset sorgente; la variabile d'ambiente MM_DATASET permette di usare un altro csv con lo stesso schema (es. per i benchmark)
+DATASET_CSV = Path(os.environ.get("MM_DATASET", "MM_14_21.csv"))
+DATASET_STORE = Path("data") / DATASET_CSV.stem  # cartella del dataset pre-elaborato
+MANIFEST_NAME = "manifest.json"  # manifest del dataset pre-elaborato, nella sua cartella
+
+# colonne di interesse del dataset ("Main ID" identifica gli incidenti tra una versione del csv e l'altra)
+DATASET_COLUMNS = [
+    "Main ID", "Region", "Incident Date", "Year", "Reported Month", "Number Dead",
+    "Minimum Estimated Number of Missing", "Total Number of Dead and Missing",
+    "Number of Survivors", "Number of Females", "Number of Males", "Number of Children",
+    "Cause of Death", "Coordinates", "Migrantion route", "UNSD Geographical Grouping", "URL"
+]
+
+# colonne categoriche, salvate con dictionary encoding
+CATEGORICAL_COLUMNS = ["Region", "Reported Month", "Cause of Death", "Migrantion route", "UNSD Geographical Grouping"]
+
+# variabili categoriche analizzate dai grafici delle categorie, con conteggi pre-aggregati
+CATEGORY_COLUMNS = ["Region", "Cause of Death", "Migrantion route"]
+
+# tipi delle colonne numeriche del csv (le altre sono lette come testo), fissati per non dipendere
+# dall'inferenza dello schema sulle prime righe quando il csv viene letto a blocchi
+CSV_SCHEMA = {
+    "Year": pl.Int64,
+    "Number Dead": pl.Float64,
+    "Minimum Estimated Number of Missing": pl.Float64,
+    "Total Number of Dead and Missing": pl.Int64,
+    "Number of Survivors": pl.Float64,
+    "Number of Females": pl.Float64,
+    "Number of Males": pl.Float64,
+    "Number of Children": pl.Float64,
+}
+CSV_NULL_VALUES = ["", "NA", " "]  # valori del csv interpretati come mancanti
+
+BUILD_BATCH_ROWS = 250_000  # righe del csv elaborate per ogni blocco durante la costruzione del dataset
+
+# versione del formato del dataset pre-elaborato, da incrementare quando cambiano le colonne derivate
+# o le tabelle pre-aggregate
+DATASET_FORMAT = 5
+
+# calcola l'hash sha256 di un file, leggendolo a blocchi
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# versione del dataset costruito da un csv: dipende dal contenuto del csv e dal formato del dataset pre-elaborato,
+# così un cambio di formato cambia anche la chiave delle cache derivate (st.cache_resource e shared_cache)
+def dataset_version(source_hash):
+    return hashlib.sha256(f"{source_hash}:{DATASET_FORMAT}".encode()).hexdigest()[:16]
+
+# tipi di problemi nelle coordinate segnalati nella colonna "coord_issue"
+COORD_ISSUES = ["missing", "malformed", "out_of_range"]
+
+# colonne geografiche derivate da "Coordinates" ("lat, lng"), calcolate in modo vettoriale:
+# lat/lng numeriche e una colonna "coord_issue" che segnala le coordinate mancanti, malformate o fuori scala
+# (nulla se le coordinate sono valide)
+def geo_columns():
+    parts = pl.col("Coordinates").str.split_exact(",", 1)
+    lat = parts.struct.field("field_0").str.strip_chars().cast(pl.Float64, strict=False)
+    lng = parts.struct.field("field_1").str.strip_chars().cast(pl.Float64, strict=False)
+
+    issue = (
+        pl.when(pl.col("Coordinates").is_null()).then(pl.lit("missing"))
+        .when((pl.col("Coordinates").str.count_matches(",") != 1) | lat.is_null() | lng.is_null() | lat.is_nan() | lng.is_nan())
+        .then(pl.lit("malformed"))
+        .when((lat.abs() > 90) | (lng.abs() > 180)).then(pl.lit("out_of_range"))
+        .otherwise(None)
+    )
+
+    return [
+        lat.alias("lat"),
+        lng.alias("lng"),
+        issue.cast(pl.Enum(COORD_ISSUES)).alias("coord_issue")
+    ]
+
+# lettura lazy del csv sorgente: vengono lette solo le colonne usate dalle operazioni successive
+def scan_source(csv_path=DATASET_CSV):
+    return pl.scan_csv(csv_path, null_values=CSV_NULL_VALUES, schema_overrides=CSV_SCHEMA)
+
+# valori distinti di ogni colonna categorica, calcolati in streaming sull'intero csv
+# (le combinazioni distinte delle colonne categoriche sono poche anche per csv molto grandi)
+def category_values(source):
+    combinations = source.group_by(CATEGORICAL_COLUMNS).len().collect(streaming=True)
+    return {column: combinations[column].drop_nulls().unique().sort().to_list() for column in CATEGORICAL_COLUMNS}
+
+# pulizia e tipizzazione del dataset grezzo (DataFrame o LazyFrame).
+# con "categories" le colonne categoriche diventano Enum con le categorie indicate, così blocchi diversi
+# dello stesso csv hanno la stessa codifica a dizionario e possono essere scritti nello stesso file
+def prepare_dataset(raw, categories=None):
+    data = raw.select(DATASET_COLUMNS)
+
+    return data.with_columns(
+        # estrazione del giorno della settimana e della data
+        pl.col("Incident Date").str.extract(r"^(\w{3}, \d{2}/\d{2}/\d{4})").alias("Incident Date"),
+    ).with_columns(
+        # data dell'incidente già convertita in formato data
+        pl.col("Incident Date").str.to_date("%a, %m/%d/%Y", strict=False).alias("Incident_Date"),
+        *geo_columns(),
+        *[
+            pl.col(column).cast(pl.Enum(categories[column]) if categories else pl.Categorical)
+            for column in CATEGORICAL_COLUMNS
+        ],
+    )
+
+# dataset pre-elaborato vuoto con le categorie indicate, per ricavare gli schemi
+def empty_dataset(categories):
+    return prepare_dataset(pl.DataFrame(schema={**{column: pl.String for column in DATASET_COLUMNS}, **CSV_SCHEMA}), categories)
+
+# schema Arrow del dataset pre-elaborato con le categorie indicate
+def dataset_schema(categories):
+    return empty_dataset(categories).to_arrow().schema
+
+# scrittura atomica di un file: il blocco scrive nel percorso temporaneo restituito, che alla fine viene rinominato
+# nel percorso definitivo (o rimosso in caso di errore), così non resta mai un file incompleto. Il nome temporaneo
+# è diverso per ogni processo e thread: più worker che preparano insieme gli stessi file non scrivono mai nello
+# stesso file temporaneo, e ognuno pubblica un file completo
+@contextmanager
+def atomic_path(path):
+    path = Path(path)
+    partial_path = path.with_name(f"{path.name}.{os.getpid()}-{threading.get_ident()}.partial")
+    try:
+        yield partial_path
+        partial_path.replace(path)
+    finally:
+        partial_path.unlink(missing_ok=True)
+
+# scrittura di uno o più DataFrame in un file Arrow IPC, non compresso per poterlo leggere in memory-map
+def write_arrow(path, frames, schema):
+    import pyarrow as pa
+
+    rows = 0
+    with atomic_path(path) as partial_path:
+        with pa.OSFile(str(partial_path), "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+            for frame in frames:
+                writer.write_table(frame.to_arrow())
+                rows += frame.height
+    return rows
+
+#######################################################################################
+# Tabelle pre-aggregate
+# totali per mese e per regione usati dalla serie storica e dal grafico delle vittime per regione,
+# e numero di incidenti per combinazione di variabili categoriche usato dai grafici delle categorie.
+# Contengono solo somme e conteggi, quindi un aggiornamento le corregge sommando i contributi
+# degli incidenti aggiunti e sottraendo quelli degli incidenti sostituiti, senza riscorrere lo storico
+
+# morti e dispersi e numero di incidenti per mese, regione, causa di morte e rotta
+def monthly_totals(data):
+    return (
+        data
+        .filter(pl.col("Incident_Date").is_not_null())
+        .group_by(
+            pl.col("Incident_Date").dt.truncate("1mo").alias("Year_Month"),
+            *[pl.col(column).cast(pl.String) for column in ("Region", "Cause of Death", "Migrantion route")]
+        )
+        .agg(
+            pl.col("Total Number of Dead and Missing").sum(),
+            pl.len().cast(pl.Int64).alias("Incidents")
+        )
+    )
+
+# morti e dispersi per regione, con il numero di uomini, donne e minori e il numero di incidenti
+def region_totals(data):
+    return (
+        data
+        .group_by(pl.col("Region").cast(pl.String))
+        .agg(
+            pl.col("Total Number of Dead and Missing").sum().alias("Total"),
+            pl.col("Number of Males").sum().alias("Male"),
+            pl.col("Number of Females").sum().alias("Female"),
+            pl.col("Number of Children").sum().alias("Children"),
+            pl.len().cast(pl.Int64).alias("Incidents")
+        )
+    )
+
+# numero di incidenti per regione, causa di morte e rotta (valori mancanti compresi, come chiavi nulle):
+# poche centinaia di righe da cui si ricavano i conteggi di ogni variabile e di ogni coppia di variabili
+def category_totals(data):
+    return (
+        data
+        .group_by(*[pl.col(column).cast(pl.String) for column in CATEGORY_COLUMNS])
+        .agg(pl.len().cast(pl.Int64).alias("Incidents"))
+    )
+
+# tabelle pre-aggregate: nome -> (funzione di aggregazione, colonne chiave)
+AGGREGATES = {
+    "monthly": (monthly_totals, ["Year_Month", "Region", "Cause of Death", "Migrantion route"]),
+    "regions": (region_totals, ["Region"]),
+    "categories": (category_totals, CATEGORY_COLUMNS),
+}
+
+# aggiornamento di una tabella pre-aggregata con i totali degli incidenti aggiunti e di quelli rimossi
+def update_aggregate(table, keys, added, removed):
+    values = [column for column in table.columns if column not in keys]
+    return (
+        pl.concat([table, added, removed.with_columns(-pl.col(values))])
+        .group_by(keys)
+        .agg(pl.col(values).sum())
+        .filter(pl.col("Incidents") > 0)
+        .sort(keys, nulls_last=True)
+    )
+
+# statistiche delle variabili categoriche ricavate dalla tabella "categories" (numero di incidenti per regione,
+# causa di morte e rotta); i valori mancanti sono esclusi. La chiave è la tupla delle variabili:
+# - (variabile,): numero di incidenti ("Count") e percentuale sul totale ("Percent") di ogni categoria
+# - (prima, seconda): tabella incrociata completa, comprese le combinazioni senza incidenti, con la percentuale
+#   di ogni categoria della seconda variabile entro ogni categoria della prima
+def category_statistics(table):
+    stats = {}
+    for column in CATEGORY_COLUMNS:
+        stats[(column,)] = (
+            table
+            .filter(pl.col(column).is_not_null())
+            .group_by(column)
+            .agg(pl.col("Incidents").sum().alias("Count"))
+            .with_columns((pl.col("Count") / pl.col("Count").sum() * 100).alias("Percent"))
+            .sort(column)
+        )
+    for first, second in itertools.combinations(CATEGORY_COLUMNS, 2):
+        counts = (
+            table
+            .filter(pl.col(first).is_not_null() & pl.col(second).is_not_null())
+            .group_by(first, second)
+            .agg(pl.col("Incidents").sum().alias("Count"))
+        )
+        stats[(first, second)] = (
+            counts.select(first).unique()
+            .join(counts.select(second).unique(), how="cross")
+            .join(counts, on=[first, second], how="left")
+            .with_columns(pl.col("Count").fill_null(0))
+            .with_columns((pl.col("Count") / pl.col("Count").sum().over(first) * 100).alias("Percent"))
+            .sort(first, second)
+        )
+    return stats
+
+# scrittura delle tabelle pre-aggregate di una versione; restituisce i nomi dei file
+def write_aggregates(store_dir, version, tables):
+    files = {}
+    for name, table in tables.items():
+        files[name] = f"{name}-{version}.arrow"
+        write_arrow(Path(store_dir) / files[name], [table], table.to_arrow().schema)
+    return files
+
+#######################################################################################
+# Manifest e lettura del dataset pre-elaborato
+
+# manifest del dataset pre-elaborato (None se non esiste o non è leggibile)
+def read_manifest(store_dir=DATASET_STORE):
+    try:
+        return json.loads((Path(store_dir) / MANIFEST_NAME).read_text())
+    except (OSError, ValueError):
+        return None
+
+# scrittura atomica del manifest e rimozione dei file non più usati: vengono mantenuti anche i file della
+# versione precedente, che le istanze dell'applicazione ancora in esecuzione potrebbero star leggendo
+def write_manifest(store_dir, manifest, previous=None):
+    path = Path(store_dir) / MANIFEST_NAME
+    with atomic_path(path) as partial_path:
+        partial_path.write_text(json.dumps(manifest, indent=2))
 
-# Scarica il file JSON dall'URL
-response = requests.get(url)
+    keep = {MANIFEST_NAME}
+    for kept in (manifest, previous or {}):
+        keep.update(segment["file"] for segment in kept.get("segments", []))
+        keep.update(kept.get("aggregates", {}).values())
+    for file in Path(store_dir).glob("*.arrow"):
+        if file.name not in keep:
+            file.unlink(missing_ok=True)
 
-# Verifica se la richiesta ha avuto successo
-if response.status_code == 200:
-    topojson = response.json()  # Converte il contenuto in un dizionario Python
-else:
-    print(f"Errore durante il download del file: {response.status_code}")
-    exit()
+# versione corrente del dataset pre-elaborato, letta dal manifest (None se non è ancora stato costruito):
+# è una lettura di pochi byte, quindi l'applicazione può controllarla ad ogni esecuzione e passare
+# alla nuova versione dopo un aggiornamento senza essere riavviata
+def current_version(store_dir=DATASET_STORE):
+    manifest = read_manifest(store_dir)
+    return manifest["version"] if manifest else None
 
-# Crea una lista vuota per memorizzare i dati
-countries_data = []
+# lettura lazy dei segmenti di una versione del dataset, escluse le righe sostituite da aggiornamenti successivi;
+# con più segmenti le colonne categoriche di tutti vengono convertite alle categorie correnti (i segmenti scritti
+# prima della comparsa di nuove categorie hanno Enum diversi, e polars concatena solo Enum identici).
+# con "positions" vengono aggiunti il numero del segmento ("_segment") e la riga nel segmento ("_row")
+def scan_segments(store_dir, manifest, positions=False):
+    categories = manifest["categories"]
+    frames = []
+    for index, segment in enumerate(manifest["segments"]):
+        deleted = segment["deleted"]
+        frame = pl.scan_ipc(
+            Path(store_dir) / segment["file"], memory_map=True,
+            row_index_name="_row" if deleted or positions else None
+        )
+        if deleted:
+            frame = frame.filter(~pl.col("_row").is_in(deleted))
+        if len(manifest["segments"]) > 1:
+            frame = frame.with_columns(pl.col(column).cast(pl.Enum(categories[column])) for column in CATEGORICAL_COLUMNS)
+        if positions:
+            frame = frame.with_columns(pl.lit(index, dtype=pl.UInt32).alias("_segment"))
+        elif deleted:
+            frame = frame.drop("_row")
+        frames.append(frame)
+    return frames[0] if len(frames) == 1 else pl.concat(frames)
+
+# tabelle pre-aggregate di una versione del dataset, lette in modo lazy
+def scan_aggregates(store_dir, manifest):
+    return {name: pl.scan_ipc(Path(store_dir) / file, memory_map=True) for name, file in manifest["aggregates"].items()}
+
+# legge il csv sorgente a blocchi e scrive il primo segmento del dataset pre-elaborato, le tabelle pre-aggregate
+# e il manifest: la memoria necessaria dipende dalla dimensione dei blocchi e non da quella del csv.
+# una ricostruzione completa sostituisce anche gli aggiornamenti applicati al csv precedente
+def build_dataset(csv_path=DATASET_CSV, store_dir=DATASET_STORE, source_hash=None):
+    source_hash = source_hash or file_hash(csv_path)
+    version = dataset_version(source_hash)
+
+    categories = category_values(scan_source(csv_path))
+    reader = pl.read_csv_batched(
+        csv_path, columns=DATASET_COLUMNS, null_values=CSV_NULL_VALUES,
+        schema_overrides=CSV_SCHEMA, batch_size=BUILD_BATCH_ROWS
+    )
+
+    # i blocchi vengono elaborati uno alla volta: ciascuno viene scritto nel segmento
+    # e aggregato, e le tabelle pre-aggregate dei blocchi vengono sommate alla fine
+    partial_tables = {name: [] for name in AGGREGATES}
+    def batches():
+        while batch := reader.next_batches(1):
+            batch = prepare_dataset(batch[0], categories)
+            for name, (aggregate, _) in AGGREGATES.items():
+                partial_tables[name].append(aggregate(batch.lazy()).collect())
+            yield batch
+
+    Path(store_dir).mkdir(parents=True, exist_ok=True)
+    segment_file = f"part-00000-{version}.arrow"
+    rows = write_arrow(Path(store_dir) / segment_file, batches(), dataset_schema(categories))
+
+    tables = {}
+    for name, (aggregate, keys) in AGGREGATES.items():
+        empty = aggregate(empty_dataset(categories).lazy()).collect()
+        tables[name] = update_aggregate(empty, keys, pl.concat([empty, *partial_tables[name]]), empty)
+
+    manifest = {
+        "source": str(csv_path),
+        "source_hash": source_hash,
+        "format": DATASET_FORMAT,
+        "version": version,
+        "rows": rows,
+        "categories": categories,
+        "segments": [{
+            "file": segment_file, "source": str(csv_path), "source_hash": source_hash,
+            "rows": rows, "deleted": []
+        }],
+        "aggregates": write_aggregates(store_dir, version, tables)
+    }
+    write_manifest(store_dir, manifest, read_manifest(store_dir))
+    return manifest
+
+# manifest del dataset pre-elaborato, costruito dal csv se manca o se il csv sorgente è cambiato
+def open_store(csv_path=DATASET_CSV, store_dir=DATASET_STORE):
+    source_hash = file_hash(csv_path)
+    manifest = read_manifest(store_dir)
+    if manifest and manifest["source_hash"] == source_hash and manifest["format"] == DATASET_FORMAT:
+        return manifest
+    return build_dataset(csv_path, store_dir, source_hash)
+
+# lettura lazy del dataset pre-elaborato (Arrow IPC in memory-map) e delle tabelle pre-aggregate;
+# se manca o se il csv sorgente è cambiato lo ricostruisce dal csv. Le selezioni di colonne e i filtri
+# delle viste vengono applicati durante la lettura e vengono materializzati solo i risultati.
+# restituisce il dataset, le tabelle pre-aggregate e la versione, usata come chiave per le cache derivate
+def scan_dataset(csv_path=DATASET_CSV, store_dir=DATASET_STORE):
+    try:
+        manifest = open_store(csv_path, store_dir)
+    except OSError:
+        # filesystem in sola lettura: si legge direttamente il csv e le tabelle pre-aggregate vengono calcolate da esso
+        data = prepare_dataset(scan_source(csv_path))
+        aggregates = {name: aggregate(data) for name, (aggregate, _) in AGGREGATES.items()}
+        return data, aggregates, dataset_version(file_hash(csv_path))
+    return scan_segments(store_dir, manifest), scan_aggregates(store_dir, manifest), manifest["version"]
+
+# carica l'intero dataset pre-elaborato in memoria
+def load_dataset(csv_path=DATASET_CSV, store_dir=DATASET_STORE):
+    data, _, version = scan_dataset(csv_path, store_dir)
+    return data.collect(), version
+
+#######################################################################################
+# Aggiornamento incrementale
+# un aggiornamento dell'IOM (csv con lo stesso schema, anche parziale) viene confrontato con il dataset per "Main ID":
+# gli incidenti nuovi e quelli modificati vengono aggiunti in un nuovo segmento, le vecchie righe degli incidenti
+# modificati vengono marcate come sostituite e le tabelle pre-aggregate vengono corrette con le sole differenze.
+# Dello storico vengono lette solo la colonna "Main ID" e le righe degli incidenti presenti nell'aggiornamento,
+# quindi il tempo di aggiornamento dipende dalla dimensione dell'aggiornamento e non da quella del dataset.
+# Un "Main ID" può raggruppare più righe: le righe di un incidente vengono sempre sostituite tutte insieme.
 
-# Itera attraverso le geometrie per estrarre i nomi dei paesi
-for feature in topojson["objects"]["countries"]["geometries"]:
-    country_name = feature["properties"].get("name", "Unknown")  # Ottieni il nome del paese
-    countries_data.append({"country": country_name, "region": "Null"})  # Aggiungi 'Null' per la regione
+# "Main ID" degli incidenti con righe diverse tra due versioni (confronto delle colonne del csv, righe ripetute comprese)
+def changed_ids(new, old):
+    def rows(data):
+        return data.select(pl.col(DATASET_COLUMNS).cast(pl.String)).group_by(DATASET_COLUMNS).len()
 
-# Converti la lista in un DataFrame
-df_countries = pd.DataFrame(countries_data)
+    return (
+        rows(new)
+        .join(rows(old), on=DATASET_COLUMNS, how="full", coalesce=True, join_nulls=True)
+        .filter(pl.col("len").fill_null(0) != pl.col("len_right").fill_null(0))
+        ["Main ID"]
+        .unique()
+    )
 
-# Nome del file CSV
-file_path = 'countries.csv'
+# applica al dataset pre-elaborato l'aggiornamento contenuto in "csv_path" e pubblica la nuova versione;
+# restituisce il riepilogo dell'aggiornamento (incidenti nuovi, modificati e invariati, righe aggiunte e sostituite)
+def refresh_dataset(csv_path, base_csv=DATASET_CSV, store_dir=DATASET_STORE):
+    manifest = open_store(base_csv, store_dir)
 
-# Controlla se il file esiste già
-if not os.path.exists(file_path):
-    df_countries.to_csv(file_path, index=False)
+    # l'aggiornamento viene tenuto in memoria: le sue categorie nuove si aggiungono a quelle del dataset
+    source = scan_source(csv_path)
+    update_categories = category_values(source)
+    categories = {
+        column: sorted(set(manifest["categories"][column]) | set(update_categories[column]))
+        for column in CATEGORICAL_COLUMNS
+    }
+    update = prepare_dataset(source, categories).collect()
+
+    # righe già presenti nel dataset per gli incidenti dell'aggiornamento
+    ids = update["Main ID"].drop_nulls().unique()
+    current = scan_segments(store_dir, {**manifest, "categories": categories}, positions=True)
+    stored = current.filter(pl.col("Main ID").is_in(ids)).collect()
+    stored_ids = stored["Main ID"].unique()
+
+    # incidenti modificati e righe da aggiungere (le righe senza "Main ID" non si possono confrontare e vengono aggiunte)
+    changed = changed_ids(update.filter(pl.col("Main ID").is_in(stored_ids)), stored)
+    appended = update.filter(
+        pl.col("Main ID").is_null() | ~pl.col("Main ID").is_in(stored_ids) | pl.col("Main ID").is_in(changed)
+    )
+    removed = stored.filter(pl.col("Main ID").is_in(changed))
+
+    summary = {
+        "new": ids.len() - stored_ids.len(),
+        "changed": changed.len(),
+        "unchanged": stored_ids.len() - changed.len(),
+        "appended_rows": appended.height,
+        "removed_rows": removed.height,
+        "version": manifest["version"]
+    }
+    if appended.is_empty():
+        return summary
+
+    # nuova versione: nuovo segmento, righe sostituite nei segmenti precedenti e tabelle pre-aggregate corrette
+    source_hash = file_hash(csv_path)
+    version = hashlib.sha256(f"{manifest['version']}:{source_hash}".encode()).hexdigest()[:16]
+    segment_file = f"part-{len(manifest['segments']):05d}-{version}.arrow"
+    write_arrow(Path(store_dir) / segment_file, [appended], dataset_schema(categories))
+
+    deleted = dict(removed.group_by("_segment").agg("_row").iter_rows())
+    segments = [
+        {**segment, "deleted": sorted(segment["deleted"] + deleted.get(index, []))}
+        for index, segment in enumerate(manifest["segments"])
+    ]
+    segments.append({
+        "file": segment_file, "source": str(csv_path), "source_hash": source_hash,
+        "rows": appended.height, "deleted": []
+    })
+
+    tables = {}
+    for name, (aggregate, keys) in AGGREGATES.items():
+        table = pl.read_ipc(Path(store_dir) / manifest["aggregates"][name], memory_map=False)
+        tables[name] = update_aggregate(
+            table, keys, aggregate(appended.lazy()).collect(), aggregate(removed.lazy()).collect()
+        )
+
+    write_manifest(store_dir, {
+        **manifest,
+        "version": version,
+        "rows": manifest["rows"] + appended.height - removed.height,
+        "categories": categories,
+        "segments": segments,
+        "aggregates": write_aggregates(store_dir, version, tables)
+    }, manifest)
+    summary["version"] = version
+    return summary
+
+#######################################################################################
+# Download del TopoJSON e creazione del file delle regioni
+# l'atlante mondiale viene salvato in locale, così l'applicazione non deve scaricarlo a runtime.
+# Si usa il livello di semplificazione 50m: il 110m mostra coste spigolose già nella mappa del mondo
+# dell'applicazione (larga circa 560 pixel), il 10m servirebbe solo per viste regionali ingrandite, che non ci sono
+
+ATLAS_URL = "https://cdn.jsdelivr.net/npm/world-atlas@2/countries-{resolution}.json"  # URL del TopoJSON
+ATLAS_DIR = Path("static") / "topojson"  # cartella con gli atlanti salvati in locale, servita da Streamlit come file statici
+ATLAS_RESOLUTION = "50m"  # livello di semplificazione dell'atlante
+ATLAS_FILE = ATLAS_DIR / f"countries-{ATLAS_RESOLUTION}.json"  # atlante salvato in locale
+
+# scarica il TopoJSON di una data risoluzione
+def download_atlas(resolution):
+    import requests
+
+    # Scarica il file JSON dall'URL
+    url = ATLAS_URL.format(resolution=resolution)
+    response = requests.get(url)
+
+    # Verifica se la richiesta ha avuto successo
+    if response.status_code != 200:
+        raise RuntimeError(f"Errore durante il download dell'atlante '{url}': {response.status_code}")
+    return response.json()  # Converte il contenuto in un dizionario Python
+
+def download_countries():
+    import pandas as pd
+
+    topojson = download_atlas(ATLAS_RESOLUTION)
+
+    # Crea una lista vuota per memorizzare i dati
+    countries_data = []
+
+    # Itera attraverso le geometrie per estrarre i nomi dei paesi
+    for feature in topojson["objects"]["countries"]["geometries"]:
+        country_name = feature["properties"].get("name", "Unknown")  # Ottieni il nome del paese
+        countries_data.append({"country": country_name, "region": "Null"})  # Aggiungi 'Null' per la regione
+
+    # Converti la lista in un DataFrame
+    df_countries = pd.DataFrame(countries_data)
+
+    # Nome del file CSV
+    file_path = 'countries.csv'
+
+    # Controlla se il file esiste già
+    if not os.path.exists(file_path):
+        df_countries.to_csv(file_path, index=False)
+        print(f"File '{file_path}' salvato correttamente.")
+    else:
+        print(f"Il file '{file_path}' esiste già. Nessun salvataggio effettuato.")
+
+# salva in locale l'atlante, con la regione di ogni paese (da countries.csv) già inserita
+# nelle proprietà delle geometrie, così la mappa non deve fare il lookup lato client
+def build_atlas(countries_path="countries.csv", file_path=ATLAS_FILE):
+    import pandas as pd
+
+    df_countries = pd.read_csv(countries_path)
+    regions = dict(zip(df_countries["country"], df_countries["region"].fillna("Null")))
+
+    topojson = download_atlas(ATLAS_RESOLUTION)
+    for feature in topojson["objects"]["countries"]["geometries"]:
+        properties = feature.setdefault("properties", {})
+        properties["region"] = regions.get(properties.get("name"), "Null")
+
+    Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+    Path(file_path).write_text(json.dumps(topojson, separators=(",", ":")))
     print(f"File '{file_path}' salvato correttamente.")
-else:
-    print(f"Il file '{file_path}' esiste già. Nessun salvataggio effettuato.")
 
 #######################################################################################
+# Immagini dell'applicazione
+# le immagini originali in images/ vengono convertite in varianti di larghezza adatta alla colonna
+# dell'applicazione (e agli schermi ad alta densità), in WebP e in JPEG per i browser senza WebP, salvate
+# in static/images/ e servite da Streamlit come file statici. Il nome di ogni variante contiene l'hash
+# dell'originale e dei parametri di conversione, quindi un URL non cambia mai contenuto e può restare
+# nella cache del browser a tempo indeterminato; un'immagine viene riconvertita solo se l'originale cambia
+
+IMAGES_DIR = Path("images")  # immagini originali
+IMAGE_ASSETS_DIR = Path("static") / "images"  # varianti convertite, servite da Streamlit come file statici
+IMAGE_MANIFEST_NAME = "manifest.json"  # indice delle varianti di ogni immagine
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+IMAGE_WIDTHS = (480, 736, 1104, 1472)  # larghezze delle varianti: la colonna di Streamlit è larga 736 pixel
+IMAGE_QUALITY = {"webp": 80, "jpeg": 82}  # qualità della compressione di ogni formato
+IMAGE_BACKGROUND = (14, 17, 23)  # sfondo del tema scuro, per le immagini trasparenti salvate in JPEG
+
+# nome della variante utilizzabile in un URL (senza spazi e caratteri accentati)
+def image_slug(name):
+    import unicodedata
+
+    ascii_name = unicodedata.normalize("NFKD", Path(name).stem).encode("ascii", "ignore").decode()
+    return "-".join("".join(c if c.isalnum() else " " for c in ascii_name.lower()).split())
+
+# larghezze delle varianti di un'immagine larga "width" pixel: le immagini non vengono mai ingrandite
+def variant_widths(width):
+    return [w for w in IMAGE_WIDTHS if w < width] + ([width] if width <= IMAGE_WIDTHS[-1] else [])
+
+# conversione di un'immagine originale in tutte le varianti (solo quelle non ancora presenti)
+def build_image(source, assets_dir, content_hash):
+    from PIL import Image
+
+    with Image.open(source) as original:
+        original.load()
+    slug = image_slug(source.name)
+    variants = []
+    for width in variant_widths(original.width):
+        height = round(original.height * width / original.width)
+        resized = original if width == original.width else original.resize((width, height), Image.Resampling.LANCZOS)
+        files = {fmt: f"{slug}-{width}.{content_hash}.{'jpg' if fmt == 'jpeg' else fmt}" for fmt in IMAGE_QUALITY}
+        for fmt, file in files.items():
+            path = Path(assets_dir) / file
+            if path.exists():
+                continue
+            image = resized
+            if fmt == "jpeg" and image.mode != "RGB":
+                # il JPEG non ha trasparenza: l'immagine viene composta sullo sfondo del tema
+                background = Image.new("RGB", image.size, IMAGE_BACKGROUND)
+                background.paste(image, mask=image.convert("RGBA").getchannel("A"))
+                image = background
+            with atomic_path(path) as partial_path:
+                image.save(partial_path, format=fmt.upper(), quality=IMAGE_QUALITY[fmt], optimize=True, **({"method": 6} if fmt == "webp" else {}))
+        variants.append({"width": width, **files})
+    return {"width": original.width, "height": original.height, "hash": content_hash, "variants": variants}
+
+# varianti di tutte le immagini in images/, convertite se mancano o se l'originale è cambiato.
+# restituisce l'indice {nome dell'originale: dimensioni, hash e file delle varianti}, vuoto
+# se la cartella delle varianti non è scrivibile (l'applicazione mostra allora gli originali)
+def build_images(images_dir=IMAGES_DIR, assets_dir=IMAGE_ASSETS_DIR):
+    manifest_path = Path(assets_dir) / IMAGE_MANIFEST_NAME
+    try:
+        previous = json.loads(manifest_path.read_text())
+    except (OSError, ValueError):
+        previous = {}
+    parameters = json.dumps([IMAGE_WIDTHS, IMAGE_QUALITY, IMAGE_BACKGROUND]).encode()
+
+    manifest = {}
+    try:
+        Path(assets_dir).mkdir(parents=True, exist_ok=True)
+        for source in sorted(Path(images_dir).iterdir()):
+            if source.suffix.lower() not in IMAGE_EXTENSIONS:
+                continue
+            content_hash = hashlib.sha256(source.read_bytes() + parameters).hexdigest()[:12]
+            entry = previous.get(source.name)
+            if entry is None or entry["hash"] != content_hash or not all(
+                (Path(assets_dir) / variant[fmt]).exists() for variant in entry["variants"] for fmt in IMAGE_QUALITY
+            ):
+                entry = build_image(source, assets_dir, content_hash)
+            manifest[source.name] = entry
+
+        if manifest != previous:
+            with atomic_path(manifest_path) as partial_path:
+                partial_path.write_text(json.dumps(manifest, indent=2))
+
+            # rimozione delle varianti di immagini modificate o rimosse (non dei file temporanei di altri worker)
+            keep = {IMAGE_MANIFEST_NAME} | {variant[fmt] for entry in manifest.values() for variant in entry["variants"] for fmt in IMAGE_QUALITY}
+            for file in Path(assets_dir).iterdir():
+                if file.name not in keep and file.suffix != ".partial":
+                    file.unlink(missing_ok=True)
+    except OSError:
+        return {}
+    return manifest
+
+#######################################################################################
+# Scala colori della heatmap e relativa legenda
+
+# definisco la scala colori (dal meno al più intenso), condivisa tra la heatmap e il controllo della luminosità
+COLOR_BREWER_SCALE5 = (
+    (230, 0, 0),     
+    (204, 0, 0),     
+    (179, 0, 0),     
+    (153, 0, 0),   
+    (128, 0, 0),
+    (102, 0, 0),
+    (77, 0, 0),
+    (51, 0, 0),
+    (26, 0, 0)
+)
+
+# luminosità HSL di ogni colore di una scala (valori RGB tra 0 e 255)
+def scale_luminosities(scale=COLOR_BREWER_SCALE5):
+    return [colorsys.rgb_to_hls(r / 255, g / 255, b / 255)[1] for r, g, b in scale]
+
+# legenda verticale di una scala colori come gradiente HTML/CSS, con etichette e titolo; con "log" le etichette
+# seguono una scala logaritmica (log(1 + valore)), come i colori della griglia aggregata.
+# ogni combinazione (scala, etichetta, tema, intervallo) viene costruita una sola volta e poi riutilizzata
+@functools.lru_cache(maxsize=32)
+def color_scale_legend(scale, label, theme="dark", vmin=0, vmax=100, ticks=5, height=400, log=False):
+    text_color = "white" if theme == "dark" else "black"  # colore del testo in base al tema
+    gradient = ", ".join(f"rgb({r}, {g}, {b})" for r, g, b in scale)  # colori dal basso verso l'alto
+
+    # etichette numeriche, dalla più alta (in alto) alla più bassa
+    if log:
+        tick_values = np.expm1(np.linspace(np.log1p(vmax), np.log1p(vmin), ticks))
+        tick_html = "".join(f"<span>{value:,.0f}</span>" for value in tick_values)
+    else:
+        tick_values = np.linspace(vmax, vmin, ticks)
+        tick_html = "".join(f"<span>{value:g}</span>" for value in tick_values)
+
+    return f"""
+<div style='display: flex; align-items: stretch; justify-content: center; gap: 6px; height: {height}px; color: {text_color}; font-size: 12px;'>
+    <div style='width: 18px; background: linear-gradient(to top, {gradient}); border: 1px solid {text_color};'></div>
+    <div style='display: flex; flex-direction: column; justify-content: space-between;'>{tick_html}</div>
+    <div style='writing-mode: vertical-rl; text-align: center; font-size: 13px;'>{label}</div>
+</div>
+"""
+
 #Controllo luminosità colori usati nella heatmap
-#definisco la scala colori
-COLOR_BREWER_SCALE5 = np.array([
-    [230, 0, 0],     
-    [204, 0, 0],     
-    [179, 0, 0],     
-    [153, 0, 0],   
-    [128, 0, 0],
-    [102, 0, 0],
-    [77, 0, 0],
-    [51, 0, 0],
-    [26, 0, 0]
-]) / 255  # normalizza tra 0 e 1
-
-# converti in HSL per estrarre la luminosità
-luminosities = [colorsys.rgb_to_hls(r, g, b)[1] for r, g, b in COLOR_BREWER_SCALE5]
-
-# plotta la luminosità
-plt.figure(figsize=(6, 4))
-plt.plot(luminosities, marker='o', linestyle='-', color='red')
-plt.xlabel("Indice del colore")
-plt.ylabel("Luminosità (HSL)")
-plt.title("Luminosità della scala COLOR_BREWER_SCALE5")
-plt.gca().invert_yaxis()  # Inverti l'asse se vuoi vedere la diminuzione
-plt.show()
+def check_heatmap_luminosity():
+    import matplotlib.pyplot as plt
+
+    # converti in HSL per estrarre la luminosità
+    luminosities = scale_luminosities(COLOR_BREWER_SCALE5)
+
+    # plotta la luminosità
+    plt.figure(figsize=(6, 4))
+    plt.plot(luminosities, marker='o', linestyle='-', color='red')
+    plt.xlabel("Indice del colore")
+    plt.ylabel("Luminosità (HSL)")
+    plt.title("Luminosità della scala COLOR_BREWER_SCALE5")
+    plt.gca().invert_yaxis()  # Inverti l'asse se vuoi vedere la diminuzione
+    plt.show()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Preparazione del dataset, dell'atlante e della scala colori della heatmap")
+    parser.add_argument(
+        "--refresh", nargs="+", metavar="CSV",
+        help="aggiorna il dataset pre-elaborato con i csv indicati, elaborando solo gli incidenti nuovi o modificati"
+    )
+    args = parser.parse_args()
+
+    if args.refresh:
+        for csv_path in args.refresh:
+            summary = refresh_dataset(csv_path)
+            print(
+                f"{csv_path}: {summary['new']} incidenti nuovi, {summary['changed']} modificati, "
+                f"{summary['unchanged']} invariati (versione {summary['version']})."
+            )
+        raise SystemExit
+
+    manifest = open_store()
+    print(f"Dataset '{DATASET_STORE}' pronto ({manifest['rows']} righe, versione {manifest['version']}).")
+    download_countries()
+    build_atlas()
+    images = build_images()
+    print(f"Varianti di {len(images)} immagini pronte in '{IMAGE_ASSETS_DIR}'.")
+    check_heatmap_luminosity()
@@ -0,0 +1,281 @@
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+import streamlit as st
+
+#######################################################################################
+# Profiling delle sezioni dell'applicazione (opzionale)
+# si attiva per tutte le sessioni con la variabile d'ambiente MM_PROFILE=1, oppure per una sola sessione
+# aprendo l'applicazione con il parametro ?profile=1 nell'URL. Quando è attivo, ad ogni esecuzione:
+# - ogni funzione di app.py viene sostituita da un wrapper che ne misura il tempo (totale e al netto
+#   delle funzioni di app.py che chiama) e la variazione della memoria residente del processo
+# - le cache (st.cache_resource e shared_cache) registrano i risultati trovati e quelli calcolati
+# - in fondo alla pagina un pannello richiudibile mostra i tempi, con l'esportazione in JSON e OpenMetrics
+# quando non è attivo le funzioni non vengono sostituite: restano solo un controllo per esecuzione
+# e, per le cache, la lettura di una variabile del thread ad ogni risultato calcolato
+#
+# la memoria è quella dell'intero processo, quindi con più sessioni contemporanee le variazioni
+# di una sezione comprendono anche le allocazioni delle altre sessioni
+
+PROFILE_ENABLED = os.environ.get("MM_PROFILE", "").lower() in ("1", "true", "yes")  # profiling per tutte le sessioni
+PROFILE_QUERY_PARAM = "profile"  # parametro dell'URL che attiva il profiling per una sessione
+PROFILE_HISTORY = 20  # esecuzioni mantenute per ogni sessione (comprese quelle dei frammenti)
+PROFILE_SESSION_KEY = "_profile_history"
+
+active = threading.local()  # esecuzione in corso nel thread dello script ("run")
+cached_functions = set()  # nomi delle funzioni decorate con cache_miss
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# memoria residente del processo, in byte: su Linux da /proc, altrove con psutil se installato
+# (None se non è disponibile, ad esempio su Windows o macOS senza psutil: i tempi vengono misurati comunque)
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+# tempi e cache di un'esecuzione dello script (o della riesecuzione di un frammento)
+class RunProfile:
+    def __init__(self, kind):
+        self.kind = kind
+        self.started = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.sections = {}  # nome -> statistiche, nell'ordine della prima chiamata
+        self.caches = {}  # nome -> [trovati, calcolati]
+        self.stack = []  # sezioni in corso: [nome, inizio, rss iniziale, tempo delle sezioni figlie]
+        self.peak_rss = rss_bytes()
+
+    def enter(self, name):
+        self.stack.append([name, time.perf_counter(), rss_bytes(), 0.0])
+
+    def exit(self):
+        name, start, rss, children = self.stack.pop()
+        elapsed = time.perf_counter() - start
+        current_rss = rss_bytes()
+        if current_rss is not None:
+            self.peak_rss = max(self.peak_rss, current_rss)
+        if self.stack:
+            self.stack[-1][3] += elapsed
+        stats = self.sections.setdefault(name, {
+            "parent": self.stack[-1][0] if self.stack else None,
+            "calls": 0, "total_s": 0.0, "self_s": 0.0, "max_s": 0.0, "rss_delta_bytes": 0
+        })
+        stats["calls"] += 1
+        stats["total_s"] += elapsed
+        stats["self_s"] += elapsed - children
+        stats["max_s"] = max(stats["max_s"], elapsed)
+        if current_rss is not None:
+            stats["rss_delta_bytes"] += current_rss - rss
+        else:
+            stats["rss_delta_bytes"] = None
+        if not self.stack:
+            self.duration = time.perf_counter() - self.start  # fine dell'ultima sezione (per i frammenti)
+
+    def cache_event(self, name, hit):
+        self.caches.setdefault(name, [0, 0])[0 if hit else 1] += 1
+
+    # trovati e calcolati di ogni cache: per le funzioni con st.cache_resource i risultati calcolati
+    # sono registrati da cache_miss e quelli trovati sono le chiamate rimanenti
+    def cache_stats(self):
+        stats = {name: {"hits": hits, "misses": misses} for name, (hits, misses) in self.caches.items()}
+        for name in cached_functions:
+            calls = self.sections.get(name, {}).get("calls", 0)
+            misses = stats.get(name, {}).get("misses", 0)
+            if calls or misses:
+                stats[name] = {"hits": max(calls - misses, 0), "misses": misses}
+        return dict(sorted(stats.items()))
+
+    def report(self):
+        duration = self.duration if self.duration is not None else time.perf_counter() - self.start
+        return {
+            "kind": self.kind,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "duration_s": round(duration, 6),
+            "peak_rss_bytes": self.peak_rss,
+            "sections": {
+                name: {**stats, **{key: round(stats[key], 6) for key in ("total_s", "self_s", "max_s")}}
+                for name, stats in self.sections.items()
+            },
+            "caches": self.cache_stats(),
+        }
+
+# esecuzioni recenti della sessione (la più recente per ultima)
+def session_history():
+    return st.session_state.setdefault(PROFILE_SESSION_KEY, deque(maxlen=PROFILE_HISTORY))
+
+# inizio del profiling di un'esecuzione completa dello script, se attivo per la sessione;
+# restituisce il profilo dell'esecuzione oppure None
+def start_run(kind):
+    if not (PROFILE_ENABLED or st.query_params.get(PROFILE_QUERY_PARAM, "").lower() in ("1", "true", "yes")):
+        active.run = None
+        return None
+    run = RunProfile(kind)
+    active.run = run
+    session_history().append(run)
+    return run
+
+# fine dell'esecuzione: le chiamate successive nello stesso thread non vengono più attribuite ad essa
+def finish_run(run):
+    run.duration = time.perf_counter() - run.start
+    active.run = None
+
+# esecuzione in corso nel thread; le riesecuzioni dei frammenti (senza start_run) ne aprono una nuova
+def current_run(history=None):
+    run = getattr(active, "run", None)
+    if run is None and history is not None:
+        run = RunProfile("frammento")
+        active.run = run
+        history.append(run)
+    return run
+
+# misura di un blocco di codice come sezione dell'esecuzione in corso (nessun effetto se il profiling non è attivo)
+def section(name):
+    run = getattr(active, "run", None)
+    if run is None:
+        return nullcontext()
+    return timed(run, name)
+
+@contextmanager
+def timed(run, name):
+    run.enter(name)
+    try:
+        yield
+    finally:
+        run.exit()
+
+# registrazione di un risultato di una cache (trovato o calcolato) nell'esecuzione in corso
+def cache_event(name, hit):
+    run = getattr(active, "run", None)
+    if run is not None:
+        run.cache_event(name, hit)
+
+# decoratore da mettere sotto @st.cache_resource: la funzione decorata viene eseguita solo quando il risultato
+# non è in cache, quindi ogni chiamata è un risultato calcolato
+def cache_miss(func):
+    cached_functions.add(func.__name__)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        cache_event(func.__name__, hit=False)
+        return func(*args, **kwargs)
+
+    return wrapper
+
+# sostituzione delle funzioni definite nel modulo (namespace = globals() di app.py) con wrapper che le misurano;
+# va chiamata dopo la definizione delle funzioni e prima che vengano salvate altrove (es. il dizionario delle pagine).
+# i wrapper valgono solo per questa esecuzione, perché Streamlit riesegue il modulo ad ogni interazione
+def instrument(namespace):
+    history = session_history()
+    for name, value in list(namespace.items()):
+        if name.startswith("__") or inspect.isclass(value) or not callable(value):
+            continue
+        if getattr(value, "__module__", None) != namespace["__name__"]:
+            continue
+        namespace[name] = instrumented(value, name, history)
+
+def instrumented(func, name, history):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        run = current_run(history)
+        run.enter(name)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            run.exit()
+
+    return wrapper
+
+#######################################################################################
+# Esportazione e pannello
+
+# valore di un'etichetta OpenMetrics, con barre rovesciate, virgolette e a capo protetti
+def label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+# metriche di un'esecuzione in formato OpenMetrics (testo)
+def openmetrics(report):
+    lines = []
+
+    def family(metric, kind, help_text, samples):
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.append(f"# HELP {metric} {help_text}")
+        suffix = "_total" if kind == "counter" else ""
+        for labels, value in samples:
+            if value is None:
+                continue
+            label_text = ",".join(f'{key}="{label_value(val)}"' for key, val in labels.items())
+            lines.append(f"{metric}{suffix}{{{label_text}}} {value}")
+
+    sections = report["sections"].items()
+    caches = report["caches"].items()
+    family("mm_run_duration_seconds", "gauge", "Durata dell'esecuzione.", [({"kind": report["kind"]}, report["duration_s"])])
+    family("mm_run_peak_rss_bytes", "gauge", "Memoria residente massima del processo durante l'esecuzione.", [({"kind": report["kind"]}, report["peak_rss_bytes"])])
+    family("mm_section_calls", "counter", "Chiamate della sezione.", [({"section": name}, s["calls"]) for name, s in sections])
+    family("mm_section_seconds", "counter", "Tempo della sezione, comprese le sezioni chiamate.", [({"section": name}, s["total_s"]) for name, s in sections])
+    family("mm_section_self_seconds", "counter", "Tempo della sezione al netto delle sezioni chiamate.", [({"section": name}, s["self_s"]) for name, s in sections])
+    family("mm_section_rss_delta_bytes", "gauge", "Variazione della memoria residente durante la sezione.", [({"section": name}, s["rss_delta_bytes"]) for name, s in sections])
+    family("mm_cache_hits", "counter", "Risultati trovati in cache.", [({"cache": name}, c["hits"]) for name, c in caches])
+    family("mm_cache_misses", "counter", "Risultati calcolati perché assenti dalla cache.", [({"cache": name}, c["misses"]) for name, c in caches])
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+# pannello richiudibile con i tempi dell'esecuzione, le cache, le esecuzioni recenti della sessione
+# (comprese le riesecuzioni dei frammenti) e i pulsanti di esportazione
+def render_panel(run):
+    import pandas as pd
+
+    report = run.report()
+    history = [r.report() for r in session_history()]
+    with st.expander(f"⏱️ Profilo dell'esecuzione: {report['duration_s'] * 1000:.0f} ms", expanded=False):
+        st.caption(
+            (f"Memoria residente massima {report['peak_rss_bytes'] / 2**20:.0f} MB. " if report["peak_rss_bytes"] is not None else "")
+            + "Tempo totale comprese le sezioni chiamate, tempo proprio al netto di esse."
+        )
+        st.dataframe(
+            pd.DataFrame([
+                {
+                    "sezione": name, "chiamata da": stats["parent"] or "", "chiamate": stats["calls"],
+                    "totale (ms)": stats["total_s"] * 1000, "proprio (ms)": stats["self_s"] * 1000,
+                    "massimo (ms)": stats["max_s"] * 1000, "memoria (MB)": stats["rss_delta_bytes"] / 2**20 if stats["rss_delta_bytes"] is not None else None,
+                }
+                for name, stats in sorted(report["sections"].items(), key=lambda item: -item[1]["total_s"])
+            ]),
+            hide_index=True,
+            use_container_width=True,
+            column_config={column: st.column_config.NumberColumn(format="%.1f") for column in ("totale (ms)", "proprio (ms)", "massimo (ms)", "memoria (MB)")},
+        )
+        if report["caches"]:
+            st.markdown("**Cache**")
+            st.dataframe(
+                pd.DataFrame([{"cache": name, "trovati": c["hits"], "calcolati": c["misses"]} for name, c in report["caches"].items()]),
+                hide_index=True,
+                use_container_width=True,
+            )
+        if len(history) > 1:
+            st.markdown("**Esecuzioni recenti della sessione**")
+            st.dataframe(
+                pd.DataFrame([{"inizio": r["started"], "tipo": r["kind"], "durata (ms)": r["duration_s"] * 1000} for r in reversed(history)]),
+                hide_index=True,
+                use_container_width=True,
+                column_config={"durata (ms)": st.column_config.NumberColumn(format="%.1f")},
+            )
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("Esporta JSON", json.dumps(history, indent=2), "profile.json", "application/json")
+        with col2:
+            st.download_button("Esporta OpenMetrics", openmetrics(report), "profile.txt", "application/openmetrics-text")
@@ -0,0 +1,146 @@
+import functools
+import hashlib
+import inspect
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import polars as pl
+
+import data_prep
+import profiling
+
+#######################################################################################
+# Cache dei risultati derivati dal dataset condivisa tra i processi
+# le funzioni decorate con @shared_cache restituiscono DataFrame polars (punti validi, conteggi, griglie...)
+# e il risultato viene salvato in un backend intercambiabile, scelto con la variabile d'ambiente MM_CACHE:
+# - "disk" (predefinito): file Arrow IPC non compressi in MM_CACHE_DIR, letti in memory-map, quindi più worker
+#   Streamlit sullo stesso host condividono una sola copia fisica (la page cache del sistema operativo) e un worker
+#   riavviato trova i risultati già calcolati; i file meno usati di recente vengono rimossi oltre MM_CACHE_MAX_MB
+# - "memory": dizionario LRU nel processo, per filesystem in sola lettura o per escludere il disco
+# nell'applicazione @st.cache_resource resta sopra @shared_cache, così nello stesso processo
+# le esecuzioni successive riusano l'oggetto già in memoria senza rileggere il file
+
+CACHE_BACKEND = os.environ.get("MM_CACHE", "disk")  # backend della cache: "disk" o "memory"
+CACHE_DIR = Path(os.environ.get("MM_CACHE_DIR", Path("data") / "cache"))  # cartella della cache su disco
+CACHE_MAX_BYTES = int(float(os.environ.get("MM_CACHE_MAX_MB", 1024)) * 2**20)  # dimensione massima della cache su disco
+CACHE_MAX_ENTRIES = 256  # numero massimo di risultati nella cache in memoria
+
+# cache in memoria nel processo, con rimozione dei risultati usati meno di recente
+class MemoryBackend:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+        self.lock = threading.Lock()  # le sessioni Streamlit girano in thread diversi dello stesso processo
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+# cache su disco condivisa tra processi: un file Arrow IPC per risultato, letto in memory-map.
+# la data di modifica dei file viene aggiornata ad ogni lettura e usata per rimuovere i meno usati di recente
+class DiskBackend:
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return self.directory / f"{key}.arrow"
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            value = pl.read_ipc(path, memory_map=True)
+            os.utime(path)
+        except (OSError, pl.exceptions.ComputeError):
+            return None
+        return value
+
+    # il file viene scritto in modo atomico (data_prep.atomic_path, con un nome temporaneo diverso per ogni processo
+    # e thread), così un altro worker o un'altra sessione non legge mai un file incompleto; se la cartella
+    # non è scrivibile il risultato semplicemente non viene condiviso
+    def put(self, key, value):
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with data_prep.atomic_path(self.path(key)) as partial_path:
+                value.write_ipc(partial_path, compression="uncompressed")
+            self.evict()
+        except OSError:
+            pass
+
+    # rimozione dei file usati meno di recente finché la cache non rientra nella dimensione massima
+    # (i worker che stanno leggendo un file rimosso continuano a vederne il contenuto)
+    def evict(self):
+        files = []
+        for file in self.directory.glob("*.arrow"):
+            try:
+                stat = file.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, file))
+        total = sum(size for _, size, _ in files)
+        for _, size, file in sorted(files):
+            if total <= self.max_bytes:
+                break
+            file.unlink(missing_ok=True)
+            total -= size
+
+BACKENDS = {"disk": DiskBackend, "memory": MemoryBackend}
+
+# backend della cache indicato da MM_CACHE
+def make_backend(name=CACHE_BACKEND):
+    if name not in BACKENDS:
+        raise ValueError(f"Backend della cache sconosciuto: {name!r} (valori ammessi: {', '.join(BACKENDS)})")
+    return BACKENDS[name]()
+
+backend = make_backend()
+
+CODE_DEPENDENCIES = [Path(data_prep.__file__)]  # moduli usati da tutte le funzioni in cache (preparazione dei dati)
+
+# hash del contenuto di un file sorgente, ricalcolato solo se il file è stato modificato
+# (app.py viene rieseguito ad ogni interazione e le funzioni decorate ogni volta)
+@functools.cache
+def source_hash(path, mtime_ns):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+# impronta del codice di una funzione: comprende l'intero file in cui è definita (con le funzioni e le costanti
+# che usa) e i moduli in CODE_DEPENDENCIES, quindi dopo una modifica al codice la cache su disco non restituisce
+# risultati calcolati dalla versione precedente (anche a costo di ricalcolare risultati rimasti uguali)
+def code_fingerprint(func):
+    digest = hashlib.sha256()
+    try:
+        files = [Path(inspect.getsourcefile(func)), *CODE_DEPENDENCIES]
+        for file in files:
+            digest.update(source_hash(str(file), file.stat().st_mtime_ns).encode())
+    except (OSError, TypeError):
+        digest.update(func.__code__.co_code.hex().encode())
+    return digest.hexdigest()[:16]
+
+# decoratore per le funzioni che restituiscono un DataFrame polars a partire da argomenti semplici
+# (versione del dataset, nomi di colonne, numeri): la chiave combina nome e codice della funzione e argomenti
+def shared_cache(func):
+    fingerprint = code_fingerprint(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        call = f"{func.__module__}.{func.__qualname__}:{fingerprint}:{args!r}:{sorted(kwargs.items())!r}"
+        key = hashlib.sha256(call.encode()).hexdigest()[:32]
+        value = backend.get(key)
+        profiling.cache_event(f"{func.__name__} (shared_cache)", hit=value is not None)
+        if value is None:
+            value = func(*args, **kwargs)
+            backend.put(key, value)
+        return value
+
+    return wrapper
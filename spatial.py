@@ -0,0 +1,153 @@
+import numpy as np
+
+#######################################################################################
+# Geometria sulla sfera e clustering spaziale degli incidenti
+# le coordinate vengono convertite in punti sulla sfera unitaria, così le ricerche per raggio in km diventano
+# ricerche per distanza euclidea su un KD-tree di SciPy (importato al primo utilizzo, come in app.py)
+
+EARTH_RADIUS_KM = 6371.0  # raggio medio della Terra
+
+# conversione di latitudine e longitudine in coordinate cartesiane sulla sfera unitaria:
+# la distanza euclidea tra due punti (corda) cresce con la distanza haversine,
+# quindi un KD-tree su queste coordinate permette ricerche per raggio in km
+def unit_sphere(lat, lng):
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lng = np.radians(np.asarray(lng, dtype=float))
+    return np.column_stack([np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)])
+
+# lunghezza della corda sulla sfera unitaria corrispondente a una distanza in km lungo la superficie
+def chord_length(distance_km):
+    return 2 * np.sin(np.minimum(distance_km / EARTH_RADIUS_KM, np.pi) / 2)
+
+# distanza in km lungo la superficie corrispondente a una corda sulla sfera unitaria
+def surface_distance(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(np.asarray(chord) / 2, 1))
+
+# indice spaziale degli incidenti con coordinate valide, per interrogazioni su un'area senza scorrere tutto il dataset:
+# - KD-tree sulle coordinate della sfera unitaria per le ricerche per raggio e dei k incidenti più vicini (distanza haversine)
+# - incidenti ordinati per latitudine per le ricerche per bounding box (ricerca binaria sulla latitudine, filtro sulla longitudine)
+# le interrogazioni restituiscono gli indici degli incidenti nel dataframe, con la distanza in km dove prevista
+class SpatialIndex:
+    def __init__(self, lat, lng, ids):
+        from scipy.spatial import cKDTree
+
+        self.ids = np.asarray(ids)
+        self.tree = cKDTree(unit_sphere(lat, lng))
+        self.lat_order = np.argsort(lat, kind="stable")
+        self.lat_sorted = np.asarray(lat, dtype=float)[self.lat_order]
+        self.lng_sorted = np.asarray(lng, dtype=float)[self.lat_order]
+
+    # incidenti entro radius_km dal punto, ordinati per distanza
+    def within_radius(self, lat, lng, radius_km):
+        center = unit_sphere(lat, lng)[0]
+        positions = np.asarray(self.tree.query_ball_point(center, chord_length(radius_km)), dtype=int)
+        distances = surface_distance(np.linalg.norm(self.tree.data[positions] - center, axis=1))
+        order = np.argsort(distances, kind="stable")
+        return self.ids[positions[order]], distances[order]
+
+    # i k incidenti più vicini al punto, ordinati per distanza (nessuno se l'indice è vuoto o k è zero)
+    def nearest(self, lat, lng, k):
+        k = min(k, len(self.ids))
+        if k <= 0:
+            return self.ids[:0], np.empty(0)
+        chords, positions = self.tree.query(unit_sphere(lat, lng)[0], k=k)
+        return self.ids[np.atleast_1d(positions)], surface_distance(np.atleast_1d(chords))
+
+    # incidenti nel bounding box; se lng_min > lng_max il box attraversa l'antimeridiano
+    def in_bbox(self, lat_min, lat_max, lng_min, lng_max):
+        start = np.searchsorted(self.lat_sorted, lat_min, side="left")
+        stop = np.searchsorted(self.lat_sorted, lat_max, side="right")
+        lng = self.lng_sorted[start:stop]
+        if lng_min <= lng_max:
+            inside = (lng >= lng_min) & (lng <= lng_max)
+        else:
+            inside = (lng >= lng_min) | (lng <= lng_max)
+        return self.ids[self.lat_order[start:stop][inside]]
+
+#######################################################################################
+# Clustering automatico
+# clustering DBSCAN degli incidenti con metrica haversine, su KD-tree costruiti sulle coordinate della sfera unitaria.
+# nessuna fase elenca tutte le coppie di punti entro eps_km, che nelle aree dense crescono col quadrato dei punti:
+# - un punto è "core" se il suo min_samples-esimo vicino è entro eps_km: basta una ricerca dei k vicini più prossimi,
+#   senza contare (o elencare) tutto il vicinato, che nelle aree dense comprende migliaia di punti
+# - i punti "core" vengono coperti da sfere di raggio eps_km / 2 attorno a punti "guida": i core di una stessa sfera
+#   distano al più eps_km tra loro e formano un gruppo già connesso, e le guide distano più di eps_km / 2 tra loro,
+#   quindi in ogni area ce n'è un numero limitato
+# - due gruppi si uniscono se hanno due core entro eps_km (possibile solo se le guide distano al più 2 * eps_km),
+#   verificato cercando il core più vicino dell'altro gruppo
+# - i punti di bordo prendono l'etichetta del core più vicino entro eps_km
+# la memoria resta lineare nel numero di punti. Restituisce, per ogni incidente, l'etichetta del cluster (-1 per il rumore)
+def dbscan_haversine(lat, lng, eps_km, min_samples):
+    from scipy.spatial import cKDTree
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    # raggruppamento delle coordinate identiche (i punti distinti su cui lavora il clustering)
+    coordinates, inverse = np.unique(np.column_stack([lat, lng]).round(4), axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    n = len(coordinates)
+    radius = chord_length(eps_km)
+    xyz = unit_sphere(coordinates[:, 0], coordinates[:, 1])
+
+    # punti "core": almeno min_samples incidenti nel raggio, compreso il punto stesso
+    # (cercati tra tutti gli incidenti, così le coordinate ripetute pesano per il numero di incidenti)
+    kth_distance, _ = cKDTree(xyz[inverse]).query(xyz, k=[min_samples], distance_upper_bound=radius)
+    is_core = kth_distance[:, 0] <= radius
+    core_index = np.flatnonzero(is_core)
+    labels = np.full(n, -1)
+    if len(core_index) == 0:
+        return labels[inverse]
+    core_xyz = xyz[core_index]
+    core_tree = cKDTree(core_xyz)
+
+    # copertura dei core con sfere di raggio eps_km / 2: ogni core non ancora coperto diventa una guida
+    group = np.full(len(core_index), -1)
+    leaders = []
+    for point in range(len(core_index)):
+        if group[point] >= 0:
+            continue
+        members = np.asarray(core_tree.query_ball_point(core_xyz[point], radius / 2), dtype=int)
+        group[members[group[members] < 0]] = len(leaders)
+        leaders.append(point)
+
+    # unione dei gruppi vicini, partendo dalle guide più vicine (le coppie di gruppi già connessi vengono saltate)
+    members = np.split(np.argsort(group, kind="stable"), np.cumsum(np.bincount(group))[:-1])
+    parent = np.arange(len(leaders))
+
+    def root(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    leader_xyz = core_xyz[leaders]
+    pairs = cKDTree(leader_xyz).query_pairs(2 * radius, output_type="ndarray")
+    order = np.argsort(np.linalg.norm(leader_xyz[pairs[:, 0]] - leader_xyz[pairs[:, 1]], axis=1))
+    group_trees = {}
+    edges = []
+    for a, b in pairs[order]:
+        if root(a) == root(b):
+            continue
+        if len(members[a]) > len(members[b]):
+            a, b = b, a
+        if b not in group_trees:
+            group_trees[b] = cKDTree(core_xyz[members[b]])
+        distances, _ = group_trees[b].query(core_xyz[members[a]], distance_upper_bound=radius)
+        if np.any(distances <= radius):
+            parent[root(a)] = root(b)
+            edges.append((a, b))
+
+    # cluster: componenti connesse dei gruppi, numerate nell'ordine del primo core
+    edges = np.array(edges, dtype=int).reshape(-1, 2)
+    graph = coo_matrix((np.ones(len(edges)), (edges[:, 0], edges[:, 1])), shape=(len(leaders), len(leaders)))
+    _, components = connected_components(graph, directed=False)
+    _, first, cluster_of = np.unique(components[group], return_index=True, return_inverse=True)
+    labels[core_index] = np.argsort(np.argsort(first))[cluster_of]
+
+    # i punti di bordo (non core ma entro eps_km da un core) prendono l'etichetta del core più vicino
+    border_index = np.flatnonzero(~is_core)
+    distances, nearest = core_tree.query(xyz[border_index], distance_upper_bound=radius)
+    border = distances <= radius
+    labels[border_index[border]] = labels[core_index[nearest[border]]]
+
+    return labels[inverse]
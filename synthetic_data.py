@@ -0,0 +1,122 @@
+import argparse
+import datetime as dt
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+from data_prep import DATASET_COLUMNS
+
+#######################################################################################
+# Generatore di dataset sintetici con lo schema di MM_14_21.csv
+# ogni riga sintetica parte da un incidente reale estratto a caso (bootstrap), così la distribuzione congiunta
+# di regione, rotta, causa di morte e raggruppamento geografico resta quella del dataset originale,
+# e viene poi perturbata:
+# - data spostata di qualche giorno (anno e mese riportato ricalcolati di conseguenza)
+# - coordinate spostate con un rumore gaussiano, così i punti restano raggruppati lungo le rotte reali
+# - "Main ID" reso unico (id del modello, numero del blocco e riga nel blocco), perché identifica gli incidenti
+#   negli aggiornamenti incrementali e nel visualizzatore del dataset
+# - numeri di morti, dispersi, sopravvissuti, donne, uomini e bambini moltiplicati per un fattore lognormale,
+#   che mantiene (e allunga) la coda pesante della distribuzione delle vittime
+# le righe vengono scritte a blocchi, quindi la dimensione del file non è limitata dalla memoria,
+# e ogni blocco ha un generatore casuale derivato dal seed: lo stesso seed produce sempre lo stesso file
+#
+# uso:
+#   uv run python synthetic_data.py 1000000 data/synthetic_1M.csv --seed 0
+
+SOURCE_CSV = Path("MM_14_21.csv")  # dataset reale usato come modello
+CHUNK_ROWS = 100_000  # righe generate e scritte per ogni blocco
+SYNTHETIC_FORMAT = 2  # versione del formato dei dataset generati, da incrementare quando cambiano le righe prodotte
+
+DATE_SHIFT_DAYS = 15  # spostamento massimo della data, in giorni
+COORDINATE_SPREAD = 0.15  # deviazione standard del rumore sulle coordinate, in gradi
+COUNT_SPREAD = 0.4  # deviazione standard del logaritmo del fattore applicato ai conteggi
+
+FIRST_DATE = dt.date(2014, 1, 1)  # periodo coperto dal dataset
+LAST_DATE = dt.date(2021, 12, 31)
+
+# colonne con i conteggi di persone, perturbate con lo stesso fattore (il totale viene perturbato anch'esso
+# e non ricalcolato, perché nel dataset originale non sempre coincide con la somma di morti e dispersi)
+COUNT_COLUMNS = [
+    "Number Dead", "Minimum Estimated Number of Missing", "Total Number of Dead and Missing", "Number of Survivors",
+    "Number of Females", "Number of Males", "Number of Children"
+]
+
+# lettura degli incidenti reali usati come modello, con date, coordinate e conteggi già convertiti
+def load_template(csv_path=SOURCE_CSV):
+    raw = pl.read_csv(csv_path, columns=DATASET_COLUMNS, null_values=["", "NA", " "], infer_schema_length=None)
+    coordinates = pl.col("Coordinates").str.split_exact(",", 1)
+    return raw.with_columns(
+        pl.col("Incident Date").str.extract(r"^(\w{3}, \d{2}/\d{2}/\d{4})").str.strptime(pl.Date, "%a, %m/%d/%Y", strict=False).alias("date"),
+        coordinates.struct.field("field_0").str.strip_chars().cast(pl.Float64, strict=False).alias("lat"),
+        coordinates.struct.field("field_1").str.strip_chars().cast(pl.Float64, strict=False).alias("lng"),
+        *[pl.col(column).cast(pl.Float64) for column in COUNT_COLUMNS]
+    )
+
+# generazione del blocco numero "chunk", di "rows" righe sintetiche, a partire dagli incidenti modello
+def synthetic_chunk(template, rows, rng, chunk=0):
+    sample = template[rng.integers(0, template.height, rows)]
+
+    # ogni riga è un incidente a sé, con un "Main ID" diverso da quelli del modello e delle altre righe
+    main_id = pl.format("{}-s{}-{}", pl.col("Main ID").fill_null("incident"), pl.lit(chunk), pl.int_range(pl.len()))
+
+    # data spostata di qualche giorno, entro il periodo coperto dal dataset
+    shift = pl.Series(rng.integers(-DATE_SHIFT_DAYS, DATE_SHIFT_DAYS + 1, rows))
+    date = (pl.col("date") + pl.duration(days=shift)).clip(FIRST_DATE, LAST_DATE)
+
+    # coordinate spostate con rumore gaussiano; le coordinate mancanti o non interpretabili restano quelle originali
+    lat = (pl.col("lat") + rng.normal(0, COORDINATE_SPREAD, rows)).clip(-90, 90)
+    lng = (pl.col("lng") + rng.normal(0, COORDINATE_SPREAD, rows) + 180) % 360 - 180
+
+    # fattore moltiplicativo lognormale dei conteggi (un conteggio di almeno una persona resta almeno uno)
+    factor = pl.Series(rng.lognormal(0, COUNT_SPREAD, rows))
+    counts = [
+        pl.when(pl.col(column) > 0).then((pl.col(column) * factor).round().clip(1, None)).otherwise(pl.col(column)).alias(column)
+        for column in COUNT_COLUMNS
+    ]
+
+    return (
+        sample
+        .with_columns(main_id.alias("Main ID"), date.alias("date"), lat.alias("lat"), lng.alias("lng"), *counts)
+        .with_columns(
+            pl.when(pl.col("date").is_not_null())
+            .then(pl.col("date").dt.strftime("%a, %m/%d/%Y - 12:00"))
+            .otherwise(pl.col("Incident Date"))
+            .alias("Incident Date"),
+            pl.coalesce(pl.col("date").dt.year(), pl.col("Year")).alias("Year"),
+            pl.coalesce(pl.col("date").dt.strftime("%B"), pl.col("Reported Month")).alias("Reported Month"),
+            pl.when(pl.col("lat").is_not_null() & pl.col("lng").is_not_null())
+            .then(pl.format("{}, {}", pl.col("lat").round(6), pl.col("lng").round(6)))
+            .otherwise(pl.col("Coordinates"))
+            .alias("Coordinates"),
+            pl.col("Total Number of Dead and Missing").cast(pl.Int64)
+        )
+        .select(DATASET_COLUMNS)
+    )
+
+# blocchi di righe sintetiche, ciascuno con un generatore casuale derivato dal seed e dal numero del blocco
+def synthetic_chunks(rows, seed=0, chunk_rows=CHUNK_ROWS, csv_path=SOURCE_CSV):
+    template = load_template(csv_path)
+    for index, start in enumerate(range(0, rows, chunk_rows)):
+        rng = np.random.default_rng([seed, index])
+        yield synthetic_chunk(template, min(chunk_rows, rows - start), rng, index)
+
+# scrittura di un dataset sintetico di "rows" righe, un blocco alla volta
+def generate(rows, output, seed=0, chunk_rows=CHUNK_ROWS, csv_path=SOURCE_CSV):
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "wb") as f:
+        for index, chunk in enumerate(synthetic_chunks(rows, seed, chunk_rows, csv_path)):
+            chunk.write_csv(f, include_header=index == 0)
+    return output
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generazione di un dataset sintetico con lo schema di MM_14_21.csv")
+    parser.add_argument("rows", type=int, help="numero di righe da generare")
+    parser.add_argument("output", help="file csv di destinazione")
+    parser.add_argument("--seed", type=int, default=0, help="seed del generatore casuale")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="righe generate per ogni blocco")
+    args = parser.parse_args()
+
+    generate(args.rows, args.output, args.seed, args.chunk_rows)
+    print(f"{args.rows} righe salvate in {args.output}")
@@ -0,0 +1,44 @@
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+
+from data_prep import ATLAS_FILE
+
+ROOT = Path(__file__).resolve().parent.parent
+# file sorgente dell'applicazione, copiati nella cartella temporanea del test, e file di input (solo letti), collegati
+APP_FILES = ["*.py", "countries.csv"]
+APP_INPUTS = ["MM_14_21.csv", "images", ".streamlit"]
+EMPTY_ATLAS = {"type": "Topology", "objects": {"countries": {"type": "GeometryCollection", "geometries": []}}, "arcs": []}
+
+# copia dell'applicazione in una cartella temporanea, in cui vengono generati il dataset pre-elaborato,
+# la cache su disco e le varianti delle immagini, senza toccare quelli della cartella di lavoro
+@pytest.fixture
+def app_dir(tmp_path, monkeypatch):
+    for pattern in APP_FILES:
+        for path in ROOT.glob(pattern):
+            shutil.copy(path, tmp_path / path.name)
+    for name in APP_INPUTS:
+        (tmp_path / name).symlink_to(ROOT / name)
+    monkeypatch.chdir(tmp_path)
+    # atlante vuoto al posto di quello scaricato da data_prep.py (il test non accede alla rete)
+    ATLAS_FILE.parent.mkdir(parents=True)
+    ATLAS_FILE.write_text(json.dumps(EMPTY_ATLAS))
+    return tmp_path
+
+# esecuzione di una pagina dell'applicazione copiata in app_dir, con lo stato dei widget indicato
+@pytest.fixture
+def render(app_dir):
+    from streamlit.testing.v1 import AppTest
+
+    def run(page, state=None):
+        at = AppTest.from_file(str(app_dir / "app.py"), default_timeout=300)
+        at.session_state["selected_page"] = page
+        for key, value in (state or {}).items():
+            at.session_state[key] = value
+        at.run()
+        assert not at.exception, [exception.value for exception in at.exception]
+        return at
+
+    return run
@@ -0,0 +1,61 @@
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import benchmark
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# il benchmark misura la memoria con profiling.rss_bytes, senza moduli disponibili solo su Unix
+def test_import_without_unix_modules():
+    script = "import sys\nsys.modules['resource'] = None\nimport benchmark\n"
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+
+# il picco comprende la memoria allocata fuori dall'heap Python (qui da NumPy) e poi liberata dentro il blocco
+def test_rss_peak_includes_native_allocations():
+    if benchmark.rss_bytes() is None:
+        pytest.skip("memoria residente non misurabile su questa piattaforma")
+    size = 256 * 2**20
+    with benchmark.rss_peak() as memory:
+        data = np.ones(size, dtype=np.uint8)
+        time.sleep(0.1)
+        del data
+    assert memory["peak"] >= memory["start"]
+    assert benchmark.rss_increase(memory) >= size // 2
+
+def test_rss_peak_without_memory_measurement(monkeypatch):
+    monkeypatch.setattr(benchmark, "rss_bytes", lambda: None)
+    with benchmark.rss_peak() as memory:
+        pass
+    assert memory == {"start": None, "peak": None}
+    assert benchmark.rss_increase(memory) is None
+
+# un tempo di import oltre il budget viene segnalato nel report; solo con fail_over_budget il benchmark fallisce
+def test_startup_over_budget_is_reported(tmp_path, monkeypatch):
+    import_s = benchmark.STARTUP_IMPORT_BUDGET_S["introduzione"] + 1
+
+    def run(command, **kwargs):
+        partial = Path(command[command.index("--partial") + 1])
+        partial.write_text(json.dumps({"run_s": 1.0, "heavy_modules": []}))
+        log = f"import time:       100 | {int(import_s * 1e6):>9} | altair\n"
+        return subprocess.CompletedProcess(command, 0, stdout="", stderr=log)
+
+    monkeypatch.setattr(benchmark, "BENCHMARK_DIR", tmp_path)
+    monkeypatch.setattr(benchmark, "synthetic_dataset", lambda rows, seed: tmp_path / "dataset.csv")
+    monkeypatch.setattr(benchmark, "environment", dict)
+    monkeypatch.setattr(benchmark.subprocess, "run", run)
+    output = tmp_path / "startup_report.json"
+
+    benchmark.run_startup(["introduzione"], 0, 1, output)
+    [startup] = json.loads(output.read_text())["startup"]
+    assert startup["import_s"] == pytest.approx(import_s)
+    assert startup["over_budget"]
+
+    with pytest.raises(SystemExit):
+        benchmark.run_startup(["introduzione"], 0, 1, output, fail_over_budget=True)
@@ -0,0 +1,86 @@
+import io
+
+import numpy as np
+import pandas as pd
+import polars as pl
+from streamlit.runtime.caching.cache_resource_api import get_resource_cache_stats_provider
+
+PAGES = ["Introduzione", "Analisi descrittive", "Analisi geospaziali", "Analisi dei gruppi e conclusioni"]
+
+SKIPPED = object()  # valori non confrontati (lock, KD-tree...)
+SCALARS = (str, bytes, int, float, bool, type(None))
+
+# copia profonda di un valore in cache: DataFrame (polars, pandas), array, contenitori, oggetti con attributi
+# e valori semplici; gli altri oggetti (lock, KD-tree...) vengono ignorati
+def snapshot(value):
+    if isinstance(value, pl.LazyFrame):
+        value = value.collect()
+    if isinstance(value, pl.DataFrame):
+        buffer = io.BytesIO()
+        value.write_ipc(buffer)
+        return pl.read_ipc(buffer.getvalue())
+    if isinstance(value, pl.Series):
+        return snapshot(value.to_frame()).to_series()
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=True)
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if isinstance(value, (tuple, list)):
+        return [snapshot(item) for item in value]
+    if isinstance(value, dict):
+        return {key: snapshot(item) for key, item in value.items()}
+    if isinstance(value, SCALARS):
+        return value
+    if hasattr(value, "__dict__"):
+        return snapshot(vars(value))
+    return SKIPPED
+
+# confronto tra un valore in cache e la sua copia: stessi dati, stessi tipi
+def identical(value, copy):
+    if copy is SKIPPED:
+        return True
+    if isinstance(value, pl.LazyFrame):
+        value = value.collect()
+    if isinstance(value, pl.Series):
+        return value.dtype == copy.dtype and value.equals(copy)
+    if isinstance(value, pl.DataFrame):
+        return value.schema == copy.schema and value.equals(copy)
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.equals(copy) and (value.dtypes == copy.dtypes).all()
+    if isinstance(value, np.ndarray):
+        return value.dtype == copy.dtype and np.array_equal(value, copy, equal_nan=value.dtype.kind == "f")
+    if isinstance(value, (tuple, list)):
+        return len(value) == len(copy) and all(identical(item, item_copy) for item, item_copy in zip(value, copy))
+    if isinstance(value, dict):
+        return value.keys() == copy.keys() and all(identical(value[key], copy[key]) for key in value)
+    if isinstance(value, SCALARS):
+        return value == copy or value != value and copy != copy  # NaN uguale a NaN
+    return identical(vars(value), copy)
+
+# valori delle funzioni con st.cache_resource: (nome della funzione, chiave) -> valore
+def cached_values():
+    values = {}
+    for cache in get_resource_cache_stats_provider()._function_caches.values():
+        with cache._mem_cache_lock:
+            for key, result in cache._mem_cache.items():
+                values[cache.display_name, key] = result.value
+    return values
+
+# le pagine leggono i dati in cache (condivisi tra sessioni ed esecuzioni) senza modificarli:
+# dopo aver visitato ogni pagina in ordini diversi, ogni DataFrame in cache è identico alla copia presa prima
+def test_cached_frames_are_unchanged_by_rendering_every_page(render):
+    for page in PAGES:
+        render(page)
+    before = cached_values()
+    copies = {key: snapshot(value) for key, value in before.items()}
+    dataset_keys = [key for key in before if key[0].endswith("load_data")]
+    assert dataset_keys, "dataset non trovato nella cache di load_data"
+
+    for page in [*reversed(PAGES), *PAGES]:
+        render(page)
+
+    after = cached_values()
+    for key in dataset_keys:
+        assert after[key] is before[key]  # stesso oggetto: il dataset non viene ricaricato né copiato
+    for key, value in before.items():
+        assert identical(value, copies[key]), f"valore in cache modificato: {key[0]}"
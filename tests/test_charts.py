@@ -0,0 +1,49 @@
+import json
+import re
+
+import benchmark
+from data_prep import ATLAS_FILE
+
+# espressioni di Vega (filtri, calcoli, condizioni) che leggono un campo con datum.campo o datum['campo']
+DATUM_FIELD = re.compile(r"""datum(?:\.(\w+)|\[['"]([^'"]+)['"]\])""")
+
+# campi dei dati citati in una specifica Vega-Lite: codifiche, selezioni, ordinamenti, facet ed espressioni
+def spec_fields(node, fields=None):
+    fields = set() if fields is None else fields
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "field" and isinstance(value, str):
+                fields.add(value)
+            elif key == "fields" and isinstance(value, list):
+                fields.update(field for field in value if isinstance(field, str))
+            elif isinstance(value, str):
+                fields.update(name for match in DATUM_FIELD.findall(value) for name in match if name)
+            else:
+                spec_fields(value, fields)
+    elif isinstance(node, list):
+        for item in node:
+            spec_fields(item, fields)
+    return fields
+
+# ai grafici della pagina descrittiva arrivano solo le colonne usate dalla specifica
+def test_charts_send_only_used_columns(render):
+    at = render("Analisi descrittive")
+    charts = at.get("arrow_vega_lite_chart")
+    checked = []
+    for chart in charts:
+        details = benchmark.vega_lite_details(chart.proto)
+        fields = spec_fields(json.loads(chart.proto.spec))
+        for columns in details["columns"]:
+            assert set(columns) <= fields, f"{details['chart']}: colonne non usate {set(columns) - fields}"
+        if details["columns"]:
+            checked.append(details["chart"])
+    assert {"timeseries", "barchart", "piechart", "stackedbarchart"} <= set(checked)
+
+# senza l'atlante locale la mappa delle regioni viene sostituita da un errore e il resto della pagina viene visualizzato
+def test_missing_atlas_only_disables_the_regions_map(render):
+    ATLAS_FILE.unlink()
+    at = render("Analisi descrittive")
+    assert any(str(ATLAS_FILE) in error.value for error in at.error)
+    charts = {benchmark.vega_lite_details(chart.proto)["chart"] for chart in at.get("arrow_vega_lite_chart")}
+    assert "regions_map" not in charts
+    assert {"timeseries", "barchart", "piechart", "stackedbarchart"} <= charts
@@ -0,0 +1,38 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import profiling
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# profiling.py viene importato da app.py all'avvio: non deve dipendere da moduli disponibili solo su Unix
+def test_import_without_unix_modules():
+    script = (
+        "import sys\n"
+        "sys.modules['resource'] = None\n"
+        "sys.modules['fcntl'] = None\n"
+        "import profiling, shared_cache, spatial, data_prep\n"
+    )
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+
+def test_sections_without_memory_measurement(monkeypatch):
+    monkeypatch.setattr(profiling, "rss_bytes", lambda: None)
+    run = profiling.RunProfile("test")
+    run.enter("page")
+    run.enter("chart")
+    run.exit()
+    run.exit()
+    report = run.report()
+    assert report["peak_rss_bytes"] is None
+    assert report["sections"]["chart"]["parent"] == "page"
+    assert report["sections"]["page"]["rss_delta_bytes"] is None
+
+    metrics = profiling.openmetrics(report)
+    assert metrics.endswith("# EOF\n")
+    assert "mm_run_peak_rss_bytes{" not in metrics
+    assert 'mm_section_calls_total{section="chart"} 1' in metrics
+
+def test_openmetrics_label_escaping():
+    assert profiling.label_value('a\\b"c\nd') == 'a\\\\b\\"c\\nd'
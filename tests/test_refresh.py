@@ -0,0 +1,173 @@
+import datetime as dt
+
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+import data_prep
+from data_prep import DATASET_COLUMNS
+
+# riga del csv con lo schema di MM_14_21.csv (solo le colonne lette dal dataset)
+def incident(main_id, region, date, total, males=None, cause="Drowning", coordinates="35.5, 14.2",
+             route="Central Mediterranean"):
+    values = {
+        "Main ID": main_id,
+        "Region": region,
+        "Incident Date": date.strftime("%a, %m/%d/%Y - 12:00"),
+        "Year": date.year,
+        "Reported Month": date.strftime("%B"),
+        "Number Dead": total,
+        "Minimum Estimated Number of Missing": None,
+        "Total Number of Dead and Missing": total,
+        "Number of Survivors": None,
+        "Number of Females": None,
+        "Number of Males": males,
+        "Number of Children": None,
+        "Cause of Death": cause,
+        "Coordinates": coordinates,
+        "Migrantion route": route,
+        "UNSD Geographical Grouping": "Uncategorized",
+        "URL": None,
+    }
+    return {column: None if value is None else str(value) for column, value in values.items()}
+
+A = incident("2014.A", "Mediterranean", dt.date(2014, 1, 6), 3, males=2)
+B = incident("2014.B", "Mediterranean", dt.date(2014, 2, 10), 5)
+C1 = incident("2014.C", "North America", dt.date(2014, 1, 20), 1, cause="Violence", route=None)
+C2 = incident("2014.C", "North America", dt.date(2014, 1, 21), 2, cause="Violence", route=None)
+D = incident("2014.D", "North America", dt.date(2014, 3, 2), 2, coordinates=None, route=None)
+NO_ID = incident(None, "Northern Africa", dt.date(2014, 3, 15), 4, coordinates="abc", route=None)
+
+# aggiornamento: A invariato, B modificato, C ridotto a una sola riga, E nuovo (con una regione e un mese nuovi);
+# D e la riga senza "Main ID" non compaiono, perché un aggiornamento può contenere solo una parte degli incidenti
+B_CHANGED = {**B, "Total Number of Dead and Missing": "7", "Number Dead": "7", "Cause of Death": "Violence"}
+E = incident("2022.E", "Central Asia", dt.date(2022, 3, 1), 1, coordinates="95.0, 10.0", route=None)
+
+BASE = [A, B, C1, C2, D, NO_ID]
+UPDATE = [A, B_CHANGED, C1, E]
+REFRESHED = [A, D, NO_ID, B_CHANGED, C1, E]  # incidenti del dataset dopo l'aggiornamento
+
+def write_csv(path, rows):
+    pl.DataFrame(rows, schema={column: pl.String for column in DATASET_COLUMNS}).write_csv(path)
+    return path
+
+# dataset e tabelle pre-aggregate con le colonne categoriche come testo, per confrontare versioni con categorie diverse
+def store_contents(store_dir):
+    manifest = data_prep.read_manifest(store_dir)
+    data = data_prep.scan_segments(store_dir, manifest).collect()
+    data = data.with_columns(pl.col(data_prep.CATEGORICAL_COLUMNS).cast(pl.String))
+    return data, {name: table.collect() for name, table in data_prep.scan_aggregates(store_dir, manifest).items()}
+
+@pytest.fixture
+def store(tmp_path):
+    csv_path = write_csv(tmp_path / "base.csv", BASE)
+    store_dir = tmp_path / "store"
+    data_prep.build_dataset(csv_path, store_dir)
+    return csv_path, store_dir
+
+def test_geo_columns_flag_invalid_coordinates():
+    coordinates = ["31.6, -110.3", None, "abc", "95.0, 10.0", "1, 2, 3"]
+    geo = pl.DataFrame({"Coordinates": coordinates}).select(data_prep.geo_columns())
+    assert geo["coord_issue"].cast(pl.String).to_list() == [None, "missing", "malformed", "out_of_range", "malformed"]
+    assert geo.row(0)[:2] == (31.6, -110.3)
+
+def test_build_dataset_writes_manifest_and_aggregates(store):
+    csv_path, store_dir = store
+    manifest = data_prep.read_manifest(store_dir)
+    assert manifest["version"] == data_prep.dataset_version(data_prep.file_hash(csv_path))
+    assert manifest["rows"] == len(BASE)
+    assert [segment["deleted"] for segment in manifest["segments"]] == [[]]
+    assert manifest["categories"]["Region"] == ["Mediterranean", "North America", "Northern Africa"]
+
+    data, tables = store_contents(store_dir)
+    assert data["Main ID"].to_list() == [row["Main ID"] for row in BASE]
+    assert data["Incident_Date"].to_list()[:2] == [dt.date(2014, 1, 6), dt.date(2014, 2, 10)]
+
+    # i totali mensili contano tutte le righe di un "Main ID" e le righe senza "Main ID"
+    january = tables["monthly"].filter(pl.col("Year_Month") == dt.date(2014, 1, 1)).sort("Region")
+    assert january.select("Region", "Total Number of Dead and Missing", "Incidents").rows() == [
+        ("Mediterranean", 3, 1), ("North America", 3, 2)
+    ]
+    regions = tables["regions"].sort("Region")
+    assert regions.select("Region", "Total", "Male", "Incidents").rows() == [
+        ("Mediterranean", 8, 2.0, 2), ("North America", 5, 0.0, 3), ("Northern Africa", 4, 0.0, 1)
+    ]
+
+def test_category_statistics_from_category_table(store):
+    _, store_dir = store
+    _, tables = store_contents(store_dir)
+    stats = data_prep.category_statistics(tables["categories"])
+
+    regions = stats[("Region",)]
+    assert regions.select("Region", "Count").rows() == [("Mediterranean", 2), ("North America", 3), ("Northern Africa", 1)]
+    assert regions["Percent"].sum() == pytest.approx(100)
+
+    # la tabella incrociata comprende le combinazioni senza incidenti e somma al 100% entro ogni regione
+    cross = stats[("Region", "Cause of Death")]
+    assert cross.height == 3 * 2
+    assert cross.filter((pl.col("Region") == "Northern Africa") & (pl.col("Cause of Death") == "Violence"))["Count"].item() == 0
+    assert cross.group_by("Region").agg(pl.col("Percent").sum())["Percent"].to_list() == pytest.approx([100] * 3)
+
+    # le rotte mancanti sono escluse
+    assert stats[("Migrantion route",)].select("Migrantion route", "Count").rows() == [("Central Mediterranean", 2)]
+
+def test_refresh_matches_full_rebuild(store, tmp_path):
+    csv_path, store_dir = store
+    base_manifest = data_prep.read_manifest(store_dir)
+    update_path = write_csv(tmp_path / "update.csv", UPDATE)
+
+    summary = data_prep.refresh_dataset(update_path, csv_path, store_dir)
+    assert {key: value for key, value in summary.items() if key != "version"} == {
+        "new": 1, "changed": 2, "unchanged": 1, "appended_rows": 3, "removed_rows": 3
+    }
+
+    # nuovo segmento con le righe aggiunte, righe sostituite marcate nel primo segmento
+    manifest = data_prep.read_manifest(store_dir)
+    assert manifest["version"] == summary["version"] != base_manifest["version"]
+    assert manifest["rows"] == len(REFRESHED)
+    assert [segment["rows"] for segment in manifest["segments"]] == [len(BASE), 3]
+    assert [segment["deleted"] for segment in manifest["segments"]] == [[1, 2, 3], []]
+    assert "Central Asia" in manifest["categories"]["Region"]
+    # i file della versione precedente restano per le istanze che la stanno ancora leggendo
+    assert all((store_dir / file).exists() for file in base_manifest["aggregates"].values())
+
+    # dataset e tabelle aggiornate con le sole differenze coincidono con quelli ricostruiti da zero
+    rebuilt_dir = tmp_path / "rebuilt"
+    data_prep.build_dataset(write_csv(tmp_path / "refreshed.csv", REFRESHED), rebuilt_dir)
+    data, tables = store_contents(store_dir)
+    expected_data, expected_tables = store_contents(rebuilt_dir)
+    assert_frame_equal(data, expected_data, check_row_order=False)
+    assert tables.keys() == expected_tables.keys()
+    for name in tables:
+        assert_frame_equal(tables[name], expected_tables[name], check_row_order=False)
+
+    # il nuovo mese compare nel cubo mensile
+    assert tables["monthly"]["Year_Month"].max() == dt.date(2022, 3, 1)
+
+def test_reapplying_an_update_changes_nothing(store, tmp_path):
+    csv_path, store_dir = store
+    update_path = write_csv(tmp_path / "update.csv", UPDATE)
+    data_prep.refresh_dataset(update_path, csv_path, store_dir)
+    manifest = data_prep.read_manifest(store_dir)
+    data, tables = store_contents(store_dir)
+
+    summary = data_prep.refresh_dataset(update_path, csv_path, store_dir)
+    assert summary == {
+        "new": 0, "changed": 0, "unchanged": 4, "appended_rows": 0, "removed_rows": 0, "version": manifest["version"]
+    }
+    assert data_prep.read_manifest(store_dir) == manifest
+    again_data, again_tables = store_contents(store_dir)
+    assert_frame_equal(again_data, data)
+    for name in tables:
+        assert_frame_equal(again_tables[name], tables[name])
+
+# le righe senza "Main ID" non si possono confrontare con lo storico: vengono sempre aggiunte
+def test_rows_without_main_id_are_appended(store, tmp_path):
+    csv_path, store_dir = store
+    summary = data_prep.refresh_dataset(write_csv(tmp_path / "update.csv", [NO_ID]), csv_path, store_dir)
+    assert summary["new"] == summary["changed"] == summary["unchanged"] == 0
+    assert (summary["appended_rows"], summary["removed_rows"]) == (1, 0)
+
+    data, tables = store_contents(store_dir)
+    assert data["Main ID"].null_count() == 2
+    assert tables["regions"].filter(pl.col("Region") == "Northern Africa").select("Total", "Incidents").row(0) == (8, 2)
@@ -0,0 +1,68 @@
+import importlib.util
+import os
+import threading
+
+import polars as pl
+
+import data_prep
+import shared_cache
+
+# modulo con una funzione in cache che dipende da una costante e da una funzione ausiliaria del modulo
+MODULE_SOURCE = """
+import polars as pl
+from shared_cache import shared_cache
+
+SCALE = {scale}
+
+def helper(version):
+    return len(version) * SCALE
+
+@shared_cache
+def derived(version):
+    return pl.DataFrame({{"value": [helper(version)]}})
+"""
+
+def load_module(path, scale, mtime_ns):
+    path.write_text(MODULE_SOURCE.format(scale=scale))
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_results_follow_changes_outside_the_decorated_function(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_cache, "backend", shared_cache.MemoryBackend())
+    path = tmp_path / "cached_module.py"
+
+    # stesso codice: il risultato viene ritrovato in cache
+    assert load_module(path, 2, 1_000_000_000).derived("abcd")["value"].item() == 8
+    assert load_module(path, 2, 1_000_000_000).derived("abcd")["value"].item() == 8
+    assert len(shared_cache.backend.entries) == 1
+
+    # costante del modulo modificata (la funzione decorata è identica): il risultato viene ricalcolato
+    assert load_module(path, 3, 2_000_000_000).derived("abcd")["value"].item() == 12
+    assert len(shared_cache.backend.entries) == 2
+
+def test_dataset_version_depends_on_format(monkeypatch):
+    version = data_prep.dataset_version("0" * 64)
+    monkeypatch.setattr(data_prep, "DATASET_FORMAT", data_prep.DATASET_FORMAT + 1)
+    assert data_prep.dataset_version("0" * 64) != version
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = shared_cache.MemoryBackend(max_entries=2)
+    for key in "abc":
+        backend.put(key, pl.DataFrame({"key": [key]}))
+    assert backend.get("a") is None
+    assert backend.get("c")["key"].item() == "c"
+
+# più thread dello stesso processo che salvano lo stesso risultato non scrivono nello stesso file temporaneo
+def test_disk_backend_concurrent_puts_of_one_key(tmp_path):
+    backend = shared_cache.DiskBackend(tmp_path)
+    value = pl.DataFrame({"value": range(200_000)})
+    threads = [threading.Thread(target=backend.put, args=("key", value)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert backend.get("key").equals(value)
+    assert list(tmp_path.glob("*.partial")) == []
@@ -0,0 +1,150 @@
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from spatial import EARTH_RADIUS_KM, SpatialIndex, chord_length, dbscan_haversine, unit_sphere
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# DBSCAN di riferimento con la matrice completa delle distanze (solo per pochi punti)
+def brute_force_core_clusters(lat, lng, eps_km, min_samples):
+    xyz = unit_sphere(lat, lng)
+    neighbors = np.linalg.norm(xyz[:, None] - xyz[None], axis=2) <= chord_length(eps_km)
+    core = neighbors.sum(axis=1) >= min_samples
+    labels = np.full(len(lat), -1)
+    for start in np.flatnonzero(core):
+        if labels[start] >= 0:
+            continue
+        labels[start] = start
+        stack = [start]
+        while stack:
+            point = stack.pop()
+            for other in np.flatnonzero(neighbors[point] & core & (labels < 0)):
+                labels[other] = start
+                stack.append(other)
+    return core, labels
+
+# stessa partizione a meno della numerazione dei cluster
+def same_partition(a, b):
+    pairs = set(zip(a.tolist(), b.tolist()))
+    return len(pairs) == len(set(a.tolist())) == len(set(b.tolist()))
+
+def test_two_blobs_and_noise():
+    rng = np.random.default_rng(0)
+    lat = np.concatenate([35 + rng.normal(0, 0.1, 200), -20 + rng.normal(0, 0.1, 150), rng.uniform(-60, 60, 20)])
+    lng = np.concatenate([15 + rng.normal(0, 0.1, 200), 130 + rng.normal(0, 0.1, 150), rng.uniform(-180, 180, 20)])
+    labels = dbscan_haversine(lat, lng, 50, 10)
+    assert len(set(labels[:200])) == 1 and labels[0] >= 0
+    assert len(set(labels[200:350])) == 1 and labels[200] >= 0
+    assert labels[0] != labels[200]
+    assert (labels[350:] == -1).all()
+
+def test_matches_brute_force_on_core_points():
+    rng = np.random.default_rng(1)
+    centers = rng.uniform([-40, -120], [50, 120], (8, 2))
+    sample = centers[rng.integers(0, len(centers), 800)] + rng.normal(0, 1.5, (800, 2))
+    lat, lng = sample[:, 0].round(4), sample[:, 1].round(4)
+    for eps_km, min_samples in ((60, 5), (150, 20), (300, 40)):
+        labels = dbscan_haversine(lat, lng, eps_km, min_samples)
+        core, expected = brute_force_core_clusters(lat, lng, eps_km, min_samples)
+        assert same_partition(labels[core], expected[core])
+        assert (labels[core] >= 0).all()
+
+def test_repeated_coordinates_count_as_incidents():
+    # 10 incidenti nello stesso punto formano un cluster con min_samples=10, 9 no
+    lat, lng = np.full(10, 12.5), np.full(10, 40.0)
+    assert (dbscan_haversine(lat, lng, 10, 10) == 0).all()
+    assert (dbscan_haversine(lat[:9], lng[:9], 10, 10) == -1).all()
+
+# un cluster denso (tutti i punti entro eps_km l'uno dall'altro) non deve far crescere la memoria
+# col quadrato dei punti: misurato in un processo separato con il picco della memoria residente
+# (benchmark.rss_peak, campionato con profiling.rss_bytes, in byte su ogni piattaforma)
+def test_dense_cluster_memory_is_bounded():
+    script = textwrap.dedent("""
+        import numpy as np
+        import scipy.spatial, scipy.sparse.csgraph
+        from benchmark import rss_increase, rss_peak
+        from spatial import dbscan_haversine
+
+        rng = np.random.default_rng(0)
+        n = 200_000
+        lat, lng = 35 + rng.normal(0, 0.1, n), 15 + rng.normal(0, 0.1, n)
+        with rss_peak() as memory:
+            labels = dbscan_haversine(lat, lng, 75, 30)
+        assert labels.max() == 0 and (labels == 0).all()
+        increase = rss_increase(memory)
+        print("None" if increase is None else increase / 2**20)
+    """)
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stderr
+    if result.stdout.strip() == "None":
+        pytest.skip("memoria residente non misurabile su questa piattaforma")
+    # tutte le coppie entro eps_km sarebbero 2 * 10^10 (centinaia di GB); qualche array lineare sta in poche decine di MB
+    assert float(result.stdout) < 200
+
+# distanza haversine in km tra un punto e degli array di coordinate
+def haversine_km(lat, lng, lats, lngs):
+    lat, lng, lats, lngs = map(np.radians, (lat, lng, np.asarray(lats, dtype=float), np.asarray(lngs, dtype=float)))
+    h = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lngs - lng) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(h))
+
+def random_incidents(n, seed=2):
+    rng = np.random.default_rng(seed)
+    lat = np.degrees(np.arcsin(rng.uniform(-1, 1, n)))  # punti distribuiti uniformemente sulla sfera
+    lng = rng.uniform(-180, 180, n)
+    return lat, lng, rng.permutation(n) + 1000  # id diversi dalle posizioni
+
+QUERY_POINTS = [(35.5, 14.2), (0, 179.9), (-33.9, -70.6), (89.5, 10), (12, -179.5)]
+
+def test_within_radius_matches_haversine():
+    lat, lng, ids = random_incidents(3000)
+    index = SpatialIndex(lat, lng, ids)
+    for point in QUERY_POINTS:
+        for radius_km in (50, 800, 3000):
+            found, distances = index.within_radius(*point, radius_km)
+            expected = haversine_km(*point, lat, lng)
+            assert set(found) == set(ids[expected <= radius_km])
+            position = {incident: i for i, incident in enumerate(ids)}
+            np.testing.assert_allclose(distances, expected[[position[incident] for incident in found]], atol=1e-6)
+            assert (np.diff(distances) >= 0).all()
+
+def test_nearest_matches_haversine():
+    lat, lng, ids = random_incidents(3000)
+    index = SpatialIndex(lat, lng, ids)
+    for point in QUERY_POINTS:
+        for k in (1, 7, 50):
+            found, distances = index.nearest(*point, k)
+            expected = haversine_km(*point, lat, lng)
+            order = np.argsort(expected, kind="stable")
+            np.testing.assert_allclose(distances, expected[order[:k]], atol=1e-6)
+            position = {incident: i for i, incident in enumerate(ids)}
+            np.testing.assert_allclose(expected[[position[incident] for incident in found]], distances, atol=1e-6)
+
+def test_in_bbox_matches_brute_force_including_antimeridian():
+    lat, lng, ids = random_incidents(3000)
+    index = SpatialIndex(lat, lng, ids)
+    boxes = [(30, 45, -10, 35), (-60, -10, 160, -150), (-90, 90, 170, -170), (10, 10.5, 0, 1)]
+    for lat_min, lat_max, lng_min, lng_max in boxes:
+        in_lat = (lat >= lat_min) & (lat <= lat_max)
+        if lng_min <= lng_max:
+            in_lng = (lng >= lng_min) & (lng <= lng_max)
+        else:
+            in_lng = (lng >= lng_min) | (lng <= lng_max)
+        assert set(index.in_bbox(lat_min, lat_max, lng_min, lng_max)) == set(ids[in_lat & in_lng])
+    # il box che attraversa l'antimeridiano contiene punti da entrambi i lati
+    found = index.in_bbox(-60, -10, 160, -150)
+    found_lng = lng[np.isin(ids, found)]
+    assert (found_lng > 0).any() and (found_lng < 0).any()
+
+def test_empty_index_and_empty_queries():
+    index = SpatialIndex(np.empty(0), np.empty(0), np.empty(0, dtype=int))
+    for found, distances in (index.within_radius(10, 10, 100), index.nearest(10, 10, 5)):
+        assert len(found) == 0 and len(distances) == 0
+    assert len(index.in_bbox(-90, 90, -180, 180)) == 0
+    lat, lng, ids = random_incidents(10)
+    found, distances = SpatialIndex(lat, lng, ids).nearest(0, 0, 0)
+    assert len(found) == 0 and len(distances) == 0
@@ -0,0 +1,20 @@
+from pathlib import Path
+
+from data_prep import DATASET_COLUMNS
+from synthetic_data import synthetic_chunks
+
+SOURCE_CSV = Path(__file__).resolve().parent.parent / "MM_14_21.csv"
+
+# ogni riga sintetica è un incidente distinto: "Main ID" è la chiave degli aggiornamenti incrementali
+def test_synthetic_main_ids_are_unique():
+    chunks = list(synthetic_chunks(2_500, seed=0, chunk_rows=1_000, csv_path=SOURCE_CSV))
+    assert [chunk.height for chunk in chunks] == [1_000, 1_000, 500]
+    assert all(chunk.columns == DATASET_COLUMNS for chunk in chunks)
+    main_ids = [main_id for chunk in chunks for main_id in chunk["Main ID"].to_list()]
+    assert None not in main_ids
+    assert len(set(main_ids)) == len(main_ids)
+
+# lo stesso seed produce sempre le stesse righe
+def test_synthetic_chunks_are_reproducible():
+    first, second = (next(synthetic_chunks(500, seed=3, csv_path=SOURCE_CSV)) for _ in range(2))
+    assert first.equals(second)
@@ -0,0 +1,46 @@
+import pandas as pd
+import polars as pl
+import streamlit as st
+
+import data_prep
+
+# righe della pagina visibile della tabella del dataset
+def viewer_page(at):
+    return at.dataframe[0].value
+
+# l'ordinamento per data segue la data dell'incidente e non il testo della colonna ("Mon, 01/06/2014")
+def test_viewer_sorts_incident_date_by_date(render):
+    at = render("Introduzione", {"viewer_sort": "Incident Date"})
+    page = viewer_page(at)
+
+    data, _ = data_prep.load_dataset()
+    expected = data.sort("Incident_Date", nulls_last=True, maintain_order=True).head(len(page))
+    assert page["Main ID"].tolist() == expected["Main ID"].to_list()
+    dates = pd.to_datetime(page["Incident Date"], format="%a, %m/%d/%Y")
+    assert dates.is_monotonic_increasing
+    assert dates.iloc[0].date() == data["Incident_Date"].min()
+
+# l'ordinamento per mese segue il calendario e non l'ordine alfabetico delle categorie
+def test_viewer_sorts_reported_month_by_calendar(render):
+    page = viewer_page(render("Introduzione", {"viewer_sort": "Reported Month"}))
+    assert set(page["Reported Month"].astype(str)) == {"January"}
+    page = viewer_page(render("Introduzione", {"viewer_sort": "Reported Month", "viewer_descending": True}))
+    assert set(page["Reported Month"].astype(str)) == {"December"}
+
+# su filesystem in sola lettura il dataset viene letto dal csv con colonne Categorical, in cui la ricerca deve trovare
+# le categorie come nelle colonne Enum del dataset pre-elaborato
+def test_viewer_search_on_read_only_fallback(render, monkeypatch):
+    def read_only(*args, **kwargs):
+        raise OSError("filesystem in sola lettura")
+
+    monkeypatch.setattr(data_prep, "open_store", read_only)
+    st.cache_resource.clear()  # il dataset in cache per la versione None è quello pre-elaborato di un altro test
+    data, _, _ = data_prep.scan_dataset()
+    assert data.collect_schema()["Cause of Death"] == pl.Categorical
+
+    page = viewer_page(render("Introduzione", {"viewer_search": "drowning"}))
+    assert len(page) > 0
+    assert page["Cause of Death"].astype(str).str.contains("Drowning").any()
+    matches = page.astype(str).apply(lambda column: column.str.contains("drowning", case=False))
+    assert matches.any(axis=1).all()
+    assert data_prep.current_version() is None  # il dataset pre-elaborato non è stato scritto